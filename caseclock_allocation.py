@@ -0,0 +1,61 @@
+import time
+
+from caseclock_storage import LOG_FILE, entry_label, new_entry, save_log
+
+def make_entry(client, start, end, task_type="", notes="", user=""):
+    return new_entry(client, start, end, task_type=task_type, notes=notes, **({"user": user} if user else {}))
+
+def split_spans(spans, shares):
+    # Hands out the spans' seconds to [(client, weight)] in order; the last client gets the remainder
+    total = sum(e - s for s, e in spans)
+    weight_sum = sum(w for _, w in shares)
+    quotas = [int(total * w / weight_sum) for _, w in shares]
+    quotas[-1] = total - sum(quotas[:-1])
+
+    pieces, spans = [], list(spans)
+    for (client, _), quota in zip(shares, quotas):
+        while quota > 0 and spans:
+            s, e = spans[0]
+            take = min(quota, e - s)
+            pieces.append((client, s, s + take))
+            quota -= take
+            spans[0] = (s + take, e)
+            if s + take == e:
+                spans.pop(0)
+    return pieces
+
+def allocate(logs, index, start, end, shares, task_type="", notes="", skip_tracked=True, user="",
+             log_path=LOG_FILE):
+    # Splits [start, end) across several cases in one operation and one log write.
+    # shares: [(client, weight)] – pass minutes as weights to carve exact amounts.
+    # Time already covered by an entry is skipped (or refused with skip_tracked=False).
+    if end <= start:
+        raise ValueError("End must be after start")
+    if not shares or any(w <= 0 for _, w in shares):
+        raise ValueError("Every case needs a positive share")
+
+    if index.first_overlap(start, end, user) is None:
+        spans = [(start, end)]
+    elif skip_tracked:
+        spans = index.gaps(start, end, user, min_gap=1)
+    else:
+        clashes = ", ".join(entry_label(item) for _, _, item in index.overlapping(start, end, user))
+        raise ValueError(f"Interval overlaps existing entries: {clashes}")
+    if not spans:
+        raise ValueError("That whole interval is already tracked")
+
+    new = [make_entry(client, s, e, task_type, notes, user) for client, s, e in split_spans(spans, shares)]
+    # Every piece is checked before any is indexed, so a refused allocation leaves no trace
+    for entry in new:
+        index.check_duplicate(entry)
+    for entry in new:
+        # The pieces fill untracked spans and never share a second with each other
+        index.add(entry, allow_overlap=True)
+    logs.extend(new)
+    save_log(logs, log_path)
+    return new
+
+def allocate_last(logs, index, minutes, clients, now=None, **kwargs):
+    # "log the last 30 minutes to X and Y" – an even split ending now
+    end = int(time.time() if now is None else now)
+    return allocate(logs, index, end - int(minutes * 60), end, [(c, 1) for c in clients], **kwargs)
@@ -0,0 +1,169 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from caseclock_archive import ARCHIVE_DIR, archive_version, query_archive
+from caseclock_billing import apply_billing, load_rules, wall_clock
+from caseclock_date_index import week_range
+from caseclock_storage import TIME_FORMAT, duration_seconds, entry_start
+
+UNTAGGED = "untagged"
+
+def week_of(day):
+    return day - datetime.timedelta(days=day.weekday())
+
+def typed_frame(entries):
+    # One week of log entries as a typed frame: categoricals, datetime64 and int64 seconds
+    return pd.DataFrame({
+        "client": pd.Categorical([e["client"] for e in entries]),
+        "task_type": pd.Categorical([e.get("task_type") or UNTAGGED for e in entries]),
+        "start": pd.to_datetime([entry_start(e) for e in entries]),
+        "duration_seconds": np.fromiter((duration_seconds(e) for e in entries), np.int64, len(entries)),
+    })
+
+def week_aggregates(frame, rules):
+    # Typed entries of one week -> {"clients": hours/billable/amount per client, "tasks": hours per task}
+    billed = apply_billing(frame, rules)
+    billed["hours"] = billed["duration_seconds"] / 3600
+    return {
+        "clients": billed.groupby("client", observed=True)[["hours", "billable_hours", "amount"]].sum(),
+        "tasks": billed.groupby("task_type", observed=True)["hours"].sum(),
+    }
+
+def archived_weeks(rules, since, archive_dir=ARCHIVE_DIR):
+    # Closed months in the window, aggregated per week straight from the Parquet archive
+    table = query_archive(["client", "task_type", "start", "duration_seconds"],
+                          start=datetime.datetime.combine(since, datetime.time()), archive_dir=archive_dir)
+    frame = table.to_pandas()
+    if frame.empty:
+        return {}
+    frame["client"] = frame["client"].astype("category")
+    frame["task_type"] = frame["task_type"].fillna("").replace("", UNTAGGED).astype("category")
+    frame["start"] = wall_clock(frame["start"])
+    weeks = (frame["start"].dt.normalize() - pd.to_timedelta(frame["start"].dt.weekday, unit="D")).dt.date
+    return {week: week_aggregates(part.reset_index(drop=True), rules) for week, part in frame.groupby(weeks)}
+
+def combine(a, b):
+    if a is None or b is None:
+        return a or b
+    return {"clients": a["clients"].add(b["clients"], fill_value=0.0),
+            "tasks": a["tasks"].add(b["tasks"], fill_value=0.0)}
+
+class AnalyticsCache:
+    # Per-week aggregates of the time log. Appends (and edits/deletes reported through
+    # touch()) mark their weeks dirty; refresh() recomputes only those weeks, reading them
+    # through the date index. Views are memoized on the cache version, so an unchanged
+    # log hands back the very same frames. Weeks in months already rolled into the archive
+    # come from the Parquet partitions, re-read only when the archive changes.
+    def __init__(self, rules=None, window_weeks=12, archive_dir=ARCHIVE_DIR):
+        self.rules = rules or load_rules()
+        self.window_weeks = window_weeks
+        self.archive_dir = archive_dir
+        self.archive_key = None
+        self.archived = {}  # week start -> aggregates of archived entries
+        self.open = {}      # week start -> aggregates of open-period log entries
+        self.weeks = {}     # week start -> both combined: {"clients": frame, "tasks": series}
+        self.dirty = set()
+        self.seen = 0     # log entries already assigned to a week
+        self.version = 0
+        self.views = {}   # (view, args) -> (version, frame)
+        self.expense_key = None
+        self.burn = None
+
+    def touch(self, entries, removed=False):
+        # Edits touch both the old and the new entry; deletes pass removed=True
+        for e in entries:
+            self.dirty.add(week_of(entry_start(e).date()))
+        if removed:
+            self.seen -= len(entries)
+
+    def refresh(self, logs, dates, today=None):
+        since = week_of(today or datetime.date.today()) - datetime.timedelta(weeks=self.window_weeks - 1)
+        archive_key = (archive_version(self.archive_dir), since)
+        if archive_key != self.archive_key:
+            self.dirty.update(self.archived)
+            self.archived = archived_weeks(self.rules, since, self.archive_dir)
+            self.archive_key = archive_key
+            self.dirty.update(self.archived)
+        if len(logs) < self.seen:
+            # Entries went away without a touch(): start over
+            self.open.clear()
+            self.dirty.update(self.weeks)
+            self.seen = 0
+        self.touch(logs[self.seen:])
+        self.seen = len(logs)
+        if not self.dirty:
+            return self.version
+        for week in self.dirty:
+            entries = dates.entries(logs, *week_range(week))
+            if entries:
+                self.open[week] = week_aggregates(typed_frame(entries), self.rules)
+            else:
+                self.open.pop(week, None)
+            # A week across a month end is part archive, part open log
+            both = combine(self.archived.get(week), self.open.get(week))
+            if both is None:
+                self.weeks.pop(week, None)
+            else:
+                self.weeks[week] = both
+        self.dirty.clear()
+        self.version += 1
+        return self.version
+
+    def _memo(self, key, build):
+        cached = self.views.get(key)
+        if cached is None or cached[0] != self.version:
+            cached = self.views[key] = (self.version, build())
+        return cached[1]
+
+    def _weeks(self, last=None):
+        weeks = sorted(self.weeks)
+        return weeks[-last:] if last else weeks
+
+    # === Views ===
+    def hours_by_client_week(self, last=12):
+        def build():
+            weeks = self._weeks(last)
+            if not weeks:
+                return pd.DataFrame()
+            frame = pd.concat({pd.Timestamp(w): self.weeks[w]["clients"]["hours"] for w in weeks}, axis=1).T
+            return frame.fillna(0.0).round(2)
+        return self._memo(("hours_by_client_week", last), build)
+
+    def task_mix(self, last=12):
+        def build():
+            weeks = self._weeks(last)
+            if not weeks:
+                return pd.Series(dtype=float)
+            hours = pd.concat([self.weeks[w]["tasks"] for w in weeks]).groupby(level=0).sum()
+            return (hours / hours.sum()).sort_values(ascending=False).round(3)
+        return self._memo(("task_mix", last), build)
+
+    def utilization(self, target_hours_per_week, last=12):
+        def build():
+            weeks = self._weeks(last)
+            billable = pd.Series({pd.Timestamp(w): self.weeks[w]["clients"]["billable_hours"].sum() for w in weeks},
+                                 dtype=float)
+            frame = pd.DataFrame({"billable_hours": billable.round(2), "target": float(target_hours_per_week)})
+            frame["utilization"] = (frame["billable_hours"] / frame["target"]).round(3) if target_hours_per_week else np.nan
+            return frame
+        return self._memo(("utilization", target_hours_per_week, last), build)
+
+    def expense_burn(self, ledger, freq="W-MON"):
+        # Cumulative spend per client; the ledger only appends, so its size is its version
+        key = (len(ledger.entries), ledger.grand_total, freq)
+        if key != self.expense_key:
+            frame = pd.DataFrame({
+                "client": pd.Categorical([e["client"] for e in ledger.entries]),
+                "timestamp": pd.to_datetime([e["timestamp"] for e in ledger.entries], format=TIME_FORMAT),
+                "amount": np.array([float(e["amount"]) for e in ledger.entries], dtype=np.float64),
+            })
+            if frame.empty:
+                self.burn = pd.DataFrame()
+            else:
+                weekly = (frame.set_index("timestamp").groupby("client", observed=True)["amount"]
+                          .resample(freq, label="left", closed="left").sum())
+                self.burn = weekly.unstack(level=0).fillna(0.0).cumsum().round(2)
+            self.expense_key = key
+        return self.burn
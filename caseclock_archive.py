@@ -0,0 +1,166 @@
+import datetime
+import json
+import os
+import uuid
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+
+from caseclock_dedupe import entry_uid
+from caseclock_migrate import upgrade_entries
+from caseclock_storage import (
+    DISPLAY_TZ, LOG_FILE, load_log, log_lock, save_log, entry_start, entry_start_ts, entry_end_ts,
+    duration_seconds, to_epoch
+)
+
+ARCHIVE_DIR = "caseclock_archive"
+
+# Closed months live in month=YYYY-MM/client=<name>/ Parquet partitions. start/end are UTC
+# instants, so a change of CASECLOCK_TZ doesn't shift archived entries; month is the
+# display-zone month the entry was rolled under
+UTC_TS = pa.timestamp("s", tz="UTC")
+ARCHIVE_SCHEMA = pa.schema([
+    ("client", pa.string()),
+    ("start", UTC_TS),
+    ("end", UTC_TS),
+    ("duration_seconds", pa.int64()),
+    ("task_type", pa.string()),
+    ("notes", pa.string()),
+    ("user", pa.string()),
+    # Content id (caseclock_dedupe.entry_uid): makes rolling a month idempotent
+    ("uid", pa.string()),
+    # Any other entry fields (parallel, source, ...) as a JSON object
+    ("extra", pa.string()),
+    ("month", pa.string()),
+])
+CORE_FIELDS = {"client", "start", "end", "duration", "task_type", "notes", "user"}
+PARTITIONING = ds.partitioning(
+    pa.schema([("month", pa.string()), ("client", pa.string())]), flavor="hive"
+)
+
+def period_of(entry):
+    return entry_start(entry).strftime("%Y-%m")
+
+def entries_to_table(entries):
+    return pa.table({
+        "client": [e["client"] for e in entries],
+        "start": pa.array([entry_start_ts(e) for e in entries], UTC_TS),
+        "end": pa.array([entry_end_ts(e) for e in entries], UTC_TS),
+        "duration_seconds": [duration_seconds(e) for e in entries],
+        "task_type": [e.get("task_type", "") for e in entries],
+        "notes": [e.get("notes", "") for e in entries],
+        "user": [e.get("user", "") for e in entries],
+        "uid": [entry_uid(e) for e in entries],
+        "extra": [json.dumps({k: v for k, v in e.items() if k not in CORE_FIELDS}, sort_keys=True)
+                  for e in entries],
+        "month": [period_of(e) for e in entries],
+    }, schema=ARCHIVE_SCHEMA)
+
+def archived_uids(months=None, archive_dir=ARCHIVE_DIR):
+    # months=None reads every partition
+    dataset = open_archive(archive_dir)
+    if dataset is None or months is not None and not months:
+        return set()
+    table = dataset.to_table(columns=["uid"],
+                             filter=None if months is None else pc.field("month").isin(sorted(months)))
+    return set(table.column("uid").drop_null().to_pylist())
+
+def roll_closed_periods(log_path=LOG_FILE, archive_dir=ARCHIVE_DIR, today=None):
+    # Moves every entry from a month before `today` into the Parquet archive and
+    # rewrites the active log with the open period only. Returns the active entries.
+    # Locked throughout on a shared log, so two instances starting together archive once
+    with log_lock(log_path):
+        logs = load_log(log_path)
+        # Legacy wall-clock strings become epoch entries first, so they are bucketed and
+        # archived with the same instants the rest of the app gives them
+        upgrade_entries(logs)
+        open_period = (today or datetime.date.today()).strftime("%Y-%m")
+        closed = [e for e in logs if period_of(e) < open_period]
+        if not closed:
+            return logs
+        active = [e for e in logs if period_of(e) >= open_period]
+        # Entries already in the archive are skipped, so a crash between the two writes below
+        # (or a stale copy of the log saved back later) never archives a month twice
+        archived = archived_uids({period_of(e) for e in closed}, archive_dir)
+        fresh = [e for e in closed if entry_uid(e) not in archived]
+        if fresh:
+            write_closed(fresh, archive_dir)
+        # In place: a shared log's list carries its merge base, so the caller keeps that
+        logs[:] = active
+        save_log(logs, log_path)
+    return logs
+
+def write_closed(closed, archive_dir=ARCHIVE_DIR):
+    ds.write_dataset(
+        entries_to_table(closed),
+        archive_dir,
+        format="parquet",
+        partitioning=PARTITIONING,
+        basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+
+def open_archive(archive_dir=ARCHIVE_DIR):
+    if not Path(archive_dir).exists():
+        return None
+    # Memory-mapped reads: pages are only faulted in for the row groups a query touches
+    return ds.dataset(
+        archive_dir,
+        format="parquet",
+        partitioning=PARTITIONING,
+        filesystem=pafs.LocalFileSystem(use_mmap=True),
+        # Older partitions lack the user/uid/extra columns; they read back as nulls
+        schema=ARCHIVE_SCHEMA,
+    )
+
+def archive_filter(clients=None, start=None, end=None):
+    # start/end are display-zone wall-clock datetimes. Month bounds prune whole partitions;
+    # the timestamp bounds (as UTC instants) prune row groups
+    expr = None
+    def add(cond):
+        nonlocal expr
+        expr = cond if expr is None else expr & cond
+    if clients:
+        add(pc.field("client").isin(list(clients)))
+    if start:
+        add(pc.field("month") >= start.strftime("%Y-%m"))
+        add(pc.field("start") >= pa.scalar(to_epoch(start, DISPLAY_TZ), UTC_TS))
+    if end:
+        add(pc.field("month") <= end.strftime("%Y-%m"))
+        add(pc.field("start") < pa.scalar(to_epoch(end, DISPLAY_TZ), UTC_TS))
+    return expr
+
+def query_archive(columns=None, clients=None, start=None, end=None, archive_dir=ARCHIVE_DIR):
+    dataset = open_archive(archive_dir)
+    if dataset is None:
+        return ARCHIVE_SCHEMA.empty_table().select(columns or ARCHIVE_SCHEMA.names)
+    return dataset.to_table(columns=columns, filter=archive_filter(clients, start, end))
+
+def archive_version(archive_dir=ARCHIVE_DIR):
+    # Changes whenever a roll-over writes a file; cheap enough to check per query
+    stamps = [entry.stat().st_mtime_ns for entry in Path(archive_dir).rglob("*.parquet")] \
+        if os.path.isdir(archive_dir) else []
+    return len(stamps), max(stamps, default=0)
+
+def archived_entries(archive_dir=ARCHIVE_DIR):
+    # Closed months back in log shape (epoch times), e.g. to search them next to the open period
+    table = query_archive(["client", "start", "end", "duration_seconds", "task_type", "notes", "user"],
+                          archive_dir=archive_dir)
+    entries = []
+    for row in table.to_pylist():
+        entry = {"client": row["client"], "start": to_epoch(row["start"]),
+                 "end": to_epoch(row["end"]), "duration": row["duration_seconds"],
+                 "task_type": row["task_type"] or "", "notes": row["notes"] or ""}
+        if row["user"]:
+            entry["user"] = row["user"]
+        entries.append(entry)
+    return entries
+
+def iter_archive_batches(columns=None, clients=None, start=None, end=None, archive_dir=ARCHIVE_DIR):
+    dataset = open_archive(archive_dir)
+    if dataset is None:
+        return
+    yield from dataset.to_batches(columns=columns, filter=archive_filter(clients, start, end))
@@ -0,0 +1,70 @@
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2  # 16-bit PCM
+CHANNELS = 1
+FRAME_MS = 30
+FRAME_BYTES = SAMPLE_RATE * SAMPLE_WIDTH * CHANNELS * FRAME_MS // 1000
+
+class RingBuffer:
+    # Fixed-size PCM ring; writes overwrite the oldest audio once full, nothing is reallocated
+    def __init__(self, seconds=15, sample_rate=SAMPLE_RATE, sample_width=SAMPLE_WIDTH):
+        self.capacity = int(seconds * sample_rate) * sample_width
+        self.buf = bytearray(self.capacity)
+        self.view = memoryview(self.buf)
+        self.scratch = bytearray(self.capacity)  # reused when a read wraps around the end
+        self.write_pos = 0
+        self.size = 0
+
+    def write(self, data):
+        data = memoryview(data).cast("B")
+        n = len(data)
+        if n >= self.capacity:
+            data, n = data[n - self.capacity:], self.capacity
+        first = min(n, self.capacity - self.write_pos)
+        self.view[self.write_pos:self.write_pos + first] = data[:first]
+        self.view[:n - first] = data[first:]
+        self.write_pos = (self.write_pos + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+
+    def last(self, n=None):
+        # Most recent n bytes as a memoryview; only a wrapped read touches the scratch buffer
+        n = self.size if n is None else min(n, self.size)
+        start = (self.write_pos - n) % self.capacity
+        if start + n <= self.capacity:
+            return self.view[start:start + n]
+        head = self.capacity - start
+        scratch = memoryview(self.scratch)
+        scratch[:head] = self.view[start:]
+        scratch[head:n] = self.view[:n - head]
+        return scratch[:n]
+
+    def clear(self):
+        self.write_pos = 0
+        self.size = 0
+
+def iter_frames(stream, frame_bytes=FRAME_BYTES):
+    # Pulls fixed-size PCM frames from a PyAudio-style stream (sr.Microphone().stream)
+    while True:
+        yield stream.read(frame_bytes // SAMPLE_WIDTH)
+
+class AudioPipeline:
+    def __init__(self, seconds=15, sample_rate=SAMPLE_RATE, sample_width=SAMPLE_WIDTH):
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self.ring = RingBuffer(seconds, sample_rate, sample_width)
+
+    def start_utterance(self):
+        self.ring.clear()
+
+    def feed(self, frame):
+        self.ring.write(frame)
+
+    def utterance(self):
+        return self.ring.last()
+
+def audio_data(pcm, sample_rate=SAMPLE_RATE, sample_width=SAMPLE_WIDTH):
+    # speech_recognition backends want an AudioData; this is the one unavoidable copy
+    import speech_recognition as sr
+    return sr.AudioData(bytes(pcm), sample_rate, sample_width)
+
+def recognize_google(recognizer, pcm, sample_rate=SAMPLE_RATE, sample_width=SAMPLE_WIDTH):
+    return recognizer.recognize_google(audio_data(pcm, sample_rate, sample_width))
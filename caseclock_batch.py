@@ -0,0 +1,156 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from caseclock_commands import parse_dictation
+from caseclock_storage import CASE_FILE, load_json, new_entry, save_json
+from caseclock_streaming import VOSK_MODEL_PATH
+
+DRAFTS_FILE = "caseclock_drafts.json"
+AUDIO_SUFFIXES = {".wav"}
+CHUNK_FRAMES = 8000
+
+# One warm recognizer per worker process, loaded by the pool initializer
+_model = None
+
+def init_worker(model_path):
+    global _model
+    from vosk import Model, SetLogLevel
+    SetLogLevel(-1)
+    _model = Model(model_path)
+
+def read_pcm(path):
+    # -> (16-bit mono PCM bytes, sample rate); stereo is down-mixed
+    with wave.open(str(path), "rb") as w:
+        if w.getsampwidth() != 2:
+            raise ValueError(f"{path}: expected 16-bit PCM")
+        rate, channels = w.getframerate(), w.getnchannels()
+        pcm = w.readframes(w.getnframes())
+    if channels > 1:
+        import numpy as np
+        samples = np.frombuffer(pcm, dtype=np.int16).reshape(-1, channels)
+        pcm = samples.mean(axis=1).astype(np.int16).tobytes()
+    return pcm, rate
+
+def transcribe_file(path):
+    from vosk import KaldiRecognizer
+    pcm, rate = read_pcm(path)
+    rec = KaldiRecognizer(_model, rate)
+    view = memoryview(pcm)
+    step = CHUNK_FRAMES * 2
+    parts = []
+    for i in range(0, len(view), step):
+        if rec.AcceptWaveform(bytes(view[i:i + step])):
+            parts.append(json.loads(rec.Result())["text"])
+    parts.append(json.loads(rec.FinalResult())["text"])
+    return " ".join(p for p in parts if p)
+
+def process_file(path):
+    started = time.perf_counter()
+    try:
+        return {"path": str(path), "text": transcribe_file(path), "error": None,
+                "seconds": time.perf_counter() - started}
+    except Exception as e:
+        return {"path": str(path), "text": "", "error": str(e), "seconds": time.perf_counter() - started}
+
+def audio_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def new_recordings(files, drafts):
+    # -> [(path, hash)] for files no draft came from yet, by path or by content (a copy or
+    # a renamed recording); a file repeated within the batch is taken once
+    seen_paths = {d.get("source_path") for d in drafts}
+    seen_hashes = {d.get("audio_hash") for d in drafts}
+    fresh = []
+    for path in files:
+        if str(path.resolve()) in seen_paths:
+            continue
+        digest = audio_hash(path)
+        if digest in seen_hashes:
+            continue
+        seen_hashes.add(digest)
+        fresh.append((path, digest))
+    return fresh
+
+def draft_entry(result, recorded_at, case_names, digest=None):
+    # The recording's timestamp is when the work was dictated, so it closes the interval
+    parsed = parse_dictation(result["text"], case_names)
+    end = int(recorded_at)
+    seconds = parsed["seconds"] or 0
+    return new_entry(
+        parsed["client"], end - seconds, end,
+        task_type=parsed["task_type"],
+        notes=parsed["notes"],
+        source=Path(result["path"]).name,
+        source_path=str(Path(result["path"]).resolve()),
+        audio_hash=digest,
+        draft=True,
+        needs_review=not (parsed["client"] and seconds),
+    )
+
+def ingest_directory(directory, workers=None, model_path=VOSK_MODEL_PATH, case_names=None,
+                     drafts_path=DRAFTS_FILE):
+    found = sorted(
+        (p for p in Path(directory).iterdir() if p.suffix.lower() in AUDIO_SUFFIXES),
+        key=lambda p: p.stat().st_mtime,
+    )
+    # Running again over the same folder only picks up recordings added since
+    existing = load_json(drafts_path, [])
+    fresh = new_recordings(found, existing)
+    files = [p for p, _ in fresh]
+    case_names = case_names if case_names is not None else load_json(CASE_FILE, [])
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    results = []
+    if files:
+        with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(model_path,)) as pool:
+            # map() keeps results in submission order, i.e. file timestamp order
+            results = list(pool.map(process_file, files, chunksize=max(1, len(files) // (workers * 4))))
+    elapsed = time.perf_counter() - started
+
+    drafts = [draft_entry(r, f.stat().st_mtime, case_names, digest)
+              for (f, digest), r in zip(fresh, results) if not r["error"]]
+    errors = [r for r in results if r["error"]]
+    if drafts:
+        save_json(drafts_path, existing + drafts)
+    rate = len(files) / elapsed if elapsed else 0.0
+    return {
+        "files": len(files),
+        "skipped": len(found) - len(files),
+        "drafts": len(drafts),
+        "errors": errors,
+        "elapsed_s": elapsed,
+        "files_per_s": rate,
+        "files_per_s_per_core": rate / workers,
+        "workers": workers,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcribe a folder of dictated time notes into draft log entries")
+    parser.add_argument("directory")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--model", default=VOSK_MODEL_PATH, help="Vosk model directory (or set VOSK_MODEL_PATH)")
+    parser.add_argument("--out", default=DRAFTS_FILE)
+    args = parser.parse_args()
+    if not args.model:
+        parser.error("no Vosk model: pass --model or set VOSK_MODEL_PATH")
+
+    report = ingest_directory(args.directory, args.workers, args.model, drafts_path=args.out)
+    print(f"📝 {report['drafts']} draft entries from {report['files']} files -> {args.out}"
+          + (f" ({report['skipped']} already drafted)" if report["skipped"] else ""))
+    for e in report["errors"]:
+        print(f"❌ {e['path']}: {e['error']}")
+    print(f"⏱️ {report['elapsed_s']:.1f}s, {report['files_per_s']:.2f} files/s "
+          f"({report['files_per_s_per_core']:.2f} files/s per core, {report['workers']} workers)")
+
+if __name__ == "__main__":
+    main()
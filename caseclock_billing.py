@@ -0,0 +1,137 @@
+import datetime
+import time
+
+import numpy as np
+import pandas as pd
+from dateutil.tz import tzlocal
+
+from caseclock_storage import DISPLAY_TZ, duration_seconds, entry_start_ts, load_json, new_entry, to_epoch
+
+BILLING_FILE = "caseclock_billing_rules.json"
+
+# Tenth-hour, round-to-nearest is what caseclock_log_human_readable.csv uses (25 min -> 0.4)
+DEFAULT_RULE = {"rate": 250.0, "increment": 0.1, "minimum": 0.1, "rounding": "nearest"}
+
+def load_rules(path=BILLING_FILE):
+    # {"default": {...}, "clients": {"Sierra Club": {"rate": 300, "increment": 0.25}}}
+    rules = load_json(path, {})
+    default = {**DEFAULT_RULE, **rules.get("default", {})}
+    clients = {c: {**default, **r} for c, r in rules.get("clients", {}).items()}
+    return default, clients
+
+def billable_hours(seconds, increment, minimum, round_up):
+    # All inputs are equal-length arrays; work in whole increments to avoid float drift
+    seconds = np.asarray(seconds, dtype=np.float64)
+    step = np.asarray(increment, dtype=np.float64) * 3600
+    units = np.where(round_up, np.ceil(seconds / step), np.floor(seconds / step + 0.5))
+    hours = np.round(units * np.asarray(increment, dtype=np.float64), 2)
+    hours = np.maximum(hours, minimum)
+    return np.where(seconds > 0, hours, 0.0)
+
+def wall_clock(ts):
+    # Epoch seconds (or a UTC timestamp column, as the archive stores) -> naive wall-clock
+    # times in the display zone, converted in one pass
+    if not isinstance(ts, pd.Series):
+        ts = pd.Series(pd.to_datetime(np.asarray(ts, dtype=np.int64), unit="s", utc=True))
+    return ts.dt.tz_convert(DISPLAY_TZ or tzlocal()).dt.tz_localize(None)
+
+def log_frame(logs, starts=None):
+    # start is wall-clock (for month/day grouping); durations come from the entries, not end - start
+    if starts is None:
+        starts = np.fromiter((entry_start_ts(e) for e in logs), np.int64, len(logs))
+    return pd.DataFrame({
+        "client": pd.Categorical([e["client"] for e in logs]),
+        "start": wall_clock(starts),
+        "duration_seconds": np.fromiter((duration_seconds(e) for e in logs), np.int64, len(logs)),
+    })
+
+def month_bounds(month):
+    # "YYYY-MM" -> [first, next first) as epoch seconds in the display zone
+    first = datetime.datetime.strptime(month, "%Y-%m")
+    following = (first + datetime.timedelta(days=32)).replace(day=1)
+    return to_epoch(first, DISPLAY_TZ), to_epoch(following, DISPLAY_TZ)
+
+def apply_billing(df, rules=None):
+    # Adds billable_hours, rate and amount columns to a frame with client + duration_seconds
+    default, clients = rules or load_rules()
+    names = df["client"].astype("category")
+    cats = names.cat.categories
+    codes = names.cat.codes.to_numpy()
+
+    # Resolve rules once per distinct client, then gather by category code
+    per_client = [clients.get(c, default) for c in cats]
+    def column(key, dtype):
+        return np.array([r[key] for r in per_client], dtype=dtype)[codes]
+
+    rate = column("rate", np.float64)
+    hours = billable_hours(
+        df["duration_seconds"].to_numpy(),
+        column("increment", np.float64),
+        column("minimum", np.float64),
+        column("rounding", object) == "up",
+    )
+    out = df.copy()
+    out["billable_hours"] = hours
+    out["rate"] = rate
+    out["amount"] = np.round(hours * rate, 2)
+    return out
+
+def invoice_totals(df, rules=None):
+    billed = apply_billing(df, rules)
+    totals = billed.groupby("client", observed=True).agg(
+        entries=("duration_seconds", "size"),
+        raw_hours=("duration_seconds", "sum"),
+        billable_hours=("billable_hours", "sum"),
+        amount=("amount", "sum"),
+    )
+    totals["raw_hours"] = (totals["raw_hours"] / 3600).round(2)
+    totals["billable_hours"] = totals["billable_hours"].round(2)
+    totals["amount"] = totals["amount"].round(2)
+    return totals.reset_index()
+
+def month_end_invoices(month, logs=(), rules=None, archive_dir=None):
+    # month is "YYYY-MM"; closed months come from the Parquet archive, the open one from the log
+    from caseclock_archive import ARCHIVE_DIR, query_archive
+    from caseclock_dedupe import entry_uid
+    first = pd.Timestamp(f"{month}-01")
+    archived = query_archive(
+        columns=["client", "start", "duration_seconds", "uid"],
+        start=first.to_pydatetime(),
+        end=(first + pd.offsets.MonthBegin(1)).to_pydatetime(),
+        archive_dir=archive_dir or ARCHIVE_DIR,
+    ).to_pandas()
+    archived["start"] = wall_clock(archived["start"])
+    # Cut the log down to the month on raw epochs first; only those rows are framed and hashed
+    lo, hi = month_bounds(month)
+    starts = np.fromiter((entry_start_ts(e) for e in logs), np.int64, len(logs))
+    keep = np.flatnonzero((starts >= lo) & (starts < hi))
+    in_month = [logs[i] for i in keep]
+    active = log_frame(in_month, starts[keep])
+    # A log entry that is also archived (a stale copy saved back) is billed once
+    active["uid"] = [entry_uid(e) for e in in_month]
+    active = active[~active["uid"].isin(set(archived["uid"]))]
+    frame = pd.concat([archived, active], ignore_index=True).drop(columns="uid")
+    return invoice_totals(frame, rules)
+
+def benchmark(n=1_000_000, n_clients=200, months=12, seed=0):
+    # The whole month-end path over a year-long log: month cut, framing, hashing, billing
+    import tempfile
+    rng = np.random.default_rng(seed)
+    clients = [f"Client {i}" for i in range(n_clients)]
+    lo, _ = month_bounds("2025-01")
+    starts = np.sort(rng.integers(lo, lo + months * 30 * 86400, n))
+    durations = rng.integers(0, 4 * 3600, n)
+    picks = rng.integers(0, n_clients, n)
+    logs = [new_entry(clients[c], s, s + d) for c, s, d in zip(picks.tolist(), starts.tolist(), durations.tolist())]
+    rules = (DEFAULT_RULE, {f"Client {i}": {**DEFAULT_RULE, "increment": 0.25, "rate": 300.0}
+                            for i in range(0, n_clients, 3)})
+    with tempfile.TemporaryDirectory() as archive_dir:
+        started = time.perf_counter()
+        totals = month_end_invoices("2025-06", logs, rules, archive_dir=archive_dir)
+        elapsed = time.perf_counter() - started
+    return elapsed, totals
+
+if __name__ == "__main__":
+    elapsed, totals = benchmark()
+    print(f"Month-end invoices from a 1,000,000-entry log ({totals['entries'].sum():,} in the month, "
+          f"{len(totals)} clients) in {elapsed:.3f}s")
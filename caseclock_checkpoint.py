@@ -0,0 +1,166 @@
+import contextlib
+import fcntl
+import json
+import os
+import statistics
+import struct
+import tempfile
+import time
+import zlib
+
+from caseclock_storage import save_json
+
+CHECKPOINT_FILE = "caseclock_timers.ckpt"
+SLOT_SIZE = 4096
+MAGIC = b"CCK1"
+# magic, sequence number, written-at epoch, payload length, payload crc32
+HEADER = struct.Struct("<4sQdII")
+# macOS has no fdatasync
+_datasync = getattr(os, "fdatasync", os.fsync)
+
+class Checkpoint:
+    # File of two equal slots written in turn with a single pwrite, no temp file, no
+    # rename. A write torn by a crash fails its CRC and the other slot still holds the
+    # previous state. State changes are fdatasync'ed (sync=False skips it); heartbeats
+    # never are, since losing one only costs a slightly older last-seen time.
+    # Slots start at slot_size and double when the state outgrows them; the file size says
+    # how big they are. Writers that share the file take locked() around read-modify-write.
+    def __init__(self, path=CHECKPOINT_FILE, slot_size=SLOT_SIZE, sync=True):
+        self.path = path
+        self.sync = sync
+        self.fd = None
+        self.holding = False
+        self._open(slot_size)
+
+    def _open(self, slot_size=SLOT_SIZE):
+        if self.fd is not None:
+            os.close(self.fd)
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self.fd).st_size < 2 * slot_size:
+            os.ftruncate(self.fd, 2 * slot_size)
+        self.refresh()
+
+    def refresh(self):
+        # Picks up the newest slot, whoever wrote it
+        self.slot_size = os.fstat(self.fd).st_size // 2
+        self.seq, self.written_at, self.payload = 0, None, None
+        for slot in (0, 1):
+            found = self._read_slot(slot)
+            if found and found[0] > self.seq:
+                self.seq, self.written_at, self.payload = found
+
+    def _replaced(self):
+        # A writer that grew the slots swapped in a new file
+        try:
+            return os.stat(self.path).st_ino != os.fstat(self.fd).st_ino
+        except FileNotFoundError:
+            return True
+
+    @contextlib.contextmanager
+    def locked(self):
+        # flock belongs to the open file, so it also holds off other sessions in this process
+        while True:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+            if not self._replaced():
+                break
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            self._open()
+        self.holding = True
+        try:
+            self.refresh()
+            yield self
+        finally:
+            self.holding = False
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def _read_slot(self, slot):
+        data = os.pread(self.fd, self.slot_size, slot * self.slot_size)
+        if len(data) < HEADER.size:
+            return None
+        magic, seq, written_at, length, crc = HEADER.unpack_from(data)
+        payload = data[HEADER.size:HEADER.size + length]
+        if magic != MAGIC or len(payload) != length or zlib.crc32(payload) != crc:
+            return None
+        return seq, written_at, payload
+
+    def read(self):
+        # -> (state, written-at epoch), or (None, None) for a fresh file
+        if self.payload is None:
+            return None, None
+        return json.loads(self.payload), self.written_at
+
+    def write(self, state, now=None):
+        payload = json.dumps(state, separators=(",", ":")).encode()
+        self._write(payload, time.time() if now is None else now, self.sync)
+
+    def touch(self, now=None, interval=5.0):
+        # Heartbeat: re-stamps the current state at most every interval seconds
+        now = time.time() if now is None else now
+        if self.payload is not None and (self.written_at is None or now - self.written_at >= interval):
+            self._write(self.payload, now, False)
+
+    def _write(self, payload, now, sync):
+        seq = self.seq + 1
+        record = HEADER.pack(MAGIC, seq, now, len(payload), zlib.crc32(payload)) + payload
+        if len(record) > self.slot_size:
+            self._grow(record, seq)
+        else:
+            os.pwrite(self.fd, record, (seq % 2) * self.slot_size)
+            if sync:
+                _datasync(self.fd)
+        self.seq, self.written_at, self.payload = seq, now, payload
+
+    def _grow(self, record, seq):
+        # Rare: a new file with doubled slots replaces the old one in a single rename. It is
+        # locked before it becomes visible, so a writer waiting on the old file re-locks it after us.
+        slot_size = self.slot_size
+        while slot_size < len(record):
+            slot_size *= 2
+        tmp = f"{self.path}.grow"
+        fd = os.open(tmp, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            os.ftruncate(fd, 2 * slot_size)
+            os.pwrite(fd, record, (seq % 2) * slot_size)
+            os.fsync(fd)
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.close(fd)
+            raise
+        os.close(self.fd)
+        self.fd, self.slot_size = fd, slot_size
+        if not self.holding:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def close(self):
+        os.close(self.fd)
+
+# === Write-path cost ===
+def _timings(write, n):
+    samples = []
+    for i in range(n):
+        started = time.perf_counter()
+        write(i)
+        samples.append((time.perf_counter() - started) * 1e6)
+    samples.sort()
+    return {"mean_us": statistics.fmean(samples), "p99_us": samples[int(n * 0.99) - 1]}
+
+def benchmark(n=2000, timers=5):
+    # Per-write latency of the checkpoint against the atomic JSON save it replaced
+    state = [[f"Case {i}", f"Case {i}", 1.7e9 + i, 1.7e9 + i, None, 0.0, timers > 1] for i in range(timers)]
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        results["save_json"] = _timings(lambda i: save_json(os.path.join(tmp, "timers.json"), state), n)
+        for sync in (False, True):
+            ckpt = Checkpoint(os.path.join(tmp, f"timers_{sync}.ckpt"), sync=sync)
+            results[f"checkpoint{' +fdatasync' if sync else ''}"] = _timings(lambda i: ckpt.write(state), n)
+            ckpt.close()
+        ckpt = Checkpoint(os.path.join(tmp, "timers.ckpt"))
+        ckpt.write(state)
+        results["heartbeat"] = _timings(lambda i: ckpt.touch(interval=0), n)
+        ckpt.close()
+    return results
+
+if __name__ == "__main__":
+    for name, r in benchmark().items():
+        print(f"{name:>24}: {r['mean_us']:8.1f} µs mean, {r['p99_us']:8.1f} µs p99")
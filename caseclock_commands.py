@@ -0,0 +1,259 @@
+import re
+
+from rapidfuzz import fuzz, process, utils
+
+from caseclock_expense_intent import NUMBER_WORDS, extract_expense, words_to_groups
+
+START_RE = re.compile(r"\b(start|begin|resume|log|logging|track|billing|switch|change to)\b")
+SWITCH_RE = re.compile(r"\b(switch|change) to\b")
+PAUSE_RE = re.compile(r"^\s*pause\b(?:\s+(?:the\s+)?(?:timer\s+)?(?:for\s+|on\s+)?(?P<client>.+))?$")
+STOP_RE = re.compile(r"\b(stop|end|pause)\b")
+LEADING_STOP_RE = re.compile(r"^\s*(stop|end)\b")
+STOP_PHRASE_RE = re.compile(r"^\s*(stop|end|pause)( the)?( logging| tracking| timer| billing| time)?\s*$")
+CASE_PREFIXES = [
+    r"(start|begin|resume|log|logging|track|billing|start billing)( time)?( for)? ",
+    r"(switch to|change to) ",
+    r"(stop|end)( logging| tracking)?( for)? ",
+]
+MATCH_THRESHOLD = 80
+
+TASK_TYPES = ["briefing", "meeting", "research", "prep", "email", "call", "other"]
+TASK_SYNONYMS = {
+    "briefing": ["briefing", "brief", "drafting", "drafted", "draft", "writing"],
+    "meeting": ["meeting", "met with", "met", "conference"],
+    "research": ["research", "researched", "reviewed", "review"],
+    "prep": ["prep", "prepared", "preparation", "preparing"],
+    "email": ["email", "emails", "emailed", "correspondence"],
+    "call": ["call", "called", "phone", "phoned"],
+}
+TASK_RE = re.compile(r"\b(" + "|".join(
+    sorted((re.escape(w) for ws in TASK_SYNONYMS.values() for w in ws), key=len, reverse=True)
+) + r")\b")
+TASK_LOOKUP = {w: t for t, ws in TASK_SYNONYMS.items() for w in ws}
+
+_NUM = r"(?:\d+(?:\.\d+)?|(?:(?:" + "|".join(NUMBER_WORDS) + r")\s*)+)"
+DURATION_RE = re.compile(
+    r"\b(?:(?P<half>half an? hour|half hour)"
+    r"|(?P<quarter>quarter (?:of an )?hour)"
+    r"|(?P<hour_half>an hour and a half)"
+    r"|(?P<an_hour>an hour)"
+    rf"|(?P<num>{_NUM})\s*(?P<unit>hours?|hrs?|minutes?|mins?))\b"
+)
+# "log the last 30 minutes to Sierra Club and Queen Creek"
+ALLOCATE_RE = re.compile(
+    r"^(?:log|put|bill|allocate|assign|give|charge)\s+(?:the\s+)?(?:last|past|previous)\s+"
+    r"(?P<duration>.+?)\s+(?:to|on|for)\s+(?:the\s+)?(?P<clients>.+?)(?:\s+(?:matter|case)s?)?$"
+)
+
+def extract_case_name(text):
+    text = text.lower()
+    for pattern in CASE_PREFIXES:
+        text = re.sub(pattern, "", text)
+    return text.strip()
+
+def match_case(text, case_names):
+    # -> (case, score 0-100); unknown names fall through as typed with score 0
+    if not text or not case_names:
+        return text.strip(), 0
+    match, score, _ = process.extractOne(text, case_names, processor=utils.default_process)
+    return (match, score) if score >= MATCH_THRESHOLD else (text.strip(), score)
+
+def spoken_number(text):
+    text = text.strip()
+    if re.fullmatch(r"\d+(?:\.\d+)?", text):
+        return float(text)
+    groups = words_to_groups(text.split())
+    return float(groups[0]) if groups else None
+
+def parse_duration_phrase(text):
+    # "two hours", "45 minutes", "half an hour", "an hour and a half" -> seconds (summed)
+    total = 0
+    for m in DURATION_RE.finditer(text.lower()):
+        if m.group("half"):
+            total += 1800
+        elif m.group("quarter"):
+            total += 900
+        elif m.group("hour_half"):
+            total += 5400
+        elif m.group("an_hour"):
+            total += 3600
+        else:
+            n = spoken_number(m.group("num"))
+            if n is not None:
+                total += int(n * (3600 if m.group("unit").startswith("h") else 60))
+    return total or None
+
+def detect_task_type(text):
+    m = TASK_RE.search(text.lower())
+    return TASK_LOOKUP[m.group(1)] if m else "other"
+
+def find_case(text, case_names, threshold=85):
+    # Client named anywhere in free-form speech -> (case, score). Each case is compared
+    # against word windows of its own length; names of three or more words also match on
+    # their leading words ("three rivers" for "Three Rivers Waterkeeper").
+    words = utils.default_process(text).split()
+    best, best_score = None, 0
+    for case in case_names:
+        target = utils.default_process(case).split()
+        sizes = [len(target)] + ([len(target) - 1] if len(target) >= 3 else [])
+        for size in sizes:
+            windows = [" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))]
+            hit = process.extractOne(" ".join(target[:size]), windows, scorer=fuzz.ratio)
+            score = hit[1] if size == len(target) else hit[1] * 0.95
+            if score > best_score:
+                best, best_score = case, score
+    return (best, best_score) if best_score >= threshold else (None, best_score)
+
+def parse_dictation(text, case_names):
+    # "Sierra Club, research, two hours, reviewed the permit file" -> draft entry fields
+    client, _ = find_case(text, case_names)
+    return {
+        "client": client or "",
+        "seconds": parse_duration_phrase(text),
+        "task_type": detect_task_type(text),
+        "notes": text.strip(),
+    }
+
+def parse_allocation(lower, case_names):
+    # -> allocate intent or None; "last hour" has no number, so pad it to "an hour"
+    m = ALLOCATE_RE.match(lower)
+    if not m:
+        return None
+    duration = m.group("duration")
+    seconds = parse_duration_phrase(duration if re.search(r"\d|\ban?\b|half|quarter", duration)
+                                    else "an " + duration)
+    if not seconds:
+        return None
+    clients = m.group("clients")
+    # A case called "Smith and Jones" is one client, not two
+    # (plain ratio: the default scorer's partial matching accepts "Sierra Club and Queen Creek")
+    whole = process.extractOne(clients, case_names, scorer=fuzz.ratio, processor=utils.default_process) if case_names else None
+    if whole and whole[1] >= 90:
+        matches = [whole[:2]]
+    else:
+        matches = [match_case(name, case_names) for name in re.split(r"\s*(?:,|\band\b)\s*", clients) if name]
+    if not matches:
+        return None
+    sure = min(score for _, score in matches) / 100
+    return {"action": "allocate", "client": matches[0][0], "clients": [c for c, _ in matches],
+            "minutes": seconds // 60, "confidence": sure}
+
+def interpret_command(text, case_names):
+    # -> {"action": start|stop|pause|expense|allocate|unrecognized, "client", "confidence", ...}
+    lower = text.lower().strip()
+    if not lower:
+        return {"action": "unrecognized", "client": None, "confidence": 0.0}
+
+    # Checked first: "log the last ..." would otherwise read as a start command
+    allocation = parse_allocation(lower, case_names)
+    if allocation:
+        return allocation
+
+    expense = extract_expense(lower)
+    if expense:
+        client, score = match_case(expense["client"], case_names)
+        sure = 0.5 + 0.25 * (expense["amount"] is not None) + 0.25 * (score >= MATCH_THRESHOLD)
+        return {"action": "expense", "client": client, "confidence": sure,
+                "category": expense["category"], "amount": expense["amount"]}
+
+    # "pause" alone pauses whatever is running; "pause sierra club" just that timer
+    m = PAUSE_RE.match(lower)
+    if m:
+        if not m.group("client") or STOP_PHRASE_RE.match(lower):
+            return {"action": "pause", "client": None, "confidence": 1.0}
+        client, score = match_case(m.group("client"), case_names)
+        return {"action": "pause", "client": client, "confidence": score / 100}
+
+    # "stop logging" contains a start word, so a leading stop word wins
+    if STOP_PHRASE_RE.match(lower):
+        return {"action": "stop", "client": None, "confidence": 1.0}
+
+    # "stop billing sierra club" names a start word too; the leading verb decides
+    if START_RE.search(lower) and not LEADING_STOP_RE.match(lower):
+        client, score = match_case(extract_case_name(lower), case_names)
+        if client:
+            return {"action": "start", "client": client, "confidence": score / 100,
+                    "switch": bool(SWITCH_RE.search(lower))}
+
+    if STOP_RE.search(lower):
+        # "stop sierra club" stops that timer only; otherwise every timer stops
+        client, score = match_case(extract_case_name(lower), case_names)
+        if score >= MATCH_THRESHOLD:
+            return {"action": "stop", "client": client, "confidence": score / 100}
+        return {"action": "stop", "client": None, "confidence": 0.7}
+
+    return {"action": "unrecognized", "client": None, "confidence": 0.0}
+
+class IncrementalParser:
+    # Runs interpret_command on each partial hypothesis and commits start/stop early
+    # once the intent is unambiguous; finish() reports whether the final disagreed.
+    def __init__(self, case_names, commit_threshold=0.9, stable_partials=2, resolve=None):
+        self.case_names = case_names
+        # resolve(text) -> intent; lets callers put an IntentCache in front of the parser
+        self.resolve = resolve or (lambda text: interpret_command(text, self.case_names))
+        self.commit_threshold = commit_threshold
+        self.stable_partials = stable_partials
+        self.reset()
+
+    def reset(self):
+        self.committed = None
+        self.last = None
+        self.stable = 0
+
+    def feed(self, partial):
+        if self.committed or not partial:
+            return None
+        intent = self.resolve(partial)
+        key = (intent["action"], intent["client"])
+        self.stable = self.stable + 1 if key == self.last else 1
+        self.last = key
+        if intent["action"] not in ("start", "stop") or intent["confidence"] < self.commit_threshold:
+            return None
+        # A client name must hold across partials. A bare "stop" may still be followed by one
+        # ("stop ... sierra club"), so stop-everything waits for the endpoint
+        if intent["client"] is None:
+            return None
+        if self.stable >= self.stable_partials:
+            self.committed = intent
+            return intent
+        return None
+
+    def finish(self, final_text):
+        # -> (final intent, correction needed?)
+        intent = self.resolve(final_text)
+        early = self.committed
+        corrected = early is not None and (early["action"], early["client"]) != (intent["action"], intent["client"])
+        return intent, corrected
+
+# === Regression table ===
+EXAMPLE_CASES = ["Sierra Club", "Queen Creek", "Three Rivers Waterkeeper"]
+EXAMPLES = [
+    # (utterance, action, client)
+    ("start billing sierra club", "start", "Sierra Club"),
+    ("log time for queen creek", "start", "Queen Creek"),
+    ("switch to queen creek", "start", "Queen Creek"),
+    ("stop logging", "stop", None),
+    ("stop sierra club", "stop", "Sierra Club"),
+    ("stop logging for sierra club", "stop", "Sierra Club"),
+    ("stop billing sierra club", "stop", "Sierra Club"),
+    ("end tracking for queen creek", "stop", "Queen Creek"),
+    ("pause", "pause", None),
+    ("pause sierra club", "pause", "Sierra Club"),
+    ("log the last 30 minutes to sierra club and queen creek", "allocate", "Sierra Club"),
+]
+
+def check_examples(examples=EXAMPLES, case_names=EXAMPLE_CASES):
+    # -> [(utterance, expected, got)] for every example that parses differently
+    failures = []
+    for text, action, client in examples:
+        intent = interpret_command(text, case_names)
+        if (intent["action"], intent["client"]) != (action, client):
+            failures.append((text, (action, client), (intent["action"], intent["client"])))
+    return failures
+
+if __name__ == "__main__":
+    failures = check_examples()
+    for text, expected, got in failures:
+        print(f"{text!r}: expected {expected}, got {got}")
+    print(f"{len(EXAMPLES) - len(failures)}/{len(EXAMPLES)} examples parse as expected")
+    raise SystemExit(1 if failures else 0)
@@ -0,0 +1,124 @@
+import datetime
+import os
+import struct
+import time
+from array import array
+from bisect import bisect_left
+
+from caseclock_storage import DISPLAY_TZ, LOG_FILE, entry_start_ts, local_time
+
+INDEX_SUFFIX = ".idx"
+MAGIC = b"CCX1"
+# magic, log mtime_ns, log size, entry count
+HEADER = struct.Struct("<4sqqQ")
+
+class DateIndex:
+    # Entry start times in sorted order alongside each entry's position in the log list.
+    # Range reads bisect into it: O(log n + k). Saved next to the log, stamped with the
+    # log file's stat so a log changed behind its back is detected and re-indexed. The
+    # stamp only vouches for a list read straight from that file: a list merged or
+    # refreshed in memory can hold the same entries in another order, so index it with build().
+    def __init__(self, path=LOG_FILE + INDEX_SUFFIX):
+        self.path = path
+        self.starts = array("q")
+        self.positions = array("I")
+        self.count = 0  # how many log entries are indexed (a prefix of the list)
+
+    @classmethod
+    def open(cls, logs, log_path=LOG_FILE):
+        index = cls(log_path + INDEX_SUFFIX)
+        if not index.load(log_path, len(logs)):
+            index.rebuild(logs)
+            if os.path.exists(log_path):
+                index.save(log_path)
+        return index
+
+    @classmethod
+    def build(cls, logs, log_path=LOG_FILE):
+        # From the list in memory, ignoring the sidecar; the next sync() saves it
+        index = cls(log_path + INDEX_SUFFIX)
+        index.rebuild(logs)
+        return index
+
+    def load(self, log_path, expected_count):
+        try:
+            with open(self.path, "rb") as f:
+                magic, mtime_ns, size, count = HEADER.unpack(f.read(HEADER.size))
+                st = os.stat(log_path)
+                if magic != MAGIC or (mtime_ns, size) != (st.st_mtime_ns, st.st_size) or count != expected_count:
+                    return False
+                self.starts = array("q")
+                self.starts.frombytes(f.read(8 * count))
+                self.positions = array("I")
+                self.positions.frombytes(f.read(4 * count))
+        except (OSError, struct.error):
+            return False
+        self.count = count
+        return len(self.starts) == len(self.positions) == count
+
+    def save(self, log_path=LOG_FILE):
+        st = os.stat(log_path)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(HEADER.pack(MAGIC, st.st_mtime_ns, st.st_size, self.count))
+            f.write(self.starts.tobytes())
+            f.write(self.positions.tobytes())
+        os.replace(tmp, self.path)
+
+    def rebuild(self, logs):
+        order = sorted(range(len(logs)), key=lambda i: entry_start_ts(logs[i]))
+        self.starts = array("q", (entry_start_ts(logs[i]) for i in order))
+        self.positions = array("I", order)
+        self.count = len(logs)
+
+    def add(self, entry, position):
+        # Entries are usually logged in time order, so this is normally a plain append
+        ts = entry_start_ts(entry)
+        if not self.starts or ts >= self.starts[-1]:
+            self.starts.append(ts)
+            self.positions.append(position)
+        else:
+            i = bisect_left(self.starts, ts)
+            self.starts.insert(i, ts)
+            self.positions.insert(i, position)
+        self.count += 1
+
+    def sync(self, logs, log_path=LOG_FILE, edited=False):
+        # Call after the log was saved: indexes appended entries; edits and deletes re-index
+        if edited or len(logs) < self.count:
+            self.rebuild(logs)
+        else:
+            for position in range(self.count, len(logs)):
+                self.add(logs[position], position)
+        self.save(log_path)
+
+    def positions_between(self, start=None, end=None):
+        lo = 0 if start is None else bisect_left(self.starts, start)
+        hi = len(self.starts) if end is None else bisect_left(self.starts, end)
+        return self.positions[lo:hi]
+
+    def entries(self, logs, start=None, end=None):
+        # Entries starting in [start, end), oldest first
+        return [logs[i] for i in self.positions_between(start, end)]
+
+# === Calendar ranges, as epoch bounds of days in the display zone ===
+def today():
+    return local_time(time.time()).date()
+
+def day_start_ts(day):
+    return int(datetime.datetime.combine(day, datetime.time(), DISPLAY_TZ).timestamp())
+
+def span_range(first_day, days):
+    return day_start_ts(first_day), day_start_ts(first_day + datetime.timedelta(days=days))
+
+def day_range(day=None):
+    return span_range(day or today(), 1)
+
+def week_range(day=None):
+    day = day or today()
+    return span_range(day - datetime.timedelta(days=day.weekday()), 7)
+
+def month_range(day=None):
+    first = (day or today()).replace(day=1)
+    following = (first + datetime.timedelta(days=32)).replace(day=1)
+    return span_range(first, (following - first).days)
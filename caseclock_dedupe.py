@@ -0,0 +1,216 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import struct
+import time
+from collections import Counter
+
+from caseclock_migrate import is_canonical, migrate_entry
+from caseclock_storage import DISPLAY_TZ, LOG_FILE, entry_label, load_log, log_lock, save_log
+
+HASHES_SUFFIX = ".hashes"
+MAGIC = b"CCH1"
+# magic, log mtime_ns, log size, entries covered, digests stored
+HEADER = struct.Struct("<4sqqQQ")
+DIGEST_SIZE = 16
+
+def entry_digest(entry):
+    # Content address of an entry: who, for whom, when. Notes and task type are left out,
+    # so the same span saved twice with different notes is still a duplicate. Legacy entries
+    # are hashed as they migrate, so an old string-timed copy matches its epoch twin.
+    if not is_canonical(entry):
+        entry = migrate_entry(entry)
+    raw = json.dumps([entry.get("user", ""), entry["client"], entry["start"], entry["end"]])
+    return hashlib.sha256(raw.encode()).digest()[:DIGEST_SIZE]
+
+def entry_uid(entry):
+    return entry_digest(entry).hex()
+
+class DuplicateEntry(ValueError):
+    pass
+
+class EntryHashes:
+    # Persistent multiset of entry digests, saved next to the log like the date index and
+    # stamped with the log file's stat. Membership is O(1); appends after a save only append
+    # their digests to the file. Digests are counted, so discarding one copy of an entry
+    # that is logged twice still leaves the other one known.
+    def __init__(self, path=LOG_FILE + HASHES_SUFFIX):
+        self.path = path
+        self.digests = Counter()
+        self.unsynced = Counter()  # add()ed since the last sync; the log tail will hold them
+        self.count = 0      # log entries covered (a prefix of the list)
+        self.stored = 0     # digests already in the file
+
+    @classmethod
+    def open(cls, logs, log_path=LOG_FILE):
+        hashes = cls(log_path + HASHES_SUFFIX)
+        if not hashes.load(log_path, len(logs)):
+            hashes.rebuild(logs)
+            if os.path.exists(log_path):
+                hashes.save(log_path)
+        return hashes
+
+    def __len__(self):
+        return len(self.digests)
+
+    def __contains__(self, entry):
+        return entry_digest(entry) in self.digests
+
+    def load(self, log_path, expected_count):
+        try:
+            with open(self.path, "rb") as f:
+                magic, mtime_ns, size, count, stored = HEADER.unpack(f.read(HEADER.size))
+                st = os.stat(log_path)
+                if magic != MAGIC or (mtime_ns, size) != (st.st_mtime_ns, st.st_size) or count != expected_count:
+                    return False
+                data = f.read(DIGEST_SIZE * stored)
+        except (OSError, struct.error):
+            return False
+        if len(data) != DIGEST_SIZE * stored:
+            return False
+        self.digests = Counter(data[i:i + DIGEST_SIZE] for i in range(0, len(data), DIGEST_SIZE))
+        self.count, self.stored = count, stored
+        return True
+
+    def _header(self, log_path):
+        st = os.stat(log_path)
+        return HEADER.pack(MAGIC, st.st_mtime_ns, st.st_size, self.count, self.digests.total())
+
+    def save(self, log_path=LOG_FILE):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(self._header(log_path))
+            f.write(b"".join(self.digests.elements()))
+        os.replace(tmp, self.path)
+        self.stored = self.digests.total()
+
+    def rebuild(self, logs):
+        self.digests = Counter(entry_digest(e) for e in logs)
+        self.unsynced.clear()
+        self.count = len(logs)
+
+    def check(self, entry, ignore=None):
+        # An edit may keep its own key: pass the entry being replaced as `ignore`
+        digest = entry_digest(entry)
+        copies = self.digests[digest] - (ignore is not None and digest == entry_digest(ignore))
+        if copies > 0:
+            raise DuplicateEntry(f"Already logged: {entry_label(entry)}")
+
+    def add(self, entry):
+        self.add_digest(entry_digest(entry))
+
+    def add_digest(self, digest):
+        self.digests[digest] += 1
+        self.unsynced[digest] += 1
+
+    def discard(self, entry):
+        digest = entry_digest(entry)
+        if self.digests[digest] > 1:
+            self.digests[digest] -= 1
+        else:
+            self.digests.pop(digest, None)
+
+    def sync(self, logs, log_path=LOG_FILE, edited=False):
+        # Call after the log was saved, like DateIndex.sync
+        if edited or len(logs) < self.count:
+            self.rebuild(logs)
+            return self.save(log_path)
+        new = [entry_digest(e) for e in logs[self.count:]]
+        for digest in new:
+            # Already counted if it came through add()
+            if self.unsynced[digest] > 0:
+                self.unsynced[digest] -= 1
+            else:
+                self.digests[digest] += 1
+        self.unsynced.clear()
+        self.count = len(logs)
+        # Digests added through add() that never reached the log are also missing from the file
+        if self.stored + len(new) != self.digests.total() or not os.path.exists(self.path):
+            return self.save(log_path)
+        with open(self.path, "r+b") as f:
+            f.seek(0, os.SEEK_END)
+            f.write(b"".join(new))
+            f.seek(0)
+            f.write(self._header(log_path))
+        self.stored = self.digests.total()
+
+# === Bulk pass over existing files ===
+def dedupe_csv(path, out):
+    # Rows are compared as the importer reads them; rows it can't read are kept as they are
+    import csv
+    from caseclock_import import detect_format, row_parser
+    fmt, header = detect_format(path)
+    parse = row_parser(fmt, header, DISPLAY_TZ, "")
+    kept = dropped = 0
+    seen = set()
+    with open(path, newline="", encoding="utf-8") as src, open(out, "w", newline="", encoding="utf-8") as dst:
+        # One streaming reader over the file, so a quoted note spanning lines stays one row
+        rows, writer = csv.reader(src), csv.writer(dst)
+        writer.writerow(next(rows, []))
+        for row in rows:
+            try:
+                digest = entry_digest(parse(row))
+            except (ValueError, IndexError):
+                digest = None
+            if digest is not None:
+                if digest in seen:
+                    dropped += 1
+                    continue
+                seen.add(digest)
+            writer.writerow(row)
+            kept += 1
+    return kept, dropped
+
+def dedupe_log(path=LOG_FILE, dry_run=False):
+    # The live JSON log: read and rewritten under the log lock, like any other writer
+    with log_lock(path):
+        logs = load_log(path)
+        seen, kept = set(), []
+        for entry in logs:
+            digest = entry_digest(entry)
+            if digest not in seen:
+                seen.add(digest)
+                kept.append(entry)
+        dropped = len(logs) - len(kept)
+        if dropped and not dry_run:
+            shutil.copy2(path, f"{path}.bak")
+            # In place: a shared log's list carries its merge base
+            logs[:] = kept
+            save_log(logs, path)
+    return len(kept), dropped
+
+def dedupe_file(path=LOG_FILE, dry_run=False):
+    # Keeps the first copy of each entry; the original goes to .bak
+    started = time.perf_counter()
+    with open(path, encoding="utf-8-sig") as f:
+        is_json = f.read(64).lstrip().startswith("[")
+    if is_json:
+        kept, dropped = dedupe_log(path, dry_run)
+    else:
+        # Legacy CSV exports aren't written by the app: one streaming sweep
+        tmp = f"{path}.dedupe.tmp"
+        try:
+            kept, dropped = dedupe_csv(path, tmp)
+            if dropped and not dry_run:
+                shutil.copy2(path, f"{path}.bak")
+                os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+    return {"path": path, "kept": kept, "dropped": dropped, "elapsed_s": time.perf_counter() - started}
+
+def main():
+    parser = argparse.ArgumentParser(description="Drop duplicate entries (same user, client, start and end)")
+    parser.add_argument("paths", nargs="*", default=[LOG_FILE])
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    for path in args.paths:
+        report = dedupe_file(path, args.dry_run)
+        verb = "would drop" if args.dry_run else "dropped"
+        print(f"{path}: kept {report['kept']:,}, {verb} {report['dropped']:,} duplicates "
+              f"({report['elapsed_s']:.1f}s)")
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,8 @@ import speech_recognition as sr
 from rapidfuzz import process
 import re
 
+from caseclock_history import History
+
 # Load environment and OpenAI API key
 load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY")
@@ -83,6 +85,7 @@ if "is_timing" not in st.session_state:
     st.session_state.start_time = None
     st.session_state.client = ""
     st.session_state.logs = []
+    st.session_state.history = History()
 
 # Command logic
 if transcript:
@@ -117,6 +120,16 @@ if transcript:
 if st.session_state.is_timing:
     st.info(f"⏱️ Timer running for: {st.session_state.client}")
 
+# Undo / redo of edits and deletes
+history = st.session_state.history
+col_undo, col_redo = st.columns(2)
+if history.can_undo and col_undo.button(f"↩️ Undo {history.next_undo()}"):
+    history.undo(st.session_state.logs)
+    st.experimental_rerun()
+if history.can_redo and col_redo.button(f"↪️ Redo {history.next_redo()}"):
+    history.redo(st.session_state.logs)
+    st.experimental_rerun()
+
 # Editable log table
 if st.session_state.logs:
     st.subheader("📋 Time Log (Click to Edit or Delete)")
@@ -129,16 +142,16 @@ if st.session_state.logs:
             new_duration = st.text_input(f"Edit Duration {i}", value=entry['duration'], key=f"edit_dur_{i}")
             new_date = st.text_input(f"Edit Date {i}", value=entry['date'], key=f"edit_date_{i}")
             if st.button(f"💾 Save Changes to Log {i}"):
-                st.session_state.logs[i] = {
+                history.replace(st.session_state.logs, i, {
                     "client": new_client,
                     "start": new_start,
                     "end": new_end,
                     "duration": new_duration,
                     "date": new_date
-                }
+                }, label=f"edit {new_client}")
                 st.success("Changes saved.")
             if st.button(f"🗑️ Delete Log {i}"):
-                st.session_state.logs.pop(i)
+                history.delete(st.session_state.logs, [i], label=f"delete {entry['client']}")
                 st.experimental_rerun()
 
     if st.download_button("📤 Export Log", data="\n".join([
@@ -0,0 +1,172 @@
+import re
+import time
+from decimal import Decimal
+
+CATEGORY_SYNONYMS = {
+    "Gas Mileage": ["gas mileage", "mileage", "miles", "gas", "fuel"],
+    "Postage": ["postage", "stamps", "certified mail", "mailing", "fedex", "ups"],
+    "Filing Fees": ["filing fees", "filing fee", "court fee", "court fees"],
+    "Tolls": ["tolls", "toll", "turnpike"],
+    "Lodging": ["lodging", "hotel", "motel"],
+    "Meals": ["meals", "meal", "lunch", "dinner", "breakfast", "food"],
+    "Travel": ["travel", "airfare", "flight", "train", "taxi", "uber", "lyft"],
+    "Court Copies": ["court copies", "transcripts", "transcript", "copies"],
+    "Printing": ["printing", "prints"],
+    "Service of Process": ["service of process", "process server", "process service"],
+    "Parking": ["parking", "garage"],
+    "Other": ["other", "miscellaneous"],
+}
+SYNONYM_TO_CATEGORY = {s: cat for cat, syns in CATEGORY_SYNONYMS.items() for s in syns}
+
+UNITS = {w: i for i, w in enumerate(
+    "zero one two three four five six seven eight nine ten eleven twelve thirteen fourteen "
+    "fifteen sixteen seventeen eighteen nineteen".split())}
+TENS = {w: 10 * i for i, w in enumerate("twenty thirty forty fifty sixty seventy eighty ninety".split(), 2)}
+NUMBER_WORDS = {**UNITS, **TENS, "hundred": 100, "thousand": 1000}
+
+def _alternation(words):
+    # Longest first so "filing fees" wins over "fees", "gas mileage" over "gas"
+    return "|".join(re.escape(w) for w in sorted(words, key=len, reverse=True))
+
+# One compiled alternation; a single finditer over the transcript yields every token we need
+TOKEN_RE = re.compile(
+    r"\b(?:"
+    rf"(?P<category>{_alternation(SYNONYM_TO_CATEGORY)})"
+    r"|(?P<digits>\$?\d[\d,]*(?:\.\d{1,2})?)"
+    rf"|(?P<word>{_alternation(NUMBER_WORDS)})"
+    r"|(?P<unit>dollars?|bucks|cents?|point|and)"
+    r"|(?P<expense>expenses?|reimburse(?:ment)?|receipt)"
+    r"|(?P<client>for|to|on)"
+    r")\b"
+)
+
+def words_to_groups(words):
+    # "thirty two fifty" -> [32, 50]; "one hundred twenty" -> [120]
+    groups, current, big = [], 0, 0
+    def flush():
+        nonlocal current, big
+        if current or big:
+            groups.append(big + current)
+        current, big = 0, 0
+    for w in words:
+        n = NUMBER_WORDS[w]
+        low = current % 100
+        if w == "hundred":
+            current = (current or 1) * 100
+        elif w == "thousand":
+            big, current = (big + (current or 1)) * 1000, 0
+        elif n >= 10:
+            if low:
+                flush()
+            current += n
+        else:
+            if low % 10 or 10 <= low < 20:
+                flush()
+            current += n
+    flush()
+    return groups
+
+def spoken_amount(words, units):
+    groups = words_to_groups(words)
+    if not groups:
+        return None
+    if "point" in units and len(groups) >= 2:
+        return Decimal(f"{groups[0]}.{groups[1]}")
+    # "thirty two fifty", "twelve dollars forty" -> dollars + cents
+    if len(groups) >= 2 and groups[1] < 100:
+        return Decimal(groups[0]) + Decimal(groups[1]) / 100
+    return Decimal(groups[0])
+
+def extract_expense(text):
+    # Returns {"category", "amount", "client"} for an expense command, or None
+    lower = text.lower()
+    tokens = [(m.lastgroup, m.group(m.lastgroup), m.span()) for m in TOKEN_RE.finditer(lower)]
+    # The client is whatever follows the last "for"/"to"/"on"; words in it are part of its
+    # name ("ups", "parking authority", "three rivers"), not a category or an amount
+    client_at = max((span[1] for kind, _, span in tokens if kind == "client"), default=None)
+    category, digits, words, units = None, None, [], []
+    has_expense = False
+    digit_spans = []
+    for kind, value, (start, end) in tokens:
+        named = client_at is not None and start >= client_at
+        if kind == "category" and not named:
+            category = category or SYNONYM_TO_CATEGORY[value]
+        elif kind == "digits":
+            digits = digits or Decimal(value.replace("$", "").replace(",", ""))
+            digit_spans.append((start, end))
+        elif kind == "word" and not named:
+            words.append(value)
+        elif kind == "unit":
+            units.append(value)
+        elif kind == "expense":
+            has_expense = True
+
+    amount = digits if digits is not None else spoken_amount(words, units)
+    # "log time for meals on wheels" is a time command: an expense needs the word or an amount
+    if not (has_expense or (category and amount is not None)):
+        return None
+
+    client = ""
+    if client_at is not None:
+        # Only a spoken amount is cut out of the name ("for sierra club $12")
+        client = lower[client_at:]
+        for start, end in sorted(digit_spans, reverse=True):
+            if start >= client_at:
+                client = client[:start - client_at] + " " + client[end - client_at:]
+        client = re.sub(r"\s+", " ", client).strip(" .,")
+    return {"category": category or "Other", "amount": amount, "client": client}
+
+# === Accuracy corpus and benchmark ===
+EXPENSE_CORPUS = [
+    ("bill thirty two fifty postage for sierra club", "Postage", "32.50", "sierra club"),
+    ("add expense parking twelve dollars for queen creek", "Parking", "12", "queen creek"),
+    ("log expense filing fees $150 for big sewickley creek", "Filing Fees", "150", "big sewickley creek"),
+    ("add tolls four seventy five for penn environment", "Tolls", "4.75", "penn environment"),
+    ("expense hotel one hundred twenty nine for riverkeeper alliance", "Lodging", "129", "riverkeeper alliance"),
+    ("bill lunch eighteen forty to westmoreland watch", "Meals", "18.40", "westmoreland watch"),
+    ("add mileage expense for three rivers waterkeeper", "Gas Mileage", None, "three rivers waterkeeper"),
+    ("charge court copies 42.10 to dep tracker", "Court Copies", "42.10", "dep tracker"),
+    ("add expense 85 dollars process server for fair county environmental defense", "Service of Process", "85", "fair county environmental defense"),
+    ("log printing twenty five for sierra club", "Printing", "25", "sierra club"),
+    ("add expense for queen creek", "Other", None, "queen creek"),
+    ("expense uber twenty three fifteen for sierra club", "Travel", "23.15", "sierra club"),
+    ("bill one thousand two hundred for lodging on queen creek", "Lodging", "1200", "queen creek"),
+    ("start billing sierra club", None, None, None),
+    ("start logging three rivers", None, None, None),
+    ("switch to big sewickley creek", None, None, None),
+    ("stop logging", None, None, None),
+    ("start billing for queen creek", None, None, None),
+    # Category words in a time command or inside a client's name
+    ("log time for meals on wheels", None, None, None),
+    ("add mileage for three rivers waterkeeper", None, None, None),
+    ("log time for parking authority", None, None, None),
+    ("add expense postage twelve dollars for ups", "Postage", "12", "ups"),
+    ("bill parking 20 dollars to parking authority", "Parking", "20", "parking authority"),
+]
+
+def accuracy(corpus=EXPENSE_CORPUS):
+    misses = []
+    for text, category, amount, client in corpus:
+        got = extract_expense(text)
+        want = None if category is None else {
+            "category": category, "amount": None if amount is None else Decimal(amount), "client": client
+        }
+        if got != want:
+            misses.append((text, want, got))
+    return 1 - len(misses) / len(corpus), misses
+
+def benchmark(rounds=20_000):
+    texts = [t for t, *_ in EXPENSE_CORPUS]
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for t in texts:
+            extract_expense(t)
+    elapsed = time.perf_counter() - started
+    return rounds * len(texts) / elapsed
+
+if __name__ == "__main__":
+    score, misses = accuracy()
+    print(f"Accuracy: {score:.0%} on {len(EXPENSE_CORPUS)} utterances")
+    for text, want, got in misses:
+        print(f"  MISS {text!r}: wanted {want}, got {got}")
+    print(f"Throughput: {benchmark():,.0f} utterances/s")
@@ -0,0 +1,96 @@
+import datetime
+import re
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from caseclock_storage import EXPENSE_FILE, TIME_FORMAT, load_json, save_json
+
+EXPENSE_CATEGORIES = [
+    "Gas Mileage", "Postage", "Filing Fees", "Tolls", "Lodging", "Meals",
+    "Travel", "Court Copies", "Printing", "Service of Process", "Parking", "Other"
+]
+
+CENTS = Decimal("0.01")
+AMOUNT_RE = re.compile(r"^\$?\s*(\d{1,3}(,\d{3})*|\d+)(\.\d{1,2})?$")
+
+def parse_amount(text):
+    # Strict parse for new entries: "32.50", "$1,200", "7.5" -> Decimal cents
+    text = str(text).strip()
+    if not AMOUNT_RE.match(text):
+        raise ValueError(f"Not a dollar amount: {text!r}")
+    amount = Decimal(text.replace("$", "").replace(",", "").strip()).quantize(CENTS, ROUND_HALF_UP)
+    if amount <= 0:
+        raise ValueError("Amount must be greater than zero")
+    return amount
+
+def coerce_amount(value):
+    # Lenient parse for legacy rows that stored whatever was typed; junk counts as zero
+    try:
+        return Decimal(str(value).replace("$", "").replace(",", "").strip()).quantize(CENTS, ROUND_HALF_UP)
+    except InvalidOperation:
+        return Decimal("0.00")
+
+class ExpenseLedger:
+    def __init__(self, path=EXPENSE_FILE):
+        self.path = path
+        self.entries = []
+        self.by_client = defaultdict(Decimal)
+        self.by_category = defaultdict(Decimal)
+        self.by_client_category = defaultdict(Decimal)
+        self.index = defaultdict(list)  # (client, category) -> positions in self.entries
+        self.grand_total = Decimal("0.00")
+        for e in load_json(path, []):
+            self._track({**e, "amount": coerce_amount(e.get("amount", "0"))})
+
+    def _track(self, entry):
+        amount = entry["amount"]
+        client, category = entry["client"], entry["category"]
+        self.index[(client, category)].append(len(self.entries))
+        self.entries.append(entry)
+        self.by_client[client] += amount
+        self.by_category[category] += amount
+        self.by_client_category[(client, category)] += amount
+        self.grand_total += amount
+
+    def add(self, client, category, amount, notes="", timestamp=None):
+        if category not in EXPENSE_CATEGORIES:
+            raise ValueError(f"Unknown expense category: {category}")
+        if not client:
+            raise ValueError("Client is required")
+        entry = {
+            "client": client,
+            "category": category,
+            "amount": amount if isinstance(amount, Decimal) else parse_amount(amount),
+            "notes": notes,
+            "timestamp": (timestamp or datetime.datetime.now()).strftime(TIME_FORMAT),
+        }
+        self._track(entry)
+        self.save()
+        return entry
+
+    def save(self):
+        save_json(self.path, [{**e, "amount": str(e["amount"])} for e in self.entries])
+
+    # === Queries ===
+    def total(self, client=None, category=None):
+        if client and category:
+            return self.by_client_category.get((client, category), Decimal("0.00"))
+        if client:
+            return self.by_client.get(client, Decimal("0.00"))
+        if category:
+            return self.by_category.get(category, Decimal("0.00"))
+        return self.grand_total
+
+    def find(self, client=None, category=None):
+        if client and category:
+            positions = self.index.get((client, category), [])
+        else:
+            positions = sorted(
+                i for (c, cat), idx in self.index.items()
+                if (client is None or c == client) and (category is None or cat == category)
+                for i in idx
+            )
+        return [self.entries[i] for i in positions]
+
+    def client_summary(self, client):
+        return {cat: amt for (c, cat), amt in self.by_client_category.items() if c == client}
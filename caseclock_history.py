@@ -0,0 +1,196 @@
+import json
+import random
+import sys
+import time
+import tracemalloc
+from collections import deque
+
+MAX_STEPS = 100
+MAX_BYTES = 32 << 20
+SIZE_SAMPLE = 256
+
+def estimate_bytes(entries):
+    # JSON size of the entries; big batches (a "Clear All") are sampled
+    if len(entries) <= SIZE_SAMPLE:
+        return sum(len(json.dumps(e)) for e in entries)
+    sample = random.sample(entries, SIZE_SAMPLE)
+    return sum(len(json.dumps(e)) for e in sample) * len(entries) // SIZE_SAMPLE
+
+class Step:
+    # One user action as the delta that reverses it:
+    #   "insert": put `items` [(position, entry)] back, ascending positions
+    #   "remove": take `items` out again
+    #   "replace": swap each position's entry for the recorded one; `expected` holds the
+    #              entries that should be there now, so a moved one can still be found
+    # Entries are shared with the log, never copied.
+    __slots__ = ("label", "kind", "items", "expected", "size")
+
+    def __init__(self, label, kind, items, expected=None):
+        self.label = label
+        self.kind = kind
+        self.items = items
+        self.expected = expected
+        self.size = estimate_bytes([e for _, e in items])
+
+def locate(logs, position, entry):
+    # Recorded positions hold unless the list moved underneath (e.g. a shared-log merge).
+    # -> None if the entry is gone altogether (another instance deleted it)
+    if position < len(logs) and logs[position] is entry:
+        return position
+    return next((i for i, e in enumerate(logs) if e is entry), None)
+
+def apply_step(logs, step):
+    # -> (inverse step, removed entries, added entries); entries that are no longer in the
+    # log are skipped, and the inverse is None when nothing was left to apply
+    if step.kind == "insert":
+        for position, entry in step.items:
+            logs.insert(min(position, len(logs)), entry)
+        return Step(step.label, "remove", step.items), [], [e for _, e in step.items]
+    if step.kind == "remove":
+        found = sorted((i, e) for i, e in ((locate(logs, p, e), e) for p, e in step.items) if i is not None)
+        for position, _ in reversed(found):
+            del logs[position]
+        inverse = Step(step.label, "insert", found) if found else None
+        return inverse, [e for _, e in found], []
+    current, restored = [], []
+    for (position, entry), now in zip(step.items, step.expected):
+        i = locate(logs, position, now)
+        if i is None:
+            continue
+        current.append((i, now))
+        restored.append(entry)
+        logs[i] = entry
+    inverse = Step(step.label, "replace", current, restored) if current else None
+    return inverse, [e for _, e in current], restored
+
+class History:
+    # Undo/redo as a log of inverse deltas. Each action stores only what it removed or
+    # overwrote (by reference), so a delete costs its own entries and an edit one entry.
+    # The oldest steps fall off past max_steps or max_bytes; the newest is always kept.
+    # Callers save the log after each call, as they do after any other change.
+    def __init__(self, max_steps=MAX_STEPS, max_bytes=MAX_BYTES):
+        self.max_steps = max_steps
+        self.max_bytes = max_bytes
+        self.undo_steps = deque()
+        self.redo_steps = deque()
+        self.bytes = 0
+
+    def __len__(self):
+        return len(self.undo_steps)
+
+    @property
+    def can_undo(self):
+        return bool(self.undo_steps)
+
+    @property
+    def can_redo(self):
+        return bool(self.redo_steps)
+
+    def next_undo(self):
+        return self.undo_steps[-1].label if self.undo_steps else None
+
+    def next_redo(self):
+        return self.redo_steps[-1].label if self.redo_steps else None
+
+    def _push(self, stack, step):
+        stack.append(step)
+        self.bytes += step.size
+        while len(self.undo_steps) + len(self.redo_steps) > 1 and (
+                len(self.undo_steps) > self.max_steps or self.bytes > self.max_bytes):
+            oldest = self.undo_steps.popleft() if len(self.undo_steps) > 1 or not self.redo_steps \
+                else self.redo_steps.popleft()
+            self.bytes -= oldest.size
+
+    def _record(self, step):
+        # A new action forks history: whatever could be redone is gone
+        self.bytes -= sum(s.size for s in self.redo_steps)
+        self.redo_steps.clear()
+        self._push(self.undo_steps, step)
+
+    # === Recorded actions ===
+    def appended(self, logs, entries, label="add"):
+        # The entries were just appended to logs (a stop, an allocation, an import)
+        first = len(logs) - len(entries)
+        self._record(Step(label, "remove", [(first + i, e) for i, e in enumerate(entries)]))
+
+    def delete(self, logs, positions, label="delete"):
+        # -> the removed entries
+        positions = sorted(set(positions))
+        items = [(p, logs[p]) for p in positions]
+        for p in reversed(positions):
+            del logs[p]
+        self._record(Step(label, "insert", items))
+        return [e for _, e in items]
+
+    def clear(self, logs, label="clear all"):
+        items = list(enumerate(logs))
+        logs.clear()
+        self._record(Step(label, "insert", items))
+        return [e for _, e in items]
+
+    def replace(self, logs, position, entry, label="edit"):
+        # -> the entry that was there
+        old = logs[position]
+        logs[position] = entry
+        self._record(Step(label, "replace", [(position, old)], [entry]))
+        return old
+
+    # === Undo / redo ===
+    def _move(self, source, target, logs):
+        if not source:
+            return None
+        step = source.pop()
+        self.bytes -= step.size
+        inverse, removed, added = apply_step(logs, step)
+        # A step whose entries were all deleted elsewhere is dropped, not kept as a no-op
+        if inverse is not None:
+            self._push(target, inverse)
+        return step.label, removed, added
+
+    def undo(self, logs):
+        # -> (label, removed entries, added entries), or None with nothing to undo
+        return self._move(self.undo_steps, self.redo_steps, logs)
+
+    def redo(self, logs):
+        return self._move(self.redo_steps, self.undo_steps, logs)
+
+# === Memory: inverse deltas vs. a snapshot per edit ===
+def benchmark(entries=100_000, edits=100):
+    rng = random.Random(0)
+    logs = [{"client": f"Client {i % 300}", "start": 1_700_000_000 + 600 * i, "end": 1_700_000_300 + 600 * i,
+             "duration": 300, "task_type": "research", "notes": f"note {i}"} for i in range(entries)]
+
+    def measure(edit):
+        tracemalloc.start()
+        started = time.perf_counter()
+        edit()
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return peak, elapsed
+
+    snapshots = []
+    def snapshot_edits():
+        work = list(logs)
+        for _ in range(edits):
+            snapshots.append(list(work))
+            del work[rng.randrange(len(work))]
+
+    history = History(max_steps=edits)
+    def delta_edits():
+        work = list(logs)
+        for _ in range(edits):
+            history.delete(work, [rng.randrange(len(work))])
+        for _ in range(edits):
+            history.undo(work)
+        assert len(work) == entries
+
+    snapshot_peak, _ = measure(snapshot_edits)
+    snapshots.clear()
+    delta_peak, delta_s = measure(delta_edits)
+    return snapshot_peak, delta_peak, delta_s
+
+if __name__ == "__main__":
+    snapshot_peak, delta_peak, delta_s = benchmark(edits=int(sys.argv[1]) if len(sys.argv) > 1 else 20)
+    print(f"Snapshot per edit: {snapshot_peak / 2**20:,.1f} MiB; inverse deltas: {delta_peak / 2**20:,.2f} MiB "
+          f"(deletes and undos took {delta_s * 1000:.0f} ms)")
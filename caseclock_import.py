@@ -0,0 +1,236 @@
+import argparse
+import csv
+import datetime
+import io
+import json
+import multiprocessing
+import os
+import random
+import re
+import tempfile
+import time
+from zoneinfo import ZoneInfo
+
+from caseclock_dedupe import EntryHashes, entry_digest
+from caseclock_intervals import CURRENT_USER
+from caseclock_migrate import migrate_entry, upgrade_entries
+from caseclock_storage import DISPLAY_TZ, LOG_FILE, load_log, log_lock, new_entry, parse_duration, save_json, save_log
+from caseclock_sync import renderer_entry
+
+CHUNK_BYTES = 4 << 20
+JSON_CHUNK = 50_000
+# "25m 0s", "1h 5m 0s", "1 hr 5 min", "45 min"
+DURATION_PART_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(h|hr|hrs|hours?|m|min|mins|minutes?|s|sec|secs|seconds?)\b")
+UNIT_SECONDS = {"h": 3600, "m": 60, "s": 1}
+
+# === Format detection ===
+def detect_format(path):
+    # -> ("json", None) | ("renderer", header) | ("readable", header)
+    with open(path, encoding="utf-8-sig") as f:
+        head = f.read(4096)
+    if head.lstrip().startswith(("[", "{")):
+        return "json", None
+    header = [h.strip().lower() for h in next(csv.reader([head.splitlines()[0]]))] if head else []
+    if header[:2] == ["date", "case"] and "duration (s)" in header:
+        return "renderer", header
+    if {"date", "client", "start", "end"} <= set(header):
+        return "readable", header
+    raise ValueError(f"{path}: unrecognized log format (header {header!r})")
+
+# === Row parsers ===
+def parse_human_duration(text):
+    text = text.strip().lower()
+    if not text:
+        return None
+    if ":" in text:
+        return parse_duration(text)
+    parts = DURATION_PART_RE.findall(text)
+    if not parts:
+        return None
+    return int(sum(float(n) * UNIT_SECONDS[unit[0]] for n, unit in parts))
+
+def parse_clock(text):
+    # "13:45:00" or "13:45"; strptime is the slow part of a row, so split by hand
+    h, m, *s = text.strip().split(":")
+    return datetime.time(int(h), int(m), int(float(s[0])) if s else 0)
+
+def readable_parser(header, tz, user):
+    # The app's exports joined fields without quoting, so a client name with commas spills
+    # into extra fields: everything between date and start is the client
+    width = len(header)
+    start_at = header.index("start")
+    duration_at = next((header.index(c) for c in ("duration_human", "duration") if c in header), None)
+    task_at = next((header.index(c) for c in ("task_type", "task") if c in header), None)
+    extra = {"user": user} if user else {}
+    days = {}
+
+    def parse(row):
+        spill = len(row) - width
+        if spill:
+            row = [row[0], ",".join(row[1:start_at + spill])] + row[start_at + spill:]
+        day = days.get(row[0])
+        if day is None:
+            day = days[row[0]] = datetime.date.fromisoformat(row[0].strip())
+        start = datetime.datetime.combine(day, parse_clock(row[start_at]), tz)
+        end = datetime.datetime.combine(day, parse_clock(row[start_at + 1]), tz)
+        if end < start:
+            end += datetime.timedelta(days=1)
+        start, end = int(start.timestamp()), int(end.timestamp())
+        duration = parse_human_duration(row[duration_at]) if duration_at is not None else None
+        task = row[task_at].strip() if task_at is not None and task_at < len(row) else ""
+        return new_entry(row[1].strip(), start, end, duration, task_type=task, source="import", **extra)
+    return parse
+
+def row_parser(fmt, header, tz, user):
+    if fmt == "renderer":
+        return lambda row: renderer_entry(row, tz, user)
+    return readable_parser(header, tz, user)
+
+# === Chunked, parallel parsing ===
+def chunk_ranges(path, chunk_bytes=CHUNK_BYTES):
+    # Byte ranges of whole lines, after the header line
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, "rb") as f:
+        f.readline()
+        start = f.tell()
+        while start < size:
+            f.seek(min(start + chunk_bytes, size))
+            f.readline()
+            end = min(f.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+def parse_chunk(path, fmt, header, start, end, tz_name, user):
+    # -> ([(digest, entry)], rows, bad rows); runs in a worker, so it takes plain arguments
+    tz = ZoneInfo(tz_name) if tz_name else DISPLAY_TZ
+    parse = row_parser(fmt, header, tz, user)
+    with open(path, "rb") as f:
+        f.seek(start)
+        text = f.read(end - start).decode("utf-8")
+    parsed, rows, bad = [], 0, 0
+    for row in csv.reader(io.StringIO(text)):
+        if not row:
+            continue
+        rows += 1
+        try:
+            entry = parse(row)
+        except (ValueError, IndexError):
+            bad += 1
+            continue
+        parsed.append((entry_digest(entry), entry))
+    return parsed, rows, bad
+
+def parse_json_chunk(entries, tz_name):
+    tz = ZoneInfo(tz_name) if tz_name else DISPLAY_TZ
+    parsed, bad = [], 0
+    for e in entries:
+        try:
+            entry = migrate_entry(e, tz)
+            parsed.append((entry_digest(entry), entry))
+        except (KeyError, TypeError, ValueError):
+            bad += 1
+    return parsed, len(entries), bad
+
+def parse_file(path, tz_name=None, user=CURRENT_USER, pool=None):
+    # Yields (parsed, rows, bad) per chunk, in file order
+    fmt, header = detect_format(path)
+    if fmt == "json":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        entries = data if isinstance(data, list) else data.get("entries", [])
+        jobs = [(entries[i:i + JSON_CHUNK], tz_name) for i in range(0, len(entries), JSON_CHUNK)]
+        worker = parse_json_chunk
+    else:
+        jobs = [(path, fmt, header, start, end, tz_name, user) for start, end in chunk_ranges(path)]
+        worker = parse_chunk
+    if pool is None:
+        return fmt, (worker(*job) for job in jobs)
+    return fmt, pool.starmap(worker, jobs, chunksize=1)
+
+def import_files(paths, log_path=LOG_FILE, tz_name=None, user=CURRENT_USER, workers=None, dry_run=False):
+    # Appends every new entry from `paths` to the log; entries already in the log (or
+    # earlier in the import) are skipped by content hash. -> per-file reports
+    workers = workers or os.cpu_count() or 1
+    pool = multiprocessing.get_context("spawn").Pool(workers) if workers > 1 else None
+    reports = []
+    try:
+        with log_lock(log_path):
+            logs = load_log(log_path)
+            upgrade_entries(logs)
+            hashes = EntryHashes.open(logs, log_path)
+            for path in paths:
+                started = time.perf_counter()
+                report = {"path": path, "rows": 0, "imported": 0, "duplicates": 0, "bad": 0}
+                report["format"], chunks = parse_file(path, tz_name, user, pool)
+                for parsed, rows, bad in chunks:
+                    report["rows"] += rows
+                    report["bad"] += bad
+                    for digest, entry in parsed:
+                        if digest in hashes.digests:
+                            report["duplicates"] += 1
+                            continue
+                        hashes.add_digest(digest)
+                        logs.append(entry)
+                        report["imported"] += 1
+                report["elapsed_s"] = time.perf_counter() - started
+                reports.append(report)
+            if not dry_run and any(r["imported"] for r in reports):
+                save_log(logs, log_path)
+                hashes.sync(logs, log_path)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return reports
+
+# === Throughput check on a synthetic legacy export ===
+def benchmark(rows=1_000_000, workers=None, seed=0):
+    rng = random.Random(seed)
+    clients = ["Sierra Club", "Three Rivers Waterkeeper", "Queen Creek", "Big Sewickley Creek"] + \
+              [f"Matter {i}" for i in range(200)]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "legacy.csv")
+        day = datetime.date(2020, 1, 1)
+        with open(path, "w") as f:
+            f.write("date,client,start,end,duration_human,billable_hours\n")
+            for i in range(rows):
+                start = rng.randrange(8 * 3600, 18 * 3600)
+                minutes = rng.randint(1, 120)
+                end = start + minutes * 60
+                d = day + datetime.timedelta(days=i // 40)
+                f.write(f"{d},{rng.choice(clients)},{start // 3600:02}:{start // 60 % 60:02}:00,"
+                        f"{end // 3600 % 24:02}:{end // 60 % 60:02}:00,{minutes}m 0s,{minutes / 60:.1f}\n")
+        log_path = os.path.join(tmp, "log.json")
+        save_json(log_path, [])
+        started = time.perf_counter()
+        report = import_files([path, path], log_path, workers=workers)
+        elapsed = time.perf_counter() - started
+    return report, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Import legacy CaseClock logs (readable CSV, renderer CSV, JSON)")
+    parser.add_argument("paths", nargs="*")
+    parser.add_argument("--log", default=LOG_FILE, help="log to import into")
+    parser.add_argument("--tz", help="zone the legacy wall-clock times were recorded in (default: CASECLOCK_TZ, else system local)")
+    parser.add_argument("--workers", type=int, help="parser processes (default: one per CPU)")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--bench", type=int, metavar="ROWS", help="time an import of a synthetic CSV instead")
+    args = parser.parse_args()
+
+    if args.bench:
+        reports, elapsed = benchmark(args.bench, args.workers)
+        first, again = reports
+        print(f"Imported {first['imported']:,} of {first['rows']:,} rows in {first['elapsed_s']:.1f}s "
+              f"({first['rows'] / first['elapsed_s'] * 60:,.0f} rows/min); "
+              f"re-import skipped {again['duplicates']:,} duplicates; {elapsed:.1f}s with the save")
+        return
+    if not args.paths:
+        parser.error("no files to import")
+    for report in import_files(args.paths, args.log, args.tz, workers=args.workers, dry_run=args.dry_run):
+        print(f"{report['path']} [{report['format']}]: {report['rows']:,} rows, {report['imported']:,} imported, "
+              f"{report['duplicates']:,} duplicates, {report['bad']:,} unreadable ({report['elapsed_s']:.1f}s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import os
+import re
+from collections import OrderedDict
+
+from caseclock_commands import interpret_command
+from caseclock_storage import CASE_FILE, load_json
+
+# Commas split client lists and colons times ("1:30"), so both survive normalization
+NORMALIZE_RE = re.compile(r"[^\w\s$.,:]")
+
+def normalize(text):
+    # "Stop logging." / "stop  Logging" -> "stop logging"
+    return " ".join(NORMALIZE_RE.sub(" ", text.lower()).split()).rstrip(".,:")
+
+class IntentCache:
+    # LRU of normalized transcript -> resolved intent, scoped to one version of the case list
+    def __init__(self, maxsize=1024, case_file=CASE_FILE, interpret=interpret_command):
+        self.maxsize = maxsize
+        self.case_file = case_file
+        self.interpret = interpret
+        self.entries = OrderedDict()
+        self.version = None
+        self.case_names = []
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def case_list_version(self):
+        try:
+            st = os.stat(self.case_file)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def check_version(self):
+        # One stat() per lookup; any change to caseclock_cases.json drops every cached intent
+        version = self.case_list_version()
+        if version != self.version:
+            if self.entries:
+                self.invalidations += 1
+            self.entries.clear()
+            self.case_names = load_json(self.case_file, [])
+            self.version = version
+
+    def resolve(self, text):
+        self.check_version()
+        key = normalize(text)
+        intent = self.entries.get(key)
+        if intent is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return dict(intent)
+        self.misses += 1
+        intent = self.interpret(key, self.case_names)
+        self.entries[key] = intent
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return dict(intent)
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate(),
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,219 @@
+import datetime
+import os
+import random
+import time
+
+from caseclock_storage import entry_end_ts, entry_label, entry_start_ts, local_time
+
+# Entries carry an optional "user"; single-user installs leave it off and share one timeline
+CURRENT_USER = os.getenv("CASECLOCK_USER", "")
+MIN_GAP_S = 300
+
+class _Node:
+    __slots__ = ("start", "end", "item", "prio", "left", "right", "max_end")
+
+    def __init__(self, start, end, item):
+        self.start, self.end, self.item = start, end, item
+        self.prio = random.random()
+        self.left = self.right = None
+        self.max_end = end
+
+def _update(node):
+    node.max_end = node.end
+    if node.left and node.left.max_end > node.max_end:
+        node.max_end = node.left.max_end
+    if node.right and node.right.max_end > node.max_end:
+        node.max_end = node.right.max_end
+
+def _split(node, key):
+    # -> (keys < key, keys >= key), keyed on (start, end, id(item))
+    if node is None:
+        return None, None
+    if (node.start, node.end, id(node.item)) < key:
+        node.right, right = _split(node.right, key)
+        _update(node)
+        return node, right
+    left, node.left = _split(node.left, key)
+    _update(node)
+    return left, node
+
+def _merge(a, b):
+    if a is None or b is None:
+        return a or b
+    if a.prio > b.prio:
+        a.right = _merge(a.right, b)
+        _update(a)
+        return a
+    b.left = _merge(a, b.left)
+    _update(b)
+    return b
+
+class IntervalTree:
+    # Treap of half-open [start, end) intervals augmented with subtree max end:
+    # insert/remove/overlap checks are O(log n) expected, range scans O(log n + k)
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def insert(self, start, end, item):
+        left, right = _split(self.root, (start, end, id(item)))
+        self.root = _merge(_merge(left, _Node(start, end, item)), right)
+        self.size += 1
+
+    def remove(self, start, end, item):
+        key = (start, end, id(item))
+        left, rest = _split(self.root, key)
+        # rest's leftmost node is the one to drop if it matches
+        hit, right = _split(rest, (start, end, id(item) + 1))
+        if hit is not None:
+            self.size -= 1
+        self.root = _merge(left, right)
+        return hit is not None
+
+    def overlapping(self, start, end):
+        # Items whose interval intersects [start, end), in start order
+        out = []
+        stack = []
+        node = self.root
+        while stack or node:
+            while node is not None and node.max_end > start:
+                stack.append(node)
+                node = node.left
+            if not stack:
+                break
+            node = stack.pop()
+            if node.start >= end:
+                break
+            if node.end > start:
+                out.append((node.start, node.end, node.item))
+            node = node.right
+        return out
+
+    def first_overlap(self, start, end):
+        # Cheapest check for "does anything collide?": stops at the first hit
+        node = self.root
+        while node is not None:
+            if node.left is not None and node.left.max_end > start:
+                node = node.left
+                continue
+            if node.start < end and node.end > start:
+                return (node.start, node.end, node.item)
+            if node.start >= end:
+                return None
+            node = node.right
+        return None
+
+    def __iter__(self):
+        stack, node = [], self.root
+        while stack or node:
+            while node is not None:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            yield (node.start, node.end, node.item)
+            node = node.right
+
+def entry_interval(entry):
+    return entry_start_ts(entry), entry_end_ts(entry)
+
+
+def entry_user(entry):
+    return entry.get("user", "")
+
+class TimeIndex:
+    # One IntervalTree per user. Remembers each entry's indexed span so an entry edited
+    # in place can still be found and re-keyed. With an EntryHashes set attached, an entry
+    # identical to a logged one is refused too, and the set follows adds and removals.
+    def __init__(self, logs=(), hashes=None):
+        self.trees = {}
+        self.spans = {}
+        self.hashes = hashes
+        for e in logs:
+            self._insert(e)
+
+    def __len__(self):
+        return len(self.spans)
+
+    def tree(self, user=""):
+        return self.trees.setdefault(user, IntervalTree())
+
+    def _insert(self, entry):
+        user = entry_user(entry)
+        start, end = entry_interval(entry)
+        self.tree(user).insert(start, end, entry)
+        self.spans[id(entry)] = (user, start, end)
+
+    def overlapping(self, start, end, user="", ignore=None):
+        return [hit for hit in self.tree(user).overlapping(start, end) if hit[2] is not ignore]
+
+    def first_overlap(self, start, end, user=""):
+        return self.tree(user).first_overlap(start, end)
+
+    def check_duplicate(self, entry, ignore=None):
+        if self.hashes is not None:
+            self.hashes.check(entry, ignore)
+
+    def add(self, entry, allow_overlap=False):
+        # Refuses an entry that overlaps the same user's existing time
+        start, end = entry_interval(entry)
+        if end < start:
+            raise ValueError("End must be after start")
+        self.check_duplicate(entry)
+        clash = None if allow_overlap else self.first_overlap(start, end, entry_user(entry))
+        if clash is not None:
+            raise ValueError(f"Overlaps {entry_label(clash[2])}")
+        self._insert(entry)
+        if self.hashes is not None:
+            self.hashes.add(entry)
+
+    def discard(self, entry):
+        span = self.spans.pop(id(entry), None)
+        if span is not None:
+            user, start, end = span
+            self.trees[user].remove(start, end, entry)
+            if self.hashes is not None:
+                self.hashes.discard(entry)
+
+    def replace(self, old, new):
+        # Edit: the entry being edited doesn't count as a clash with its new times
+        start, end = entry_interval(new)
+        if end < start:
+            raise ValueError("End must be after start")
+        user = entry_user(new)
+        clashes = [hit for hit in self.tree(user).overlapping(start, end) if hit[2] is not old]
+        if clashes:
+            raise ValueError(f"Overlaps {entry_label(clashes[0][2])}")
+        self.check_duplicate(new, ignore=old)
+        self.discard(old)
+        self._insert(new)
+        if self.hashes is not None:
+            self.hashes.add(new)
+
+    def gaps(self, start, end, user="", min_gap=MIN_GAP_S):
+        # Untracked [s, e) stretches inside [start, end), skipping slivers under min_gap
+        out, cursor = [], start
+        for s, e, _ in self.tree(user).overlapping(start, end):
+            if s - cursor >= min_gap:
+                out.append((cursor, s))
+            cursor = max(cursor, e)
+        if end - cursor >= min_gap:
+            out.append((cursor, end))
+        return out
+
+    def gaps_today(self, user="", now=None, day_start=datetime.time(9), min_gap=MIN_GAP_S):
+        # From the start of the working day (or the first entry, if earlier) up to now
+        # Day boundaries are wall-clock times in the display zone
+        now = local_time(time.time() if now is None else now)
+        midnight = int(now.replace(hour=0, minute=0, second=0, microsecond=0).timestamp())
+        begin = int(datetime.datetime.combine(now.date(), day_start, now.tzinfo).timestamp())
+        end = int(now.timestamp())
+        first = self.tree(user).first_overlap(midnight, end)
+        if first is not None:
+            begin = max(midnight, min(begin, first[0]))
+        return self.gaps(begin, end, user, min_gap) if end > begin else []
+
+def build_index(logs, hashes=None):
+    return TimeIndex(logs, hashes)
@@ -0,0 +1,284 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+
+from caseclock_commands import match_case
+from caseclock_intent_cache import normalize
+from caseclock_storage import load_json, save_json
+
+LLM_CACHE_FILE = "caseclock_llm_cache.json"
+LLM_MODEL = os.getenv("CASECLOCK_LLM_MODEL", "gpt-4o-mini")
+LLM_THRESHOLD = 0.6       # rule-parser confidence below this goes to the LLM
+LATENCY_BUDGET_S = 1.5    # hard cap per utterance, including batching delay
+BATCH_WINDOW_S = 0.02     # requests arriving this close together share one API call
+LLM_ACTIONS = {"start", "stop", "expense", "allocate", "unrecognized"}
+
+SYSTEM_PROMPT = """You turn a legal time-tracker's voice commands into JSON.
+Known clients: {cases}
+For each numbered utterance return one object in a JSON array, same order:
+{{"action": "start"|"stop"|"expense"|"allocate"|"unrecognized",
+  "client": exact known client name or null,
+  "minutes": minutes of past time to allocate (for "allocate") or null,
+  "category": expense category or null, "amount": expense amount as a string or null}}
+"allocate" means retroactively putting already-elapsed time on a client,
+e.g. "put the last half hour on Queen Creek" -> {{"action": "allocate", "client": "Queen Creek", "minutes": 30}}.
+Reply with the JSON array only."""
+
+class LLMIntentResolver:
+    # Optional slow tier behind the rule parser: batched, coalesced, budgeted and cached on disk
+    def __init__(self, client=None, model=LLM_MODEL, budget_s=LATENCY_BUDGET_S,
+                 batch_window_s=BATCH_WINDOW_S, cache_path=LLM_CACHE_FILE):
+        self.client = client
+        self.model = model
+        self.budget_s = budget_s
+        self.batch_window_s = batch_window_s
+        self.cache_path = cache_path
+        self.cache = load_json(cache_path, {})
+        self.cache_lock = threading.Lock()
+        self.inflight = {}   # cache key -> asyncio.Future shared by concurrent callers
+        self.pending = []    # (key, text, case_names, future) waiting for the next batch
+        self.flush_task = None
+        self.stats = {"calls": 0, "batched": 0, "coalesced": 0, "cache_hits": 0, "timeouts": 0}
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+
+    def get_client(self):
+        if self.client is None:
+            from openai import AsyncOpenAI
+            # Retries would blow the latency budget; a miss just falls back to the rule parser
+            self.client = AsyncOpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                base_url=os.getenv("OPENAI_BASE_URL") or None,
+                max_retries=0,
+                timeout=self.budget_s,
+            )
+        return self.client
+
+    @staticmethod
+    def cache_key(text, case_names):
+        cases = hashlib.sha1("\n".join(sorted(case_names)).encode()).hexdigest()[:12]
+        return f"{cases}:{normalize(text)}"
+
+    # === Sync entry point ===
+    def resolve(self, text, case_names):
+        # -> intent dict or None (timeout, API error, unparseable reply)
+        key = self.cache_key(text, case_names)
+        with self.cache_lock:
+            if key in self.cache:
+                self.stats["cache_hits"] += 1
+                return dict(self.cache[key])
+        future = asyncio.run_coroutine_threadsafe(self._resolve(key, text, list(case_names)), self.loop)
+        try:
+            return future.result(timeout=self.budget_s + 0.1)
+        except Exception:
+            future.cancel()
+            return None
+
+    # === Event-loop side ===
+    async def _resolve(self, key, text, case_names):
+        shared = self.inflight.get(key)
+        if shared is not None:
+            self.stats["coalesced"] += 1
+        else:
+            shared = self.loop.create_future()
+            self.inflight[key] = shared
+            self.pending.append((key, normalize(text), case_names, shared))
+            if self.flush_task is None:
+                self.flush_task = self.loop.create_task(self._flush_after_window())
+        try:
+            # shield: one caller timing out must not cancel the batch other callers share
+            return await asyncio.wait_for(asyncio.shield(shared), self.budget_s)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            return None
+
+    async def _flush_after_window(self):
+        await asyncio.sleep(self.batch_window_s)
+        batch, self.pending, self.flush_task = self.pending, [], None
+        # One call per distinct case list (normally there is only one)
+        groups = {}
+        for item in batch:
+            groups.setdefault(tuple(item[2]), []).append(item)
+        await asyncio.gather(*(self._call(list(cases), items) for cases, items in groups.items()))
+
+    async def _call(self, case_names, items):
+        self.stats["calls"] += 1
+        self.stats["batched"] += len(items)
+        prompt = "\n".join(f"{i + 1}. {text}" for i, (_, text, _, _) in enumerate(items))
+        try:
+            reply = await asyncio.wait_for(self.get_client().chat.completions.create(
+                model=self.model,
+                temperature=0,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT.format(cases=", ".join(case_names))},
+                    {"role": "user", "content": prompt},
+                ],
+            ), self.budget_s - self.batch_window_s)
+            results = parse_reply(reply.choices[0].message.content)
+        except Exception:
+            # Timeout, API error or a reply that isn't JSON: every caller falls back
+            results = []
+        try:
+            for i, (key, _, _, future) in enumerate(items):
+                intent = validate(results[i], case_names) if i < len(results) else None
+                if intent is not None:
+                    self.remember(key, intent)
+                if not future.done():
+                    future.set_result(intent)
+        finally:
+            # Whatever went wrong above, no caller is left waiting on a future nobody resolves
+            for key, _, _, future in items:
+                if not future.done():
+                    future.set_result(None)
+                self.inflight.pop(key, None)
+
+    def remember(self, key, intent):
+        with self.cache_lock:
+            self.cache[key] = intent
+            save_json(self.cache_path, self.cache)
+
+def parse_reply(content):
+    # The prompt asks for an array, but models also answer {"intents": [...]}; anything else is no result
+    results = json.loads(content)
+    if isinstance(results, dict):
+        results = results.get("intents")
+    return results if isinstance(results, list) else []
+
+def validate(raw, case_names):
+    # Never trust the model's shape: unknown actions are dropped, clients snapped to the case list
+    if not isinstance(raw, dict) or raw.get("action") not in LLM_ACTIONS:
+        return None
+    action = raw["action"]
+    if action == "unrecognized":
+        return None
+    client = raw.get("client")
+    if client and client not in case_names:
+        client, score = match_case(client, case_names)
+        if score < 80:
+            client = None
+    if action in ("start", "allocate", "expense") and not client:
+        return None
+    intent = {"action": action, "client": client, "confidence": 0.8, "source": "llm"}
+    if action == "allocate":
+        try:
+            intent["minutes"] = int(raw.get("minutes"))
+        except (TypeError, ValueError):
+            return None
+    if action == "expense":
+        intent["category"] = raw.get("category") or "Other"
+        intent["amount"] = raw.get("amount")
+    return intent
+
+def resolve_with_fallback(text, rule_intent, case_names, llm, threshold=LLM_THRESHOLD):
+    # Rule result stands unless it is unsure; the LLM only ever upgrades it
+    if llm is None or rule_intent["confidence"] >= threshold:
+        return rule_intent
+    return llm.resolve(text, case_names) or rule_intent
+
+def llm_available():
+    return bool(os.getenv("OPENAI_API_KEY"))
+
+# === Local stub of the chat completions API, for exercising the tier offline ===
+def stub_server(responder, delay_s=0.0, port=0):
+    # responder(list_of_utterances) -> list of intent dicts; returns (server, base_url)
+    import re
+    import time
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            lines = body["messages"][-1]["content"].splitlines()
+            utterances = [re.sub(r"^\d+\.\s*", "", line) for line in lines]
+            time.sleep(delay_s)
+            content = json.dumps(responder(utterances))
+            payload = json.dumps({
+                "id": "stub", "object": "chat.completion", "created": 0, "model": body["model"],
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": content}}],
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            try:
+                self.wfile.write(payload)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # the caller's budget ran out and it hung up
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+# === Self-check against the stub ===
+def self_check():
+    # Batching, coalescing, the latency budget, a timeout and malformed replies, all offline.
+    # -> list of failed checks
+    import concurrent.futures
+    import tempfile
+    import time
+    from openai import AsyncOpenAI
+
+    cases = ["Sierra Club", "Queen Creek"]
+    failures = []
+
+    def expect(name, ok):
+        if not ok:
+            failures.append(name)
+
+    def resolver(responder, delay_s=0.0, budget_s=LATENCY_BUDGET_S, window_s=0.05):
+        server, url = stub_server(responder, delay_s)
+        client = AsyncOpenAI(api_key="stub", base_url=url, max_retries=0, timeout=budget_s)
+        path = os.path.join(tempfile.mkdtemp(), "cache.json")
+        return server, LLMIntentResolver(client, budget_s=budget_s, batch_window_s=window_s, cache_path=path)
+
+    def start_all(utterances):
+        return [{"action": "start", "client": "Queen Creek" if "queen" in u else "Sierra Club"} for u in utterances]
+
+    def concurrently(llm, texts):
+        with concurrent.futures.ThreadPoolExecutor(len(texts)) as pool:
+            return list(pool.map(lambda t: llm.resolve(t, cases), texts))
+
+    # Distinct utterances inside one window share a call; identical ones share a future
+    server, llm = resolver(start_all)
+    results = concurrently(llm, ["get going on sierra", "queen matter now", "get going on sierra"])
+    expect("batching: one call", llm.stats["calls"] == 1)
+    expect("batching: results in order", [r and r["client"] for r in results] ==
+           ["Sierra Club", "Queen Creek", "Sierra Club"])
+    expect("coalescing", llm.stats["coalesced"] == 1 and llm.stats["batched"] == 2)
+    expect("cache hit", llm.resolve("Get going on Sierra.", cases) is not None and llm.stats["cache_hits"] == 1)
+    expect("inflight drained", not llm.inflight)
+    server.shutdown()
+
+    # A reply slower than the budget returns None within the budget, and leaves nothing pending
+    server, llm = resolver(start_all, delay_s=0.6, budget_s=0.3)
+    began = time.perf_counter()
+    expect("timeout: no result", llm.resolve("kick off sierra", cases) is None)
+    expect("timeout: within budget", time.perf_counter() - began < 0.3 + 0.2)
+    time.sleep(0.5)
+    expect("timeout: inflight drained", not llm.inflight)
+    server.shutdown()
+
+    # {"intents": [...]} is accepted; any other shape is no result, never a stuck future
+    for name, responder, ok in [
+        ("dict reply", lambda u: {"intents": start_all(u)}, lambda r: r and r["client"] == "Sierra Club"),
+        ("malformed dict reply", lambda u: {"action": "start"}, lambda r: r is None),
+        ("scalar reply", lambda u: 42, lambda r: r is None),
+        ("short list reply", lambda u: [], lambda r: r is None),
+        ("garbage item", lambda u: ["start"], lambda r: r is None),
+    ]:
+        server, llm = resolver(responder)
+        expect(name, ok(llm.resolve("kick off sierra", cases)))
+        expect(f"{name}: inflight drained", not llm.inflight)
+        server.shutdown()
+    return failures
+
+if __name__ == "__main__":
+    failures = self_check()
+    print("\n".join(f"FAILED: {name}" for name in failures) or "LLM tier self-check passed")
+    raise SystemExit(1 if failures else 0)
@@ -0,0 +1,85 @@
+import argparse
+import datetime
+import shutil
+from zoneinfo import ZoneInfo
+
+from caseclock_storage import DISPLAY_TZ, LOG_FILE, load_json, parse_duration, save_json, to_epoch
+
+CLOCK_FORMAT = "%H:%M:%S"
+
+def is_canonical(entry):
+    return all(isinstance(entry.get(k), int) for k in ("start", "end", "duration"))
+
+def migrate_entry(entry, tz=DISPLAY_TZ):
+    # Legacy shapes -> canonical epoch entry. Handles full "%Y-%m-%d %H:%M:%S" strings and
+    # the separate "date" + "%H:%M:%S" fields; an end clock before the start clock is taken
+    # to be after midnight. Recorded durations are kept, since they came from time.time().
+    # Wall-clock strings are read in CASECLOCK_TZ, the zone the app displays them in.
+    if is_canonical(entry):
+        return entry
+    out = {k: v for k, v in entry.items() if k != "date"}
+    if "date" in entry:
+        day = datetime.datetime.strptime(entry["date"], "%Y-%m-%d").date()
+        start = datetime.datetime.combine(day, datetime.datetime.strptime(entry["start"], CLOCK_FORMAT).time(), tz)
+        end = datetime.datetime.combine(day, datetime.datetime.strptime(entry["end"], CLOCK_FORMAT).time(), tz)
+        if end < start:
+            end += datetime.timedelta(days=1)
+        out["start"], out["end"] = int(start.timestamp()), int(end.timestamp())
+    else:
+        out["start"], out["end"] = to_epoch(entry["start"], tz), to_epoch(entry["end"], tz)
+    duration = entry.get("duration")
+    if isinstance(duration, str) and duration:
+        out["duration"] = parse_duration(duration)
+    elif isinstance(duration, (int, float)):
+        out["duration"] = int(duration)
+    else:
+        out["duration"] = out["end"] - out["start"]
+    if "task" in out and "task_type" not in out:
+        out["task_type"] = out.pop("task")
+    out.setdefault("task_type", "")
+    out.setdefault("notes", "")
+    return out
+
+def upgrade_entries(entries, tz=DISPLAY_TZ):
+    # In-place; -> number of entries rewritten
+    changed = 0
+    for i, e in enumerate(entries):
+        if not is_canonical(e):
+            entries[i] = migrate_entry(e, tz)
+            changed += 1
+    return changed
+
+def migrate_file(path=LOG_FILE, tz=DISPLAY_TZ, dry_run=False):
+    # Whole-file bulk pass: one read, one atomic write, a .bak copy of the original
+    entries = load_json(path, [])
+    failed = []
+    migrated = []
+    for e in entries:
+        try:
+            migrated.append(migrate_entry(e, tz))
+        except (KeyError, ValueError) as err:
+            failed.append((e, str(err)))
+            migrated.append(e)
+    changed = sum(1 for a, b in zip(entries, migrated) if a is not b)
+    if changed and not dry_run:
+        shutil.copy2(path, f"{path}.bak")
+        save_json(path, migrated)
+    return {"entries": len(entries), "migrated": changed, "failed": failed}
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert legacy time-log entries to UTC epoch timestamps")
+    parser.add_argument("paths", nargs="*", default=[LOG_FILE])
+    parser.add_argument("--tz", help="zone the legacy wall-clock times were recorded in (default: CASECLOCK_TZ, else system local)")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    tz = ZoneInfo(args.tz) if args.tz else DISPLAY_TZ
+
+    for path in args.paths:
+        report = migrate_file(path, tz, args.dry_run)
+        verb = "would migrate" if args.dry_run else "migrated"
+        print(f"🕒 {path}: {verb} {report['migrated']} of {report['entries']} entries")
+        for entry, err in report["failed"]:
+            print(f"❌ {entry}: {err}")
+
+if __name__ == "__main__":
+    main()
@@ -4,39 +4,38 @@ import os
 import openai
 import streamlit as st
 import time
-import datetime
 import speech_recognition as sr
-from rapidfuzz import process
-import json
-from pathlib import Path
+from caseclock_storage import (
+    CASE_FILE, LOG_FILE, STORAGE_MODE, format_duration, format_ts, load_json, refresh_log, save_json, save_log
+)
+from caseclock_archive import archive_version, archived_entries, roll_closed_periods
+from caseclock_billing import invoice_totals, log_frame
+from caseclock_expenses import ExpenseLedger
+from caseclock_dedupe import EntryHashes
+from caseclock_history import History
+from caseclock_intervals import CURRENT_USER, build_index
+from caseclock_date_index import DateIndex, day_range, month_range, week_range
+from caseclock_search import SearchIndex
+from caseclock_shared_log import shared_log
+from caseclock_sync import background_sync
+from caseclock_analytics import AnalyticsCache
+from caseclock_allocation import allocate_last
+from caseclock_timers import EarlyCommit, TimerEngine
+from caseclock_commands import IncrementalParser
+from caseclock_intent_cache import IntentCache
+from caseclock_llm_intent import LLMIntentResolver, llm_available, resolve_with_fallback
+from caseclock_audio import recognize_google
+from caseclock_vad import listen_for_command
+from caseclock_streaming import VoskStream, listen_streaming, streaming_available
+from caseclock_reports import (
+    INVOICE_COLUMNS, UTILIZATION_COLUMNS, invoice_rows, utilization_rows, render
+)
 
 # Load environment and OpenAI API key
 load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
-CASE_FILE = "caseclock_cases.json"
-LOG_FILE = "caseclock_log.json"
-EXPENSE_FILE = "caseclock_expenses.json"
-
-EXPENSE_CATEGORIES = [
-    "Gas Mileage", "Postage", "Filing Fees", "Tolls", "Lodging", "Meals",
-    "Travel", "Court Copies", "Printing", "Service of Process", "Parking", "Other"
-]
-
-# === Load/save helpers ===
-def load_json(path, fallback):
-    if Path(path).exists():
-        with open(path, "r") as f:
-            return json.load(f)
-    return fallback
-
-def save_json(path, data):
-    with open(path, "w") as f:
-        json.dump(data, f, indent=2)
-
 case_names = load_json(CASE_FILE, [])
-logs = load_json(LOG_FILE, [])
-expenses = load_json(EXPENSE_FILE, [])
 
 # === Streamlit Setup ===
 st.set_page_config(page_title="CaseClock", layout="centered")
@@ -57,141 +56,358 @@ with st.expander("🗂️ Manage Case List"):
         st.success(f"Deleted: {del_case}")
 
 # === Voice Input ===
+@st.cache_resource
+def vosk_stream():
+    return VoskStream()
+
+@st.cache_resource
+def intent_cache():
+    # Shared across reruns and sessions; drops itself when caseclock_cases.json changes
+    return IntentCache()
+
+@st.cache_resource
+def llm_resolver():
+    return LLMIntentResolver() if llm_available() else None
+
+@st.cache_resource(max_entries=1)
+def archive_search(version):
+    # Closed months only change at a roll-over, so one index serves every session until then
+    return SearchIndex(archived_entries())
+
+@st.cache_resource
+def sync_engine():
+    # Uploads the local logs in the background; offline just means a longer queue
+    url = os.getenv("CASECLOCK_SYNC_URL")
+    return background_sync(url) if url else None
+
+def google_final(recognizer):
+    def recognize(pcm):
+        try:
+            return recognize_google(recognizer, pcm)
+        except (sr.UnknownValueError, sr.RequestError):
+            return None
+    return recognize
+
+sync = sync_engine()
+if sync and (sync.pending or sync.last_error):
+    st.caption(f"☁️ {sync.pending} change(s) waiting to sync" + (" — offline, retrying" if sync.last_error else ""))
+
+# === Timer State ===
+def merge_count():
+    # Entries other instances added or removed, as merged into our saves so far
+    if STORAGE_MODE != "shared":
+        return 0
+    stats = shared_log(LOG_FILE).stats
+    return stats["merged_in"] + stats["dropped"]
+
+def reindex(logs, merged=False):
+    st.session_state.logs = logs
+    # Same user, client, start and end as a logged entry (a double-clicked save) is refused
+    st.session_state.hashes = EntryHashes.open(logs)
+    st.session_state.index = build_index(logs, st.session_state.hashes)
+    # A merged list keeps our order with theirs appended, unlike the file the .idx was saved for
+    st.session_state.dates = DateIndex.build(logs) if merged else DateIndex.open(logs)
+    st.session_state.search = SearchIndex(logs)
+    st.session_state.analytics = AnalyticsCache()
+    st.session_state.merges_seen = merge_count()
+
+if 'timers' not in st.session_state:
+    # Once per session, not per rerun: closed months move to the Parquet archive and the
+    # session works on the open period the roll-over returns. The roll-over migrates legacy
+    # wall-clock strings to epoch entries first; they reach disk with the next save
+    logs = roll_closed_periods()
+    reindex(logs)
+    st.session_state.timers = TimerEngine(user=CURRENT_USER)
+    st.session_state.history = History()
+    st.session_state.expenses = ExpenseLedger()
+    st.session_state.pulled_seen = sync.stats["pulled"] if sync else 0
+    if st.session_state.timers.active:
+        gone = time.time() - st.session_state.timers.last_seen
+        st.info(f"♻️ Resumed {len(st.session_state.timers.active)} running timer(s); "
+                f"last seen {format_duration(gone)} ago")
+timers = st.session_state.timers
+timers.heartbeat()
+
+if sync and sync.stats["pulled"] != st.session_state.pulled_seen:
+    # The background pull saved other devices' changes to the log: merge them into ours
+    st.session_state.pulled_seen = sync.stats["pulled"]
+    if any(refresh_log(st.session_state.logs).values()):
+        reindex(st.session_state.logs, merged=True)
+        st.info("🔄 Merged changes synced from another device")
+
+def logged(entries):
+    # Entries were appended and saved: bring the date and search indexes up to date
+    st.session_state.history.appended(st.session_state.logs, entries, label="log " + ", ".join(
+        sorted({e["client"] for e in entries})))
+    if merge_count() != st.session_state.merges_seen:
+        # The save merged in another instance's changes: rare enough to index from scratch
+        reindex(st.session_state.logs, merged=True)
+        st.info("🔄 Merged changes from another CaseClock instance")
+        return
+    st.session_state.dates.sync(st.session_state.logs)
+    st.session_state.hashes.sync(st.session_state.logs)
+    for e in entries:
+        st.session_state.search.add(e)
+
+def replayed(removed, added):
+    # An undo or redo changed the log in memory: save it and bring every index along
+    logs = st.session_state.logs
+    save_log(logs)
+    if merge_count() != st.session_state.merges_seen:
+        reindex(logs, merged=True)
+        return
+    try:
+        for e in removed:
+            st.session_state.index.discard(e)
+            st.session_state.search.remove(e)
+        for e in added:
+            # Restoring what was there before: overlaps were already accepted once
+            st.session_state.index.add(e, allow_overlap=True)
+            st.session_state.search.add(e)
+    except ValueError:
+        # The same entry was logged again in the meantime; index the log as it now stands
+        reindex(logs)
+        return
+    st.session_state.analytics.touch(removed, removed=not added)
+    st.session_state.analytics.touch(added)
+    st.session_state.dates.sync(logs, edited=True)
+    st.session_state.hashes.sync(logs, edited=True)
+
+def stop_timers(names, end_ts, task_type="", notes=""):
+    try:
+        entries = timers.stop(names, st.session_state.logs, st.session_state.index, end_ts, task_type, notes)
+        for e in entries:
+            st.success(f"🛑 Logged {format_duration(e['duration'])} for {e['client']}")
+        logged(entries)
+    except ValueError as e:
+        st.error(f"⚠️ Not logged: {e}")
+
+# === Listening ===
+# Below the session setup, so an early commit can act on the timers mid-utterance
+transcript = ""
+heard_at = None  # when the command was decided: early commit, or end of utterance
+acted = False  # an early commit already ran the start/stop the transcript asks for
 if st.button("🎧 Start Listening"):
     recognizer = sr.Recognizer()
     try:
-        with sr.Microphone() as source:
-            st.info("Listening for 10 seconds...")
-            audio = recognizer.listen(source, timeout=10, phrase_time_limit=10)
-        try:
-            transcript = recognizer.recognize_google(audio)
+        if streaming_available():
+            # Partial hypotheses commit start/stop before the utterance is even finished; the
+            # commit acts at once and the final transcript only confirms or corrects it
+            status = st.empty()
+            early = None
+            for event in listen_streaming(case_names, vosk_stream(), google_final(recognizer),
+                                          IncrementalParser(case_names, resolve=intent_cache().resolve)):
+                if event[0] == "partial":
+                    status.info(f"🎙️ {event[1]}…")
+                elif event[0] == "commit":
+                    heard_at = event[2]
+                    try:
+                        early = EarlyCommit(timers, event[1], heard_at)
+                        status.success(f"⚡ {event[1]['action'].title()} {event[1]['client'] or ''}".strip())
+                    except ValueError:
+                        pass  # the final transcript retries the start and reports why it failed
+                elif event[0] == "final":
+                    transcript = event[1]
+                    heard_at = heard_at or event[3]
+                elif event[0] == "correct":
+                    heard_at = event[2]
+                    if early is not None:
+                        early.revert()
+                        early = None
+                    st.warning(f"↩️ Corrected: heard '{transcript}'")
+            if early is not None:
+                acted = True
+                intent = early.intent
+                if early.stop:
+                    stop_timers(early.stop, early.at)
+                elif intent["action"] == "start":
+                    st.success(f"✅ Timer running for: {intent['client']} ({len(timers.active)} running)")
+                else:
+                    st.warning(f"No timer for {intent['client']}." if intent["client"] else "No timer was running.")
+        else:
+            st.info("Listening... (stops when you stop talking)")
+            transcript = listen_for_command(recognizer)
+            heard_at = time.time()
+        if transcript:
             st.success(f"You said: '{transcript}'")
-        except sr.UnknownValueError:
-            transcript = ""
+        else:
             st.error("Sorry, couldn't understand.")
-        except sr.RequestError:
-            transcript = ""
-            st.error("Mic or internet issue.")
-    except Exception as e:
-        transcript = ""
-        st.error(f"Mic error: {e}")
-else:
-    transcript = ""
-
-def match_case(text):
-    match, score, _ = process.extractOne(text, case_names)
-    return match if score >= 80 else text.strip()
-
-def extract_case_name(text):
-    import re
-    text = text.lower()
-    for pattern in [
-        r"(start|begin|log|logging|track|billing|start billing)( time)?( for)? ",
-        r"(switch to|change to) ",
-        r"(stop|end)( logging| tracking)?( for)? ",
-        r"(bill|add|log)( expense)?( for)? "
-    ]:
-        text = re.sub(pattern, "", text)
-    return text.strip()
-
-# === Timer State ===
-if 'is_timing' not in st.session_state:
-    st.session_state.is_timing = False
-    st.session_state.start_time = None
-    st.session_state.client = ""
-    st.session_state.logs = logs
-    st.session_state.expenses = expenses
+    except sr.UnknownValueError:
+        st.error("Sorry, couldn't understand.")
+    except sr.RequestError:
+        st.error("Mic or internet issue.")
 
 # === Voice Parsing Logic ===
-if transcript:
-    lower = transcript.lower()
-    if any(word in lower for word in ["start", "begin", "log", "track", "billing", "switch"]):
-        case = match_case(extract_case_name(lower))
-        st.session_state.is_timing = True
-        st.session_state.start_time = time.time()
-        st.session_state.client = case
-        st.success(f"✅ Timer started for: {case}")
-    elif "stop" in lower:
-        if st.session_state.is_timing:
-            duration = round(time.time() - st.session_state.start_time)
-            start_dt = datetime.datetime.fromtimestamp(st.session_state.start_time)
-            end_dt = datetime.datetime.now()
-            log_entry = {
-                "client": st.session_state.client,
-                "start": start_dt.strftime("%Y-%m-%d %H:%M:%S"),
-                "end": end_dt.strftime("%Y-%m-%d %H:%M:%S"),
-                "duration": str(datetime.timedelta(seconds=duration))
-            }
-            task_type = st.selectbox("Task type?", ["", "briefing", "meeting", "research", "prep", "email", "call", "other"])
-            notes = st.text_input("Notes (optional):")
-            if st.button("✅ Save Entry"):
-                log_entry["task_type"] = task_type
-                log_entry["notes"] = notes
-                st.session_state.logs.append(log_entry)
-                save_json(LOG_FILE, st.session_state.logs)
-                st.success(f"🛑 Logged {log_entry['duration']} for {log_entry['client']}")
-                st.session_state.is_timing = False
-                st.session_state.client = ""
-    elif "bill" in lower or "add" in lower or "expense" in lower:
-        for cat in EXPENSE_CATEGORIES:
-            if cat.lower() in lower:
-                category = cat
-                break
-        else:
-            category = "Other"
-        case = match_case(extract_case_name(lower))
+if transcript and not acted:
+    intent = intent_cache().resolve(transcript)
+    # Free-form speech the rules can't place goes to the LLM tier, within its latency budget
+    intent = resolve_with_fallback(transcript, intent, case_names, llm_resolver())
+    st.caption(f"Intent cache hit rate: {intent_cache().hit_rate():.0%}")
+    if intent["action"] == "expense":
+        case = intent["client"]
+        category = intent["category"]
         st.subheader("🧾 Log Expense")
         st.text(f"Client: {case}")
         st.text(f"Category: {category}")
-        amount = st.text_input("Amount (e.g., 32.50):", key="expense_amt")
+        amount = st.text_input("Amount (e.g., 32.50):", value=str(intent["amount"] or ""), key="expense_amt")
         note = st.text_input("Notes (optional):", key="expense_note")
         if st.button("✅ Save Expense"):
-            entry = {
-                "client": case,
-                "category": category,
-                "amount": amount,
-                "notes": note,
-                "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
-            st.session_state.expenses.append(entry)
-            save_json(EXPENSE_FILE, st.session_state.expenses)
-            st.success(f"Logged expense for {case}: {category} (${amount})")
+            try:
+                entry = st.session_state.expenses.add(case, category, amount, note)
+                st.success(f"Logged expense for {case}: {category} (${entry['amount']})")
+            except ValueError as e:
+                st.error(f"⚠️ {e}")
+    elif intent["action"] == "allocate":
+        clients = intent.get("clients") or [intent["client"]]
+        try:
+            added = allocate_last(st.session_state.logs, st.session_state.index, intent["minutes"], clients,
+                                  now=heard_at, user=CURRENT_USER)
+            logged(added)
+            st.success(f"🕘 Logged the last {intent['minutes']} min: " + ", ".join(
+                f"{e['client']} {format_duration(e['duration'])}" for e in added))
+        except ValueError as e:
+            st.error(f"⚠️ {e}")
+    elif intent["action"] == "start":
+        case = intent["client"]
+        # "Switch to" closes whatever is running; "start" adds a timer alongside it
+        if intent.get("switch") and timers.active - {case}:
+            stop_timers(sorted(timers.active - {case}), heard_at)
+        try:
+            timers.start(case, now=heard_at)
+            st.success(f"✅ Timer running for: {case} ({len(timers.active)} running)")
+        except ValueError as e:
+            st.error(f"⚠️ Not started: {e}")
+    elif intent["action"] == "pause":
+        # A named client with no timer is a mishearing, not "pause everything"
+        if intent["client"] and intent["client"] not in timers:
+            st.warning(f"No timer for {intent['client']}.")
+        else:
+            names = [intent["client"]] if intent["client"] else list(timers.active)
+            for name in names:
+                timers.pause(name, heard_at)
+            st.info(f"⏸️ Paused: {', '.join(names) or 'nothing was running'}")
+    elif intent["action"] == "stop":
+        names = [intent["client"]] if intent["client"] else list(timers.timers)
+        if intent["client"] and intent["client"] not in timers:
+            st.warning(f"No timer for {intent['client']}.")
+        elif names:
+            task_type = st.selectbox("Task type?", ["", "briefing", "meeting", "research", "prep", "email", "call", "other"])
+            notes = st.text_input("Notes (optional):")
+            if st.button("✅ Save Entry"):
+                stop_timers(names, heard_at, task_type, notes)
+        else:
+            st.warning("No timer was running.")
 
 # === Timer Status ===
-if st.session_state.is_timing:
-    st.info(f"⏱️ Timer running for: {st.session_state.client}")
+if len(timers):
+    st.subheader("⏱️ Timers")
+    now = time.time()
+    for t in sorted(timers.timers.values(), key=lambda t: t.first_start):
+        col_name, col_toggle, col_stop = st.columns([3, 1, 1])
+        state = "running" if t.running else "paused"
+        col_name.write(f"{t.client}: {format_duration(t.elapsed(now))} ({state})")
+        if col_toggle.button("⏸️ Pause" if t.running else "▶️ Resume", key=f"toggle_{t.name}"):
+            (timers.pause if t.running else timers.resume)(t.name)
+            st.rerun()
+        if col_stop.button("⏹️ Stop", key=f"stop_{t.name}"):
+            stop_timers([t.name], time.time())
+    if len(timers) > 1 and st.button("⏹️ Stop All"):
+        # One log write for every closed timer
+        stop_timers(list(timers.timers), time.time())
 
 # === Logs ===
+RANGES = {"Today": day_range, "This week": week_range, "This month": month_range, "All": lambda: (None, None)}
+history = st.session_state.history
+col_undo, col_redo = st.columns(2)
+if history.can_undo and col_undo.button(f"↩️ Undo {history.next_undo()}"):
+    replayed(*history.undo(st.session_state.logs)[1:])
+    st.rerun()
+if history.can_redo and col_redo.button(f"↪️ Redo {history.next_redo()}"):
+    replayed(*history.redo(st.session_state.logs)[1:])
+    st.rerun()
 if st.session_state.logs:
     st.subheader("📋 Time Log")
-    for e in st.session_state.logs:
-        row = f"{e['client']}: {e['start']} → {e['end']} ({e['duration']})"
+    # Log view, totals and export all read the chosen range through the date index
+    shown = st.session_state.dates.entries(st.session_state.logs, *RANGES[st.radio(
+        "📅 Range", list(RANGES), index=1, horizontal=True)]())
+    query = st.text_input("🔎 Search notes, clients and task types")
+    if query:
+        # Ranked matches from the open period and the archived months replace the date range
+        started = time.perf_counter()
+        archived = archive_search(archive_version()).search(query, limit=50)
+        hits = sorted(st.session_state.search.search(query, limit=50) + archived, key=lambda h: -h[1])[:50]
+        shown = [e for e, _ in hits]
+        from_archive = {id(e) for e, _ in archived}
+        st.caption(f"{len(shown)} best matches ({sum(id(e) in from_archive for e in shown)} from archived months) "
+                   f"in {(time.perf_counter() - started) * 1000:.1f} ms")
+    for e in shown:
+        row = f"{e['client']}: {format_ts(e['start'])} → {format_ts(e['end'])} ({format_duration(e['duration'])})"
         if e.get("task_type"): row += f" — {e['task_type']}"
         if e.get("notes"): row += f" | Notes: {e['notes']}"
         st.write(row)
 
     st.download_button("📤 Download Time CSV", data="client,start,end,duration,task_type,notes\n" + "\n".join(
-        f"{e['client']},{e['start']},{e['end']},{e['duration']},{e.get('task_type','')},{e.get('notes','')}" for e in st.session_state.logs
+        f"{e['client']},{format_ts(e['start'])},{format_ts(e['end'])},{format_duration(e['duration'])},{e.get('task_type','')},{e.get('notes','')}" for e in shown
     ), file_name="caseclock_log.csv")
 
+    gaps = st.session_state.index.gaps_today(CURRENT_USER)
+    if gaps:
+        with st.expander(f"🕳️ Untracked today ({len(gaps)})"):
+            for start, end in gaps:
+                st.write(f"{format_ts(start, '%H:%M')} → {format_ts(end, '%H:%M')} ({format_duration(end - start)})")
+
 # === Expenses ===
-if st.session_state.expenses:
+ledger = st.session_state.expenses
+if ledger.entries:
     st.subheader("💸 Expense Log")
-    for e in st.session_state.expenses:
+    for e in ledger.entries:
         st.write(f"{e['client']} — {e['category']}: ${e['amount']} | {e['timestamp']} {('- ' + e['notes']) if e['notes'] else ''}")
 
+    st.subheader("🧮 Expenses per Client")
+    for c, amt in sorted(ledger.by_client.items()):
+        st.write(f"💵 {c}: ${amt:,.2f}")
+    st.write(f"**Total: ${ledger.total():,.2f}**")
+
     st.download_button("📥 Download Expenses CSV", data="client,category,amount,timestamp,notes\n" + "\n".join(
-        f"{e['client']},{e['category']},{e['amount']},{e['timestamp']},{e.get('notes','')}" for e in st.session_state.expenses
+        f"{e['client']},{e['category']},{e['amount']},{e['timestamp']},{e.get('notes','')}" for e in ledger.entries
     ), file_name="caseclock_expenses.csv")
 
 # === Total Time Per Case Summary ===
-if st.session_state.logs:
-    st.subheader("📊 Total Hours per Case")
-    from collections import defaultdict
-    totals = defaultdict(float)
-    for e in st.session_state.logs:
-        t = e['duration'].split(':')
-        hours = int(t[0]) + int(t[1])/60 + int(t[2])/3600
-        totals[e['client']] += hours
-    for c, h in totals.items():
-        st.write(f"🕒 {c}: {round(h, 2)} hours")
+if st.session_state.logs and shown:
+    st.subheader("📊 Billable Hours per Case")
+    totals = invoice_totals(log_frame(shown))
+    for row in totals.itertuples():
+        st.write(f"🕒 {row.client}: {row.billable_hours:.2f} billable hours ({row.raw_hours:.2f} worked) — ${row.amount:,.2f}")
+
+# === Analytics ===
+with st.expander("📈 Analytics"):
+    analytics = st.session_state.analytics
+    # Only weeks touched since the last render are recomputed; unchanged views come back memoized
+    analytics.refresh(st.session_state.logs, st.session_state.dates)
+    weekly_target = st.number_input("Target billable hours per week", min_value=0.0, value=30.0)
+    by_week = analytics.hours_by_client_week()
+    if not by_week.empty:
+        st.markdown("**Hours by client per week**")
+        st.bar_chart(by_week)
+        st.markdown("**Task-type mix**")
+        st.bar_chart(analytics.task_mix())
+        st.markdown("**Utilization vs target**")
+        st.line_chart(analytics.utilization(weekly_target)[["billable_hours", "target"]])
+    burn = analytics.expense_burn(st.session_state.expenses)
+    if not burn.empty:
+        st.markdown("**Expense burn (cumulative)**")
+        st.line_chart(burn)
+
+# === Reports ===
+with st.expander("📑 Invoices & Reports"):
+    fmt = st.selectbox("Format", ["csv", "html", "pdf"])
+    inv_client = st.selectbox("Invoice client", [""] + case_names)
+    if inv_client and st.button("Build Invoice"):
+        st.download_button(f"📄 Download {inv_client} Invoice", data=render(
+            invoice_rows(inv_client), INVOICE_COLUMNS, fmt, f"Invoice — {inv_client}"
+        ), file_name=f"invoice_{inv_client.replace(' ', '_')}.{fmt}")
+    target = st.number_input("Target billable hours per client", min_value=0.0, value=0.0)
+    if st.button("Build Utilization Report"):
+        st.download_button("📊 Download Utilization Report", data=render(
+            utilization_rows(target_hours=target or None), UTILIZATION_COLUMNS, fmt, "Firm Utilization"
+        ), file_name=f"utilization.{fmt}")
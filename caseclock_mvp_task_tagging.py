@@ -9,6 +9,8 @@ from rapidfuzz import process
 import json
 from pathlib import Path
 
+from caseclock_history import History
+
 # Load environment and OpenAI API key
 load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY")
@@ -68,6 +70,7 @@ if 'is_timing' not in st.session_state:
     st.session_state.start_time = None
     st.session_state.client = ""
     st.session_state.logs = load_logs()
+    st.session_state.history = History()
 
 if st.button("🎧 Start Listening"):
     recognizer = sr.Recognizer()
@@ -124,6 +127,7 @@ if transcript:
                 log_entry["task_type"] = task_type
                 log_entry["notes"] = notes
                 st.session_state.logs.append(log_entry)
+                st.session_state.history.appended(st.session_state.logs, [log_entry], label=f"log {log_entry['client']}")
                 save_logs(st.session_state.logs)
                 st.success(f"🛑 Timer stopped. Logged {log_entry['duration']} for {log_entry['client']} as {task_type or 'unspecified'}")
                 st.session_state.is_timing = False
@@ -148,7 +152,19 @@ if st.session_state.logs:
         st.success("Log downloaded!")
 
     if st.button("🗑️ Clear All Logs"):
-        st.session_state.logs = []
-        save_logs([])
+        st.session_state.history.clear(st.session_state.logs)
+        save_logs(st.session_state.logs)
         st.success("All logs cleared.")
 
+# Undo / redo, replayed to the log file
+history = st.session_state.history
+col_undo, col_redo = st.columns(2)
+if history.can_undo and col_undo.button(f"↩️ Undo {history.next_undo()}"):
+    history.undo(st.session_state.logs)
+    save_logs(st.session_state.logs)
+    st.rerun()
+if history.can_redo and col_redo.button(f"↪️ Redo {history.next_redo()}"):
+    history.redo(st.session_state.logs)
+    save_logs(st.session_state.logs)
+    st.rerun()
+
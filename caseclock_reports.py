@@ -0,0 +1,247 @@
+import csv
+import html
+import io
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+import pandas as pd
+
+from caseclock_archive import ARCHIVE_DIR, iter_archive_batches
+from caseclock_billing import apply_billing, load_rules, wall_clock
+from caseclock_expenses import coerce_amount
+from caseclock_date_index import DateIndex
+from caseclock_dedupe import entry_uid
+from caseclock_storage import (
+    DISPLAY_TZ, LOG_FILE, EXPENSE_FILE, load_json, entry_start, duration_seconds, parse_time, to_epoch
+)
+
+TIME_COLUMNS = ["client", "start", "duration_seconds", "task_type", "notes"]
+INVOICE_COLUMNS = ["date", "kind", "description", "hours", "billable_hours", "rate", "amount"]
+UTILIZATION_COLUMNS = ["client", "entries", "hours", "billable_hours", "fees", "expenses", "utilization"]
+
+# === Streaming sources ===
+def iter_time_batches(clients=None, start=None, end=None, log_path=LOG_FILE,
+                      archive_dir=ARCHIVE_DIR, batch_size=50_000):
+    # Closed periods stream out of the Parquet archive; the open period is the (small) JSON log
+    archived = set()
+    for batch in iter_archive_batches(TIME_COLUMNS + ["uid"], clients, start, end, archive_dir):
+        if batch.num_rows:
+            df = batch.to_pandas()
+            df["start"] = wall_clock(df["start"])
+            archived.update(df.pop("uid").dropna())
+            yield df
+    rows = []
+    logs = load_json(log_path, [])
+    # The date index narrows the open period to the requested range without a scan
+    in_range = DateIndex.open(logs, log_path).entries(
+        logs, start and to_epoch(start, DISPLAY_TZ), end and to_epoch(end, DISPLAY_TZ))
+    for e in in_range:
+        if clients and e["client"] not in clients:
+            continue
+        if archived and entry_uid(e) in archived:
+            continue  # already counted from the archive
+        rows.append({"client": e["client"], "start": entry_start(e), "duration_seconds": duration_seconds(e),
+                     "task_type": e.get("task_type", ""), "notes": e.get("notes", "")})
+        if len(rows) >= batch_size:
+            yield pd.DataFrame(rows, columns=TIME_COLUMNS)
+            rows = []
+    if rows:
+        yield pd.DataFrame(rows, columns=TIME_COLUMNS)
+
+def iter_expenses(clients=None, start=None, end=None, expense_path=EXPENSE_FILE):
+    for e in load_json(expense_path, []):
+        ts = parse_time(e["timestamp"])
+        if clients and e["client"] not in clients:
+            continue
+        if (start and ts < start) or (end and ts >= end):
+            continue
+        yield {**e, "timestamp": ts, "amount": coerce_amount(e["amount"])}
+
+# === Reports ===
+def invoice_rows(client, start=None, end=None, rules=None, log_path=LOG_FILE,
+                 expense_path=EXPENSE_FILE, archive_dir=ARCHIVE_DIR):
+    # Line items for one client, then a total row; only one batch is held at a time
+    rules = rules or load_rules()
+    hours = billable = Decimal("0")
+    fees = Decimal("0")
+    for df in iter_time_batches([client], start, end, log_path, archive_dir):
+        billed = apply_billing(df, rules)
+        worked = (billed["duration_seconds"] / 3600).round(2)
+        hours += Decimal(f"{worked.sum():.2f}")
+        billable += Decimal(f"{billed['billable_hours'].sum():.2f}")
+        fees += Decimal(f"{billed['amount'].sum():.2f}")
+        # Format the whole batch column-wise, then hand rows out one at a time
+        description = (billed["task_type"].fillna("") + " — " + billed["notes"].fillna("")).str.strip(" —")
+        columns = (
+            billed["start"].to_numpy().astype("datetime64[D]").astype(str).tolist(),
+            ["time"] * len(billed),
+            description.where(description != "", "Legal services").tolist(),
+            [f"{h:.2f}" for h in worked.tolist()],
+            [f"{h:.2f}" for h in billed["billable_hours"].tolist()],
+            [f"{r:.2f}" for r in billed["rate"].tolist()],
+            [f"{a:.2f}" for a in billed["amount"].tolist()],
+        )
+        for values in zip(*columns):
+            yield dict(zip(INVOICE_COLUMNS, values))
+    costs = Decimal("0")
+    for e in iter_expenses([client], start, end, expense_path):
+        costs += e["amount"]
+        yield {
+            "date": e["timestamp"].strftime("%Y-%m-%d"),
+            "kind": "expense",
+            "description": " — ".join(x for x in (e["category"], e.get("notes", "")) if x),
+            "hours": "", "billable_hours": "", "rate": "",
+            "amount": f"{e['amount']:.2f}",
+        }
+    yield {
+        "date": "", "kind": "total", "description": f"Total for {client}",
+        "hours": f"{hours:.2f}", "billable_hours": f"{billable:.2f}", "rate": "",
+        "amount": f"{fees + costs:.2f}",
+    }
+
+def utilization_rows(start=None, end=None, target_hours=None, rules=None, log_path=LOG_FILE,
+                     expense_path=EXPENSE_FILE, archive_dir=ARCHIVE_DIR):
+    # Firm-wide rollup; memory is O(clients), not O(entries)
+    rules = rules or load_rules()
+    totals = defaultdict(lambda: {"entries": 0, "seconds": 0, "billable_hours": 0.0,
+                                  "fees": 0.0, "expenses": Decimal("0")})
+    for df in iter_time_batches(None, start, end, log_path, archive_dir):
+        billed = apply_billing(df, rules)
+        grouped = billed.groupby("client", observed=True).agg(
+            entries=("duration_seconds", "size"),
+            seconds=("duration_seconds", "sum"),
+            billable_hours=("billable_hours", "sum"),
+            fees=("amount", "sum"),
+        )
+        for client, g in grouped.iterrows():
+            t = totals[client]
+            t["entries"] += int(g["entries"])
+            t["seconds"] += int(g["seconds"])
+            t["billable_hours"] += float(g["billable_hours"])
+            t["fees"] += float(g["fees"])
+    for e in iter_expenses(None, start, end, expense_path):
+        totals[e["client"]]["expenses"] += e["amount"]
+
+    for client in sorted(totals):
+        t = totals[client]
+        yield {
+            "client": client,
+            "entries": t["entries"],
+            "hours": f"{t['seconds'] / 3600:.2f}",
+            "billable_hours": f"{t['billable_hours']:.2f}",
+            "fees": f"{t['fees']:.2f}",
+            "expenses": f"{t['expenses']:.2f}",
+            "utilization": f"{t['billable_hours'] / target_hours:.0%}" if target_hours else "",
+        }
+
+# === Writers ===
+def write_csv(rows, columns, out):
+    writer = csv.DictWriter(out, fieldnames=columns)
+    writer.writeheader()
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+def write_html(rows, columns, out, title="CaseClock Report"):
+    out.write(f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{html.escape(title)}</title></head><body>\n")
+    out.write(f"<h1>{html.escape(title)}</h1>\n<table border='1' cellspacing='0' cellpadding='4'>\n<tr>")
+    out.write("".join(f"<th>{html.escape(c)}</th>" for c in columns) + "</tr>\n")
+    count = 0
+    for row in rows:
+        out.write("<tr>" + "".join(f"<td>{html.escape(str(row.get(c, '')))}</td>" for c in columns) + "</tr>\n")
+        count += 1
+    out.write("</table></body></html>\n")
+    return count
+
+def write_pdf(rows, columns, out, title="CaseClock Report"):
+    # reportlab is only needed when someone actually asks for a PDF
+    from reportlab.lib.pagesizes import landscape, letter
+    from reportlab.pdfgen import canvas
+
+    width, height = landscape(letter)
+    pdf = canvas.Canvas(out, pagesize=(width, height))
+    col_width = (width - 72) / len(columns)
+
+    def header():
+        pdf.setFont("Helvetica-Bold", 14)
+        pdf.drawString(36, height - 40, title)
+        pdf.setFont("Helvetica-Bold", 8)
+        for i, c in enumerate(columns):
+            pdf.drawString(36 + i * col_width, height - 60, c)
+        pdf.setFont("Helvetica", 8)
+        return height - 74
+
+    # Rows are drawn as they arrive; only the rendered pages are kept, never the source rows
+    y = header()
+    count = 0
+    for row in rows:
+        if y < 36:
+            pdf.showPage()
+            y = header()
+        for i, c in enumerate(columns):
+            pdf.drawString(36 + i * col_width, y, str(row.get(c, ""))[:40])
+        y -= 11
+        count += 1
+    pdf.save()
+    return count
+
+WRITERS = {"csv": write_csv, "html": write_html, "pdf": write_pdf}
+
+def render(rows, columns, fmt, title="CaseClock Report"):
+    # Convenience for st.download_button, which wants the finished bytes
+    if fmt == "csv":
+        buf = io.StringIO()
+        write_csv(rows, columns, buf)
+        return buf.getvalue().encode()
+    if fmt == "html":
+        buf = io.StringIO()
+        write_html(rows, columns, buf, title)
+        return buf.getvalue().encode()
+    buf = io.BytesIO()
+    write_pdf(rows, columns, buf, title)
+    return buf.getvalue()
+
+# === Benchmark ===
+def benchmark(n=500_000, fmt="csv"):
+    import tempfile
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    from caseclock_archive import ARCHIVE_SCHEMA, PARTITIONING
+
+    rng = np.random.default_rng(0)
+    clients = np.array(["Sierra Club", "Queen Creek", "PennEnvironment", "DEP Tracker"])
+    starts = pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365 * 86400, n), unit="s")
+    durations = rng.integers(60, 4 * 3600, n)
+    table = pa.table({
+        "client": clients[rng.integers(0, len(clients), n)],
+        "start": starts.values.astype("datetime64[s]"),
+        "end": (starts + pd.to_timedelta(durations, unit="s")).values.astype("datetime64[s]"),
+        "duration_seconds": durations,
+        "task_type": np.full(n, "research"),
+        "notes": np.full(n, ""),
+        "user": np.full(n, ""),
+        "uid": [f"{i:032x}" for i in range(n)],
+        "extra": np.full(n, "{}"),
+        "month": starts.strftime("%Y-%m"),
+    }, schema=ARCHIVE_SCHEMA)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ds.write_dataset(table, f"{tmp}/archive", format="parquet", partitioning=PARTITIONING)
+        sources = {"log_path": f"{tmp}/log.json", "expense_path": f"{tmp}/expenses.json",
+                   "archive_dir": f"{tmp}/archive"}
+        mode = "wb" if fmt == "pdf" else "w"
+        with open(f"{tmp}/out.{fmt}", mode) as out:
+            started = time.perf_counter()
+            count = WRITERS[fmt](invoice_rows("Sierra Club", **sources), INVOICE_COLUMNS, out)
+            elapsed = time.perf_counter() - started
+    return count, elapsed
+
+if __name__ == "__main__":
+    import sys
+    fmt = sys.argv[1] if len(sys.argv) > 1 else "csv"
+    count, elapsed = benchmark(fmt=fmt)
+    print(f"{fmt}: {count:,} invoice rows in {elapsed:.2f}s ({count / elapsed:,.0f} rows/s)")
@@ -0,0 +1,217 @@
+import math
+import random
+import re
+import time
+from array import array
+from bisect import bisect_left, insort
+
+import numpy as np
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+# A hit on the client name outranks one buried in the notes
+FIELD_WEIGHTS = {"client": 3.0, "task_type": 2.0, "notes": 1.0}
+MAX_PREFIX_TERMS = 64
+K1, B = 1.2, 0.75
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+def entry_terms(entry):
+    terms = {}
+    for field, weight in FIELD_WEIGHTS.items():
+        for token in TOKEN_RE.findall((entry.get(field) or "").lower()):
+            terms[token] = terms.get(token, 0.0) + weight
+    return terms
+
+class SearchIndex:
+    # Inverted index over client, task type and notes. Postings are (doc id, weight) pairs in
+    # compact arrays sorted by doc id; appends are O(terms), edits re-post only the changed
+    # entry. Queries AND their terms, treat the last one as a prefix, and rank with BM25.
+    # Entries are tracked by identity, like TimeIndex: replace or remove an entry before
+    # mutating it.
+    def __init__(self, logs=()):
+        self.postings = {}   # term -> (array of doc ids, array of weights)
+        self.vocab = []      # sorted terms, for prefix lookups
+        self.docs = []       # doc id -> entry, None once removed
+        self.ids = {}        # id(entry) -> doc id
+        self.lengths = array("f")
+        self.total_length = 0.0
+        self.live = 0
+        self._bulk_load(logs)
+
+    def __len__(self):
+        return self.live
+
+    def _bulk_load(self, logs):
+        # Startup build: plain lists first, one conversion to arrays and one vocab sort
+        docs_by_term, weights_by_term = {}, {}
+        lengths = []
+        for doc, entry in enumerate(logs):
+            terms = entry_terms(entry)
+            for term, weight in terms.items():
+                docs = docs_by_term.get(term)
+                if docs is None:
+                    docs = docs_by_term[term] = []
+                    weights_by_term[term] = []
+                docs.append(doc)
+                weights_by_term[term].append(weight)
+            lengths.append(sum(terms.values()))
+            self.ids[id(entry)] = doc
+        self.docs = list(logs)
+        self.postings = {t: (array("I", d), array("f", weights_by_term[t])) for t, d in docs_by_term.items()}
+        self.vocab = sorted(self.postings)
+        self.lengths = array("f", lengths)
+        self.total_length = float(sum(lengths))
+        self.live = len(self.docs)
+
+    def _post(self, term, doc, weight):
+        posting = self.postings.get(term)
+        if posting is None:
+            posting = self.postings[term] = (array("I"), array("f"))
+            insort(self.vocab, term)
+        docs, weights = posting
+        if not docs or doc > docs[-1]:
+            docs.append(doc)
+            weights.append(weight)
+        else:
+            i = bisect_left(docs, doc)
+            docs.insert(i, doc)
+            weights.insert(i, weight)
+
+    def _unpost(self, term, doc):
+        posting = self.postings.get(term)
+        if posting is None:
+            return
+        docs, weights = posting
+        i = bisect_left(docs, doc)
+        if i < len(docs) and docs[i] == doc:
+            del docs[i]
+            del weights[i]
+        if not docs:
+            del self.postings[term]
+            del self.vocab[bisect_left(self.vocab, term)]
+
+    def _index(self, doc, entry):
+        terms = entry_terms(entry)
+        for term, weight in terms.items():
+            self._post(term, doc, weight)
+        length = sum(terms.values())
+        self.lengths[doc] = length
+        self.total_length += length
+
+    def _unindex(self, doc):
+        for term in entry_terms(self.docs[doc]):
+            self._unpost(term, doc)
+        self.total_length -= self.lengths[doc]
+        self.lengths[doc] = 0.0
+
+    def add(self, entry):
+        doc = len(self.docs)
+        self.docs.append(entry)
+        self.ids[id(entry)] = doc
+        self.lengths.append(0.0)
+        self._index(doc, entry)
+        self.live += 1
+
+    def replace(self, old, new):
+        doc = self.ids.pop(id(old), None)
+        if doc is None:
+            return self.add(new)
+        self._unindex(doc)
+        self.docs[doc] = new
+        self.ids[id(new)] = doc
+        self._index(doc, new)
+
+    def remove(self, entry):
+        doc = self.ids.pop(id(entry), None)
+        if doc is not None:
+            self._unindex(doc)
+            self.docs[doc] = None
+            self.live -= 1
+
+    def _expand(self, token, prefix):
+        if not prefix:
+            return [token] if token in self.postings else []
+        i = bisect_left(self.vocab, token)
+        out = []
+        while i < len(self.vocab) and self.vocab[i].startswith(token) and len(out) < MAX_PREFIX_TERMS:
+            out.append(self.vocab[i])
+            i += 1
+        return out
+
+    def _term_postings(self, terms):
+        # One query word -> (doc ids, weights); prefix expansions are merged per document
+        parts = [self.postings[t] for t in terms]
+        if len(parts) == 1:
+            return np.frombuffer(parts[0][0], np.uint32), np.frombuffer(parts[0][1], np.float32)
+        docs = np.concatenate([np.frombuffer(d, np.uint32) for d, _ in parts])
+        weights = np.concatenate([np.frombuffer(w, np.float32) for _, w in parts])
+        order = np.argsort(docs, kind="stable")
+        docs, weights = docs[order], weights[order]
+        unique, starts = np.unique(docs, return_index=True)
+        return unique, np.add.reduceat(weights, starts)
+
+    def search(self, query, limit=20):
+        # -> [(entry, score)], best first; newer entries win ties
+        tokens = tokenize(query)
+        if not tokens or not self.live:
+            return []
+        postings = []
+        for n, token in enumerate(tokens):
+            terms = self._expand(token, prefix=n == len(tokens) - 1)
+            if not terms:
+                return []
+            postings.append(self._term_postings(terms))
+        postings.sort(key=lambda p: len(p[0]))
+
+        matched = postings[0][0]
+        for docs, _ in postings[1:]:
+            matched = np.intersect1d(matched, docs, assume_unique=True)
+            if not len(matched):
+                return []
+
+        lengths = np.frombuffer(self.lengths, np.float32)[matched]
+        norm = K1 * (1 - B + B * lengths / (self.total_length / self.live))
+        scores = np.zeros(len(matched))
+        for docs, weights in postings:
+            idf = math.log(1 + (self.live - len(docs) + 0.5) / (len(docs) + 0.5))
+            w = weights[np.searchsorted(docs, matched)]
+            scores += idf * w * (K1 + 1) / (w + norm)
+
+        if len(matched) > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+            matched, scores = matched[top], scores[top]
+        order = np.lexsort((-matched.astype(np.int64), -scores))
+        return [(self.docs[matched[i]], float(scores[i])) for i in order]
+
+# === Synthetic million-entry check ===
+def benchmark(n=1_000_000, queries=("sierra", "permit review", "call queen", "depo", "briefing three riv"), seed=0):
+    rng = random.Random(seed)
+    clients = ["Sierra Club", "Three Rivers Waterkeeper", "Queen Creek", "Big Sewickley Creek",
+               "Watson", "Johnson", "Adams"] + [f"Matter {i}" for i in range(500)]
+    tasks = ["briefing", "meeting", "research", "prep", "email", "call", "other"]
+    words = ("reviewed permit file drafted motion call with client deposition prep discovery "
+             "production emails opposing counsel research standing memo hearing outline exhibits "
+             "settlement conference agency comments expert report").split()
+    logs = [{"client": rng.choice(clients), "task_type": rng.choice(tasks),
+             "notes": " ".join(rng.choices(words, k=rng.randint(0, 12)))} for _ in range(n)]
+
+    started = time.perf_counter()
+    index = SearchIndex(logs)
+    build_s = time.perf_counter() - started
+
+    timings = {}
+    for q in queries:
+        started = time.perf_counter()
+        hits = index.search(q)
+        timings[q] = ((time.perf_counter() - started) * 1000, len(hits))
+    started = time.perf_counter()
+    index.replace(logs[10], {**logs[10], "notes": "edited notes"})
+    edit_ms = (time.perf_counter() - started) * 1000
+    return build_s, timings, edit_ms
+
+if __name__ == "__main__":
+    build_s, timings, edit_ms = benchmark()
+    print(f"Indexed 1,000,000 entries in {build_s:.1f}s; one edit re-posted in {edit_ms:.2f} ms")
+    for q, (ms, hits) in timings.items():
+        print(f"  {q!r:>20}: {ms:6.1f} ms ({hits} shown)")
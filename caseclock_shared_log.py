@@ -0,0 +1,235 @@
+import argparse
+import fcntl
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from caseclock_storage import LOG_FILE, load_json, new_entry, save_json
+
+def entry_key(entry):
+    return json.dumps(entry, sort_keys=True, separators=(",", ":"))
+
+def merge(base, ours, theirs):
+    # Three-way merge of entry lists as multisets keyed by content. Our list keeps its order
+    # (so positions other indexes hold stay valid); entries another process added since
+    # `base` are appended, and entries it removed are dropped from ours.
+    # -> (merged list, number added from theirs, number dropped)
+    base_keys, our_keys = Counter(base), Counter(entry_key(e) for e in ours)
+    their_list = [(entry_key(e), e) for e in theirs]
+    their_keys = Counter(k for k, _ in their_list)
+
+    removed_by_them = base_keys - their_keys
+    merged, dropped = [], 0
+    for e in ours:
+        k = entry_key(e)
+        if removed_by_them[k] and base_keys[k]:
+            removed_by_them[k] -= 1
+            dropped += 1
+            continue
+        merged.append(e)
+
+    added_by_them = their_keys - base_keys
+    # Don't re-add what we already hold beyond the base (both sides logged the same thing)
+    already = our_keys - base_keys
+    added = 0
+    for k, e in their_list:
+        if added_by_them[k]:
+            added_by_them[k] -= 1
+            if already[k]:
+                already[k] -= 1
+                continue
+            merged.append(e)
+            added += 1
+    return merged, added, dropped
+
+class LogList(list):
+    # A loaded log that remembers its own merge base: the file version and entry keys it
+    # was last loaded or saved at. Each caller's list merges against what *it* last saw, so
+    # a reload elsewhere in the process can't make a stale list delete newer entries.
+    __slots__ = ("version", "base")
+
+    def __init__(self, entries=(), version=None):
+        super().__init__(entries)
+        self.version = version
+        self.base = [entry_key(e) for e in self]
+
+class SharedLog:
+    # Log file shared by several app instances (e.g. on a network drive). Writers take a
+    # POSIX advisory lock (lockf, which NFS forwards to the server) on a sidecar .lock file
+    # and bump a counter in a sidecar .version file. A save whose base version is still
+    # current is a plain write; otherwise the file is re-read and three-way merged first.
+    # load() returns a LogList that carries its base; a plain list has none, so saving one
+    # only adds to the file and never drops anyone else's entries.
+    def __init__(self, path=LOG_FILE, timeout=30.0):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self.version_path = f"{path}.version"
+        self.timeout = timeout
+        self._fd = None
+        # lockf locks are per process: threads (e.g. Streamlit sessions) queue on this
+        # first, and nested holders in one thread share the file lock
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self.stats = {"saves": 0, "merges": 0, "merged_in": 0, "dropped": 0}
+
+    @contextmanager
+    def locked(self):
+        # Exclusive for readers too: lockf needs a writable fd anyway, and a read holds it
+        # for one file read only
+        with self._thread_lock:
+            if self._depth == 0:
+                fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+                deadline = time.monotonic() + self.timeout
+                while True:
+                    try:
+                        fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        break
+                    except OSError:
+                        if time.monotonic() > deadline:
+                            os.close(fd)
+                            raise TimeoutError(f"Timed out waiting for {self.lock_path}")
+                        time.sleep(0.001)
+                self._fd = fd
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if self._depth == 0:
+                    fcntl.lockf(self._fd, fcntl.LOCK_UN)
+                    os.close(self._fd)
+                    self._fd = None
+
+    def _read_version(self):
+        try:
+            with open(self.version_path) as f:
+                return int(f.read() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _write(self, entries, version):
+        save_json(self.path, entries)
+        tmp = f"{self.version_path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(str(version))
+        os.replace(tmp, self.version_path)
+
+    def load(self):
+        with self.locked():
+            return LogList(load_json(self.path, []), self._read_version())
+
+    def save(self, entries):
+        # Updates `entries` in place when other writers' changes were merged in.
+        # -> {"merged_in": n, "dropped": n}
+        version, base = getattr(entries, "version", None), getattr(entries, "base", [])
+        with self.locked():
+            current = self._read_version()
+            merged_in = dropped = 0
+            if current != version:
+                theirs = load_json(self.path, [])
+                merged, merged_in, dropped = merge(base, entries, theirs)
+                entries[:] = merged
+                self.stats["merges"] += 1
+            self._write(entries, current + 1)
+            self.stats["saves"] += 1
+            self.stats["merged_in"] += merged_in
+            self.stats["dropped"] += dropped
+        if isinstance(entries, LogList):
+            entries.version = current + 1
+            entries.base = [entry_key(e) for e in entries]
+        return {"merged_in": merged_in, "dropped": dropped}
+
+    def refresh(self, entries):
+        # Brings a loaded list up to date with the file without writing it, e.g. after a
+        # background pull. Merged in place like a save. -> {"merged_in": n, "dropped": n}
+        with self.locked():
+            current = self._read_version()
+            if current == getattr(entries, "version", None):
+                return {"merged_in": 0, "dropped": 0}
+            theirs = load_json(self.path, [])
+        merged, merged_in, dropped = merge(getattr(entries, "base", []), entries, theirs)
+        entries[:] = merged
+        if isinstance(entries, LogList):
+            entries.version = current
+            entries.base = [entry_key(e) for e in theirs]
+        self.stats["merges"] += 1
+        self.stats["merged_in"] += merged_in
+        self.stats["dropped"] += dropped
+        return {"merged_in": merged_in, "dropped": dropped}
+
+_logs = {}
+_logs_lock = threading.Lock()
+
+def shared_log(path=LOG_FILE):
+    # One SharedLog per path per process, so every thread queues on the same lock
+    with _logs_lock:
+        if path not in _logs:
+            _logs[path] = SharedLog(path)
+        return _logs[path]
+
+# === Stress test: many processes appending at once ===
+def _append_worker(path, worker, appends, shared, barrier):
+    log = SharedLog(path) if shared else None
+    entries = log.load() if shared else load_json(path, [])
+    barrier.wait()
+    for i in range(appends):
+        entries.append(new_entry(f"Worker {worker}", 1_700_000_000 + i, 1_700_000_060 + i, notes=f"{worker}:{i}"))
+        if shared:
+            log.save(entries)
+        else:
+            # The old read-whole/write-whole cycle: re-read, append, write. Concurrent writers
+            # also trip over each other's temp file and half-written JSON.
+            try:
+                entries = load_json(path, []) + [entries[-1]]
+                save_json(path, entries)
+            except (OSError, ValueError):
+                pass
+    return log.stats if shared else {}
+
+def stress(processes=16, appends=50, shared=True):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "caseclock_log.json")
+        save_json(path, [])
+        ctx = multiprocessing.get_context("spawn")
+        with ctx.Manager() as manager:
+            barrier = manager.Barrier(processes)
+            started = time.perf_counter()
+            with ctx.Pool(processes) as pool:
+                stats = pool.starmap(_append_worker,
+                                     [(path, w, appends, shared, barrier) for w in range(processes)])
+            elapsed = time.perf_counter() - started
+        try:
+            final = load_json(path, [])
+        except json.JSONDecodeError:
+            final = []
+    expected = {f"{w}:{i}" for w in range(processes) for i in range(appends)}
+    found = Counter(e["notes"] for e in final)
+    return {
+        "expected": len(expected),
+        "written": len(final),
+        "lost": len(expected - set(found)),
+        "duplicated": sum(n - 1 for n in found.values() if n > 1),
+        "merges": sum(s.get("merges", 0) for s in stats),
+        "elapsed_s": elapsed,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Hammer a shared log with concurrent appends")
+    parser.add_argument("--processes", type=int, default=16)
+    parser.add_argument("--appends", type=int, default=50)
+    parser.add_argument("--unsafe", action="store_true", help="use plain save_json, to show the lost updates")
+    args = parser.parse_args()
+    report = stress(args.processes, args.appends, shared=not args.unsafe)
+    print(f"{'save_json' if args.unsafe else 'SharedLog'}: {report['written']}/{report['expected']} entries, "
+          f"{report['lost']} lost, {report['duplicated']} duplicated, {report['merges']} merges, "
+          f"{report['elapsed_s']:.1f}s")
+    if not args.unsafe:
+        assert report["lost"] == 0 and report["duplicated"] == 0, report
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import contextlib
+import datetime
+import json
+import os
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+CASE_FILE = "caseclock_cases.json"
+LOG_FILE = "caseclock_log.json"
+EXPENSE_FILE = "caseclock_expenses.json"
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Entries keep "start"/"end" as UTC epoch seconds and "duration" as whole seconds; wall-clock
+# strings only exist at render/export time, in CASECLOCK_TZ (system local time when unset)
+DISPLAY_TZ = ZoneInfo(os.environ["CASECLOCK_TZ"]) if os.getenv("CASECLOCK_TZ") else None
+# "shared": the time log sits on a drive several app instances write to; saves are locked,
+# version-checked and merged (see caseclock_shared_log)
+STORAGE_MODE = os.getenv("CASECLOCK_STORAGE", "local")
+
+# === Load/save helpers ===
+def load_json(path, fallback):
+    if Path(path).exists():
+        with open(path, "r") as f:
+            return json.load(f)
+    return fallback
+
+def save_json(path, data):
+    # Write to a sibling temp file first so a crash never leaves half a log behind
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+# === Time log ===
+def load_log(path=LOG_FILE):
+    if STORAGE_MODE == "shared":
+        from caseclock_shared_log import shared_log
+        return shared_log(path).load()
+    return load_json(path, [])
+
+def save_log(logs, path=LOG_FILE):
+    # In shared mode other instances' changes may be merged into logs in place
+    if STORAGE_MODE == "shared":
+        from caseclock_shared_log import shared_log
+        return shared_log(path).save(logs)
+    save_json(path, logs)
+    return None
+
+def refresh_log(logs, path=LOG_FILE):
+    # Merges changes other writers saved since `logs` was loaded into it, in place.
+    # -> {"merged_in": n, "dropped": n}; a local log has no other writers
+    if STORAGE_MODE == "shared":
+        from caseclock_shared_log import shared_log
+        return shared_log(path).refresh(logs)
+    return {"merged_in": 0, "dropped": 0}
+
+def log_lock(path=LOG_FILE):
+    # Holds other instances off for a whole read-modify-write; a no-op for a local log
+    if STORAGE_MODE == "shared":
+        from caseclock_shared_log import shared_log
+        return shared_log(path).locked()
+    return contextlib.nullcontext()
+
+# === Entry field helpers ===
+def parse_time(value):
+    return datetime.datetime.strptime(value, TIME_FORMAT)
+
+def format_time(dt):
+    return dt.strftime(TIME_FORMAT)
+
+def parse_duration(value):
+    # "H:MM:SS" as written by str(timedelta); tolerates "1 day, 2:03:04"
+    days = 0
+    if "day" in value:
+        day_part, value = value.split(",", 1)
+        days = int(day_part.split()[0])
+    h, m, s = value.strip().split(":")
+    return days * 86400 + int(h) * 3600 + int(m) * 60 + int(float(s))
+
+def to_epoch(value, tz=None):
+    # Epoch numbers pass through; legacy strings and naive datetimes are wall-clock time in
+    # tz (system local by default)
+    if isinstance(value, (int, float)):
+        return int(value)
+    dt = value if isinstance(value, datetime.datetime) else parse_time(value)
+    if dt.tzinfo is None and tz:
+        dt = dt.replace(tzinfo=tz)
+    return int(dt.timestamp())
+
+def local_time(ts, tz=DISPLAY_TZ):
+    # Aware datetime for display; the offset is the one in force at ts, so DST is handled
+    return datetime.datetime.fromtimestamp(ts, tz) if tz else datetime.datetime.fromtimestamp(ts).astimezone()
+
+def format_ts(ts, fmt=TIME_FORMAT, tz=DISPLAY_TZ):
+    return local_time(ts, tz).strftime(fmt)
+
+def format_duration(seconds):
+    return str(datetime.timedelta(seconds=int(seconds)))
+
+def entry_start_ts(entry):
+    # Legacy strings read in CASECLOCK_TZ, the same zone migrate_entry uses
+    return to_epoch(entry["start"], DISPLAY_TZ)
+
+def entry_end_ts(entry):
+    return to_epoch(entry["end"], DISPLAY_TZ)
+
+def entry_start(entry):
+    # Naive wall-clock view, for calendar bucketing (days, months) only
+    return local_time(entry_start_ts(entry)).replace(tzinfo=None)
+
+def entry_end(entry):
+    return local_time(entry_end_ts(entry)).replace(tzinfo=None)
+
+def duration_seconds(entry):
+    value = entry.get("duration")
+    if isinstance(value, (int, float)):
+        return int(value)
+    if value:
+        return parse_duration(value)
+    return entry_end_ts(entry) - entry_start_ts(entry)
+
+def entry_label(entry):
+    return f"{entry['client']} {format_ts(entry_start_ts(entry))}–{format_ts(entry_end_ts(entry), '%H:%M:%S')}"
+
+def new_entry(client, start, end, duration=None, task_type="", notes="", **extra):
+    # Canonical log entry; duration differs from end - start only when a timer was paused
+    return {
+        "client": client,
+        "start": int(start),
+        "end": int(end),
+        "duration": int(end - start if duration is None else duration),
+        "task_type": task_type,
+        "notes": notes,
+        **extra,
+    }
@@ -0,0 +1,94 @@
+import itertools
+import json
+import os
+import time
+
+from caseclock_audio import AudioPipeline, FRAME_BYTES, SAMPLE_RATE, iter_frames
+from caseclock_commands import IncrementalParser
+from caseclock_vad import Endpointer, MAX_UTTERANCE_S, PREROLL_MS, FRAME_MS
+
+VOSK_MODEL_PATH = os.getenv("VOSK_MODEL_PATH", "")
+
+class VoskStream:
+    # Offline recognizer that yields a partial hypothesis after every frame
+    def __init__(self, model_path=VOSK_MODEL_PATH, grammar=None):
+        from vosk import Model
+        self.model = Model(model_path)
+        self.grammar = grammar
+        self.reset()
+
+    def reset(self):
+        from vosk import KaldiRecognizer
+        args = [json.dumps(self.grammar)] if self.grammar else []
+        self.rec = KaldiRecognizer(self.model, SAMPLE_RATE, *args)
+        self.segments = []
+
+    def accept(self, frame):
+        if self.rec.AcceptWaveform(bytes(frame)):
+            self.segments.append(json.loads(self.rec.Result())["text"])
+            return " ".join(self.segments).strip()
+        partial = json.loads(self.rec.PartialResult())["partial"]
+        return " ".join(self.segments + [partial]).strip()
+
+    def final(self):
+        self.segments.append(json.loads(self.rec.FinalResult())["text"])
+        return " ".join(s for s in self.segments if s).strip()
+
+def streaming_available():
+    if not VOSK_MODEL_PATH:
+        return False
+    try:
+        import vosk  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def stream_command(frames, stream, case_names, final_recognizer=None,
+                   pipeline=None, endpointer=None, parser=None, replay=()):
+    # Yields events as audio arrives:
+    #   ("partial", text) – every time the hypothesis changes
+    #   ("commit", intent, at) – early start/stop decision, `at` is the wall-clock commit time
+    #   ("final", text, intent, at) – full transcript once the endpointer closes the utterance
+    #   ("correct", intent, at) – the final transcript disagreed with the early commit
+    # final_recognizer, if given, is called with the utterance PCM for a second opinion
+    # (e.g. recognize_google); otherwise the streaming recognizer's final text is used.
+    # replay: audio from before the call (e.g. the wake word) fed to the recognizer only; the
+    # endpointer judges live frames, so a pause after the wake word doesn't end the command.
+    pipeline = pipeline or AudioPipeline(seconds=MAX_UTTERANCE_S + 1)
+    endpointer = endpointer or Endpointer()
+    parser = parser or IncrementalParser(case_names)
+    pipeline.start_utterance()
+    endpointer.reset()
+    stream.reset()
+    parser.reset()
+
+    last = ""
+    tagged = itertools.chain(zip(replay, itertools.repeat(False)), zip(frames, itertools.repeat(True)))
+    for frame, live in tagged:
+        pipeline.feed(frame)
+        event = endpointer.process(frame) if live else None
+        partial = stream.accept(frame)
+        if partial != last:
+            last = partial
+            yield ("partial", partial)
+            intent = parser.feed(partial)
+            if intent:
+                yield ("commit", intent, time.time())
+        if event in ("speech_end", "timeout"):
+            break
+
+    ended = time.time()
+    text = stream.final()
+    if final_recognizer is not None and endpointer.in_speech:
+        n = (endpointer.speech_frames + PREROLL_MS // FRAME_MS) * FRAME_BYTES
+        text = final_recognizer(pipeline.ring.last(n)) or text
+    intent, corrected = parser.finish(text)
+    yield ("final", text, intent, ended)
+    if corrected:
+        yield ("correct", intent, ended)
+
+def listen_streaming(case_names, stream, final_recognizer=None, parser=None):
+    import speech_recognition as sr
+    with sr.Microphone(sample_rate=SAMPLE_RATE, chunk_size=FRAME_BYTES // 2) as source:
+        yield from stream_command(iter_frames(source.stream), stream, case_names, final_recognizer,
+                                  parser=parser)
@@ -0,0 +1,432 @@
+import argparse
+import csv
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+
+from caseclock_archive import ARCHIVE_DIR, archived_uids
+from caseclock_dedupe import entry_uid
+from caseclock_intervals import CURRENT_USER
+from caseclock_migrate import is_canonical, migrate_entry
+from caseclock_shared_log import entry_key
+from caseclock_storage import (
+    DISPLAY_TZ, LOG_FILE, STORAGE_MODE, load_json, load_log, log_lock, new_entry, save_json, save_log, to_epoch
+)
+
+SYNC_URL = os.getenv("CASECLOCK_SYNC_URL", "")
+SYNC_STATE_FILE = "caseclock_sync_state.json"
+RENDERER_FILE = "logs.csv"    # written by renderer/script.js saveLog
+BATCH_SIZE = 2000             # ops per upload / changes per download
+SYNC_INTERVAL_S = 60
+MAX_BACKOFF_S = 900
+CLOCK_FORMATS = ("%I:%M:%S %p", "%H:%M:%S")
+
+def fingerprint(entry):
+    return hashlib.sha256(entry_key(entry).encode()).hexdigest()[:16]
+
+# === Local sources ===
+def parse_clock(text):
+    # toLocaleTimeString(): "1:45:00 PM" (newer Chromes put U+202F before the AM/PM)
+    text = text.replace("\u202f", " ").strip()
+    for fmt in CLOCK_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, fmt).time()
+        except ValueError:
+            pass
+    raise ValueError(f"Unrecognized clock time: {text!r}")
+
+def renderer_entry(row, tz=DISPLAY_TZ, user=CURRENT_USER):
+    # Row: Date,Case,Start Time,End Time,Duration (s),Task Type. Case names are not quoted,
+    # so anything between the date and the last four fields is the case. The date is the
+    # UTC day of the stop (toISOString) while the clock times are local: take the local end
+    # time that falls on that UTC day, and count the duration back from it.
+    day = datetime.date.fromisoformat(row[0])
+    client = ",".join(row[1:-4]).strip()
+    end_clock, duration = parse_clock(row[-3]), int(row[-2])
+    for offset in (0, -1, 1):
+        end = to_epoch(datetime.datetime.combine(day + datetime.timedelta(days=offset), end_clock), tz)
+        if datetime.datetime.fromtimestamp(end, datetime.timezone.utc).date() == day:
+            break
+    extra = {"user": user} if user else {}
+    return new_entry(client, end - duration, end, duration, task_type=row[-1].strip(), source="renderer", **extra)
+
+def read_renderer(path=RENDERER_FILE, tz=DISPLAY_TZ, user=CURRENT_USER):
+    entries, skipped = [], 0
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = csv.reader(f)
+        next(rows, None)
+        for row in rows:
+            try:
+                entries.append(renderer_entry(row, tz, user))
+            except (ValueError, IndexError):
+                skipped += 1
+    return entries, skipped
+
+def read_log(path=LOG_FILE):
+    entries = load_json(path, [])
+    return [e if is_canonical(e) else migrate_entry(e) for e in entries], 0
+
+def stamp(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+# === Client ===
+class SyncEngine:
+    # Offline-first: scan() diffs the local files against what was last seen and queues
+    # upserts/deletes under increasing sequence numbers; push() uploads the queue in gzipped
+    # batches and drops whatever the server acknowledged. Upserts are keyed by entry_uid, so
+    # replaying a batch after a lost response is harmless. pull() applies other devices'
+    # changes since a server-side cursor to the JSON log.
+    def __init__(self, url=SYNC_URL, log_path=LOG_FILE, renderer_path=RENDERER_FILE,
+                 state_path=SYNC_STATE_FILE, batch_size=BATCH_SIZE, tz=DISPLAY_TZ, user=CURRENT_USER,
+                 archive_dir=ARCHIVE_DIR):
+        self.url = url.rstrip("/")
+        self.log_path = log_path
+        self.archive_dir = archive_dir
+        self.renderer_path = renderer_path
+        self.state_path = state_path
+        self.batch_size = batch_size
+        self.tz = tz
+        self.user = user
+        self.state = {"device": uuid.uuid4().hex, "next_seq": 1, "acked": 0, "cursor": 0,
+                      "sources": {}, "pending": {}, **load_json(state_path, {})}
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "raw_bytes": 0, "sent_bytes": 0, "pushed": 0, "pulled": 0}
+        self.last_error = None
+        self.last_sync = None
+
+    @property
+    def device(self):
+        return self.state["device"]
+
+    @property
+    def pending(self):
+        return len(self.state["pending"])
+
+    def _save(self):
+        save_json(self.state_path, self.state)
+
+    def _read(self, source):
+        if source == "log":
+            return read_log(self.log_path)
+        return read_renderer(self.renderer_path, self.tz, self.user)
+
+    def _enqueue(self, op, uid, entry=None):
+        # A newer op for the same entry supersedes a queued one
+        self.state["pending"][uid] = {"seq": self.state["next_seq"], "op": op, "uid": uid, "entry": entry}
+        self.state["next_seq"] += 1
+
+    def scan(self):
+        # -> number of ops queued. Unchanged files (same mtime and size) are not re-read.
+        sources = self.state["sources"]
+        paths = {"log": self.log_path, "renderer": self.renderer_path}
+        gone = set()
+        queued = self.state["next_seq"]
+        for source, path in paths.items():
+            seen = sources.setdefault(source, {"stamp": None, "entries": {}})
+            current_stamp = stamp(path)
+            if current_stamp == seen["stamp"]:
+                continue
+            entries, _ = self._read(source) if current_stamp else ([], 0)
+            current = {}
+            for e in entries:
+                uid, fp = entry_uid(e), fingerprint(e)
+                current[uid] = fp
+                if seen["entries"].get(uid) != fp:
+                    self._enqueue("upsert", uid, e)
+            gone.update(uid for uid in seen["entries"] if uid not in current)
+            seen.update(stamp=current_stamp, entries=current)
+        # An entry only goes away once no local file holds it any more, and one the month
+        # roll-over moved into the archive hasn't gone anywhere
+        gone = {uid for uid in gone if not any(uid in seen["entries"] for seen in sources.values())}
+        if gone:
+            gone -= archived_uids(archive_dir=self.archive_dir)
+        for uid in gone:
+            self._enqueue("delete", uid)
+        self._save()
+        return self.state["next_seq"] - queued
+
+    def _request(self, method, path, payload=None):
+        data = None
+        headers = {"Accept-Encoding": "gzip"}
+        if payload is not None:
+            raw = json.dumps(payload, separators=(",", ":")).encode()
+            data = gzip.compress(raw, compresslevel=6)
+            headers.update({"Content-Type": "application/json", "Content-Encoding": "gzip"})
+            self.stats["raw_bytes"] += len(raw)
+            self.stats["sent_bytes"] += len(data)
+        request = urllib.request.Request(self.url + path, data=data, method=method, headers=headers)
+        with urllib.request.urlopen(request, timeout=30) as response:
+            body = response.read()
+            if response.headers.get("Content-Encoding") == "gzip":
+                body = gzip.decompress(body)
+        self.stats["requests"] += 1
+        return json.loads(body)
+
+    def push(self):
+        pending = self.state["pending"]
+        ops = sorted(pending.values(), key=lambda op: op["seq"])
+        pushed = 0
+        for i in range(0, len(ops), self.batch_size):
+            batch = ops[i:i + self.batch_size]
+            acked = self._request("POST", "/push", {"device": self.device, "ops": batch})["acked"]
+            for op in batch:
+                if op["seq"] <= acked and pending.get(op["uid"]) is op:
+                    del pending[op["uid"]]
+                    pushed += 1
+            self.state["acked"] = acked
+            # Saved per batch, so a dropped connection resumes where it stopped
+            self._save()
+        self.stats["pushed"] += pushed
+        return pushed
+
+    def pull(self):
+        # -> number of other devices' changes applied to the JSON log
+        changes = []
+        cursor = self.state["cursor"]
+        while True:
+            query = urllib.parse.urlencode({"since": cursor, "limit": self.batch_size, "device": self.device})
+            page = self._request("GET", f"/changes?{query}")
+            changes.extend(page["changes"])
+            cursor = page["last"]
+            if not page["more"]:
+                break
+        if changes:
+            with log_lock(self.log_path):
+                logs = load_log(self.log_path)
+                positions = {entry_uid(e): i for i, e in enumerate(logs)}
+                seen = self.state["sources"].setdefault("log", {"stamp": None, "entries": {}})["entries"]
+                for change in changes:
+                    uid, entry = change["uid"], change["entry"]
+                    i = positions.get(uid)
+                    if entry is None:
+                        if i is not None:
+                            logs[i] = None
+                        seen.pop(uid, None)
+                    else:
+                        if i is None:
+                            positions[uid] = len(logs)
+                            logs.append(entry)
+                        else:
+                            logs[i] = entry
+                        seen[uid] = fingerprint(entry)
+                logs[:] = [e for e in logs if e is not None]
+                save_log(logs, self.log_path)
+                # What we just wrote is not a local change to push back
+                self.state["sources"]["log"]["stamp"] = stamp(self.log_path)
+        self.state["cursor"] = cursor
+        self._save()
+        self.stats["pulled"] += len(changes)
+        return len(changes)
+
+    def sync(self, pull=True):
+        with self.lock:
+            queued = self.scan()
+            pushed = self.push()
+            pulled = self.pull() if pull else 0
+            self.last_sync = time.time()
+            return {"queued": queued, "pushed": pushed, "pulled": pulled, "pending": self.pending}
+
+    def run_in_background(self, interval=SYNC_INTERVAL_S, pull=False):
+        # Offline is the normal case: a failed round just waits longer before the next try.
+        # Pulling rewrites the log, so only do it where no other writer would clobber it
+        # (a shared log, or no app running).
+        def loop():
+            wait = interval
+            while True:
+                try:
+                    self.sync(pull)
+                    self.last_error = None
+                    wait = interval
+                except (OSError, ValueError) as e:
+                    self.last_error = str(e)
+                    wait = min(wait * 2, MAX_BACKOFF_S)
+                time.sleep(wait)
+        if not self.url:
+            return None
+        thread = threading.Thread(target=loop, daemon=True)
+        thread.start()
+        return thread
+
+def background_sync(url=SYNC_URL):
+    # Started once per app process when a sync URL is configured
+    engine = SyncEngine(url)
+    engine.run_in_background(pull=STORAGE_MODE == "shared")
+    return engine
+
+# === Central store, and a local stand-in server for it ===
+class SyncStore:
+    # Latest version of every entry (None body = deleted) under a global change sequence,
+    # plus the highest op sequence acknowledged per device
+    def __init__(self, path=":memory:"):
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (uid TEXT PRIMARY KEY, seq INTEGER NOT NULL, device TEXT, body TEXT);
+            CREATE INDEX IF NOT EXISTS entries_seq ON entries (seq);
+            CREATE TABLE IF NOT EXISTS devices (device TEXT PRIMARY KEY, acked INTEGER NOT NULL);
+        """)
+
+    def push(self, device, ops):
+        with self.lock, self.db:
+            row = self.db.execute("SELECT acked FROM devices WHERE device = ?", (device,)).fetchone()
+            acked = row[0] if row else 0
+            seq = self.db.execute("SELECT COALESCE(MAX(seq), 0) FROM entries").fetchone()[0]
+            rows = []
+            for op in sorted(ops, key=lambda op: op["seq"]):
+                if op["seq"] <= acked:
+                    continue  # a retried batch
+                body = json.dumps(op["entry"], sort_keys=True) if op["op"] == "upsert" else None
+                current = self.db.execute("SELECT body FROM entries WHERE uid = ?", (op["uid"],)).fetchone()
+                acked = op["seq"]
+                if (current is None and body is None) or (current is not None and current[0] == body):
+                    continue  # already there: no new change for other devices to pull
+                seq += 1
+                rows.append((op["uid"], seq, device, body))
+            self.db.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)", rows)
+            self.db.execute("INSERT OR REPLACE INTO devices VALUES (?, ?)", (device, acked))
+        return acked
+
+    def changes(self, since, limit, device=None):
+        with self.lock:
+            # A device never needs its own changes back
+            rows = self.db.execute("SELECT seq, uid, body FROM entries WHERE seq > ? AND device IS NOT ? "
+                                   "ORDER BY seq LIMIT ?", (since, device, limit)).fetchall()
+        return {"changes": [{"seq": s, "uid": u, "entry": json.loads(b) if b else None} for s, u, b in rows],
+                "last": rows[-1][0] if rows else since, "more": len(rows) == limit}
+
+    def live(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM entries WHERE body IS NOT NULL").fetchone()[0]
+
+def sync_server(store=None, port=0):
+    # -> (server, base_url); POST /push and GET /changes, gzip both ways
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    store = store or SyncStore()
+
+    class Handler(BaseHTTPRequestHandler):
+        def reply(self, payload):
+            body = json.dumps(payload, separators=(",", ":")).encode()
+            if "gzip" in self.headers.get("Accept-Encoding", ""):
+                body = gzip.compress(body)
+                self.send_response(200)
+                self.send_header("Content-Encoding", "gzip")
+            else:
+                self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            if self.headers.get("Content-Encoding") == "gzip":
+                body = gzip.decompress(body)
+            payload = json.loads(body)
+            self.reply({"acked": store.push(payload["device"], payload["ops"])})
+
+        def do_GET(self):
+            query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+            self.reply(store.changes(int(query["since"][0]), int(query["limit"][0]), query.get("device", [None])[0]))
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.store = store
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+# === A day offline, then reconnect ===
+def offline_day(log_entries=4000, renderer_rows=1000, seed=0):
+    rng = random.Random(seed)
+    clients = ["Sierra Club", "Three Rivers Waterkeeper", "Queen Creek", "Big Sewickley Creek", "Watson, Jr."]
+    tasks = ["briefing", "meeting", "research", "prep", "email", "call"]
+    server, url = sync_server()
+    with tempfile.TemporaryDirectory() as tmp:
+        def paths(name):
+            return {"log_path": os.path.join(tmp, f"{name}.json"), "renderer_path": os.path.join(tmp, f"{name}.csv"),
+                    "state_path": os.path.join(tmp, f"{name}.state.json"),
+                    "archive_dir": os.path.join(tmp, f"{name}_archive")}
+
+        laptop = paths("laptop")
+        start = 1_750_000_000
+        save_json(laptop["log_path"], [
+            new_entry(rng.choice(clients), start + 600 * i, start + 600 * i + rng.randint(60, 590),
+                      task_type=rng.choice(tasks), notes=f"note {i}") for i in range(log_entries)])
+        with open(laptop["renderer_path"], "w") as f:
+            f.write("Date,Case,Start Time,End Time,Duration (s),Task Type\n")
+            for i in range(renderer_rows):
+                end = datetime.datetime.fromtimestamp(start - 600 * i)
+                duration = rng.randint(60, 590)
+                begin = end - datetime.timedelta(seconds=duration)
+                day = end.astimezone(datetime.timezone.utc).date().isoformat()
+                f.write(f"{day},{rng.choice(clients)},{begin:%I:%M:%S %p},{end:%I:%M:%S %p},{duration},"
+                        f"{rng.choice(tasks)}\n")
+
+        engine = SyncEngine(url, tz=None, user="", **laptop)
+        started = time.perf_counter()
+        first = engine.sync()
+        elapsed = time.perf_counter() - started
+        requests = engine.stats["requests"]
+
+        # Lost acknowledgement: forget the ack and replay everything
+        engine.state.update(acked=0, sources={})
+        engine.sync()
+        live_after_replay = server.store.live()
+
+        # A second machine catches up from scratch
+        desk = SyncEngine(url, tz=None, user="", **paths("desk"))
+        pulled = desk.sync()["pulled"]
+        desk_entries = len(load_json(desk.log_path, []))
+    server.shutdown()
+    return {
+        "synced": first["pushed"], "requests": requests, "elapsed_s": elapsed,
+        "raw_bytes": engine.stats["raw_bytes"] // 2, "sent_bytes": engine.stats["sent_bytes"] // 2,
+        "live_after_replay": live_after_replay, "desk_pulled": pulled, "desk_entries": desk_entries,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync local CaseClock logs with a central store")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="run the local stand-in server")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--db", default="caseclock_sync_server.db")
+    run = commands.add_parser("sync", help="scan, push and pull once")
+    run.add_argument("--url", default=SYNC_URL or "http://127.0.0.1:8765")
+    run.add_argument("--no-pull", action="store_true")
+    commands.add_parser("bench", help="simulate a day offline, then reconnect")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        server, url = sync_server(SyncStore(args.db), args.port)
+        print(f"Serving {url} from {args.db}")
+        threading.Event().wait()
+    elif args.command == "sync":
+        try:
+            print(SyncEngine(args.url).sync(pull=not args.no_pull))
+        except urllib.error.URLError as e:
+            print(f"Offline ({e.reason}); changes stay queued")
+    else:
+        report = offline_day()
+        print(f"Synced {report['synced']} entries in {report['requests']} requests, {report['elapsed_s']:.2f}s; "
+              f"{report['raw_bytes'] / 1024:.0f} KiB JSON sent as {report['sent_bytes'] / 1024:.0f} KiB gzip")
+        print(f"Replayed batch left {report['live_after_replay']} entries on the server; "
+              f"a second device pulled {report['desk_pulled']} into a {report['desk_entries']}-entry log")
+
+if __name__ == "__main__":
+    main()
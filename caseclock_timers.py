@@ -0,0 +1,244 @@
+import contextlib
+import time
+
+from caseclock_checkpoint import CHECKPOINT_FILE, Checkpoint
+from caseclock_intervals import entry_interval
+from caseclock_storage import LOG_FILE, entry_label, log_lock, new_entry, save_log
+
+class Timer:
+    # started is the epoch of the current run, None while paused; accumulated holds finished runs
+    __slots__ = ("name", "client", "first_start", "started", "ended", "accumulated", "parallel")
+
+    def __init__(self, name, client, now):
+        self.name, self.client = name, client
+        self.first_start = self.started = now
+        self.ended = None  # end of the last run, for paused timers
+        self.accumulated = 0.0
+        self.parallel = False  # shared its span with another timer, so its entry may overlap
+
+    @property
+    def running(self):
+        return self.started is not None
+
+    def elapsed(self, now):
+        return self.accumulated + (now - self.started if self.started is not None else 0.0)
+
+    def to_row(self):
+        return [self.name, self.client, self.first_start, self.started, self.ended, self.accumulated, self.parallel]
+
+    @classmethod
+    def from_row(cls, row):
+        timer = cls.__new__(cls)
+        (timer.name, timer.client, timer.first_start, timer.started, timer.ended,
+         timer.accumulated, timer.parallel) = row
+        return timer
+
+class TimerEngine:
+    # Any number of named timers, running or paused. Pause/resume are O(1); state is
+    # checkpointed after each change so a refresh, restart or crash picks the timers back up.
+    # Every change starts from the checkpoint's latest state under its lock, so engines
+    # sharing the file (other sessions, the daemon) never overwrite or double-stop a timer.
+    def __init__(self, path=CHECKPOINT_FILE, user="", checkpoint=None):
+        self.user = user
+        self.checkpoint = checkpoint or Checkpoint(path)
+        self.seen = None
+        self._adopt()
+
+    def _adopt(self):
+        rows, self.last_seen = self.checkpoint.read()
+        self.timers = {row[0]: Timer.from_row(row) for row in rows or []}
+        self.active = {name for name, t in self.timers.items() if t.running}
+        self.seen = self.checkpoint.seq
+
+    @contextlib.contextmanager
+    def _locked(self):
+        with self.checkpoint.locked():
+            if self.checkpoint.seq != self.seen:
+                self._adopt()
+            yield
+
+    def save(self):
+        self.checkpoint.write([t.to_row() for t in self.timers.values()])
+        self.seen = self.checkpoint.seq
+
+    def heartbeat(self, now=None):
+        # Cheap per-rerun stamp; after a crash, last_seen says when the app was last alive.
+        # Also picks up whatever other engines changed since the last rerun.
+        with self._locked():
+            if self.active:
+                self.checkpoint.touch(now)
+                self.seen = self.checkpoint.seq
+
+    def __len__(self):
+        return len(self.timers)
+
+    def __contains__(self, name):
+        return name in self.timers
+
+    def running(self):
+        return [self.timers[name] for name in self.active]
+
+    def paused(self):
+        return [t for t in self.timers.values() if not t.running]
+
+    def _mark_parallel(self, timer):
+        # Any timer alive next to another (running or paused) interleaves with it
+        if self.timers:
+            timer.parallel = True
+            for other in self.timers.values():
+                other.parallel = True
+
+    def start(self, client, name=None, now=None):
+        # Starting a timer that exists just resumes it
+        with self._locked():
+            name = name or client
+            if name in self.timers:
+                return self._resume(name, now)
+            now = time.time() if now is None else now
+            timer = Timer(name, client, now)
+            flags = {n: t.parallel for n, t in self.timers.items()}
+            self._mark_parallel(timer)
+            self.timers[name] = timer
+            self.active.add(name)
+            try:
+                self.save()
+            except OSError as e:
+                # Refuse the timer rather than run one that can't survive a restart
+                del self.timers[name]
+                self.active.discard(name)
+                for n, flag in flags.items():
+                    self.timers[n].parallel = flag
+                raise ValueError(f"Timer state couldn't be saved: {e}") from e
+            return timer
+
+    def pause(self, name, now=None):
+        # -> the timer, or None if another session already stopped it
+        with self._locked():
+            timer = self.timers.get(name)
+            if timer is not None and timer.running:
+                now = time.time() if now is None else now
+                timer.accumulated += now - timer.started
+                timer.started, timer.ended = None, now
+                self.active.discard(name)
+                self.save()
+            return timer
+
+    def resume(self, name, now=None):
+        with self._locked():
+            return self._resume(name, now)
+
+    def _resume(self, name, now):
+        timer = self.timers.get(name)
+        if timer is not None and not timer.running:
+            timer.started = time.time() if now is None else now
+            self.active.add(name)
+            self.save()
+        return timer
+
+    def discard(self, name, parallel=None):
+        # Drops a timer without logging it, e.g. one started early on a misheard command.
+        # parallel: the other timers' flags from before it started, put back as they were
+        with self._locked():
+            if self.timers.pop(name, None) is None:
+                return
+            self.active.discard(name)
+            for n, flag in (parallel or {}).items():
+                if n in self.timers:
+                    self.timers[n].parallel = flag
+            self.save()
+
+    def entry(self, timer, now, task_type="", notes=""):
+        # Paused stretches aren't billed: duration is the accumulated run time, not end - start
+        end = now if timer.running else timer.ended
+        entry = new_entry(timer.client, timer.first_start, end, round(timer.elapsed(now)), task_type, notes)
+        if self.user:
+            entry["user"] = self.user
+        if timer.parallel:
+            entry["parallel"] = True
+        return entry
+
+    def stop(self, names, logs, index, now=None, task_type="", notes="", log_path=LOG_FILE):
+        # Closes the named timers as one transaction: every entry is checked against the
+        # index first, then all are appended with a single log write, or none are.
+        # The log lock comes first, as for any other log write, so no lock order can deadlock
+        with log_lock(log_path), self._locked():
+            return self._stop(names, logs, index, now, task_type, notes, log_path)
+
+    def _stop(self, names, logs, index, now, task_type, notes, log_path):
+        now = time.time() if now is None else now
+        # A timer another session already stopped is not logged twice
+        timers = [self.timers[name] for name in names if name in self.timers]
+        entries = [self.entry(t, now, task_type, notes) for t in timers]
+        for entry in entries:
+            index.check_duplicate(entry)
+            start, end = entry_interval(entry)
+            if entry.get("parallel"):
+                # Concurrent timers may overlap each other's entries, never anything else
+                clash = next((hit for hit in index.overlapping(start, end, self.user)
+                              if not hit[2].get("parallel")), None)
+            else:
+                clash = index.first_overlap(start, end, self.user)
+            if clash is not None:
+                raise ValueError(f"{entry['client']} overlaps {entry_label(clash[2])}")
+        for entry in entries:
+            # Checked above; entries of one batch overlap each other when they ran side by side
+            index.add(entry, allow_overlap=True)
+        logs.extend(entries)
+        save_log(logs, log_path)
+        for t in timers:
+            del self.timers[t.name]
+            self.active.discard(t.name)
+        self.save()
+        return entries
+
+    def stop_all(self, logs, index, now=None, log_path=LOG_FILE):
+        return self.stop(list(self.timers), logs, index, now, log_path=log_path)
+
+# === Early commits ===
+class EarlyCommit:
+    # A start or stop the parser committed from partial hypotheses, applied before the
+    # utterance ends: a start runs its timer from `at`, a stop (or a switch) halts the clocks
+    # it closes by pausing them at `at`. Once the final transcript agrees, the caller logs
+    # `stop` at `at`; if it disagrees, revert() puts every timer back as it was.
+    def __init__(self, timers, intent, at):
+        self.timers, self.intent, self.at = timers, intent, at
+        self.started = self.resumed = None
+        self.flags = {}
+        self.paused = []
+        client = intent["client"]
+        if intent["action"] == "start":
+            self.stop = sorted(timers.active - {client}) if intent.get("switch") else []
+        elif client:
+            self.stop = [client] if client in timers else []
+        else:
+            self.stop = list(timers.timers)
+        for name in self.stop:
+            if name in timers.active:
+                timers.pause(name, at)
+                self.paused.append(name)
+        if intent["action"] != "start":
+            return
+        try:
+            if client not in timers:
+                self.flags = {n: t.parallel for n, t in timers.timers.items()}
+                timers.start(client, now=at)
+                self.started = client
+            elif client not in timers.active:
+                timers.resume(client, at)
+                self.resumed = client
+        except ValueError:
+            self.revert()
+            raise
+
+    def agrees(self, intent):
+        return (intent["action"], intent["client"]) == (self.intent["action"], self.intent["client"])
+
+    def revert(self):
+        if self.started:
+            self.timers.discard(self.started, self.flags)
+        if self.resumed:
+            self.timers.pause(self.resumed, self.at)
+        for name in self.paused:
+            # Resumed at the instant it was paused, the run carries on as if never halted
+            self.timers.resume(name, self.at)
+        self.stop = []
@@ -0,0 +1,155 @@
+import time
+import wave
+
+import numpy as np
+
+from caseclock_audio import AudioPipeline, FRAME_BYTES, FRAME_MS, SAMPLE_RATE, iter_frames, recognize_google
+
+try:
+    import webrtcvad
+except ImportError:
+    webrtcvad = None
+
+# Endpointing defaults: close the utterance ~300 ms after the last voiced frame
+TRAILING_SILENCE_MS = 300
+START_SPEECH_MS = 90
+PREROLL_MS = 210
+NO_SPEECH_TIMEOUT_S = 10
+MAX_UTTERANCE_S = 10
+
+def frame_rms(frame):
+    samples = np.frombuffer(frame, dtype=np.int16).astype(np.float32)
+    return float(np.sqrt(np.mean(samples * samples))) if samples.size else 0.0
+
+class Endpointer:
+    # Feed 30 ms frames; returns "speech_start", "speech_end", "timeout" or None per frame
+    def __init__(self, trailing_silence_ms=TRAILING_SILENCE_MS, start_speech_ms=START_SPEECH_MS,
+                 no_speech_timeout_s=NO_SPEECH_TIMEOUT_S, max_utterance_s=MAX_UTTERANCE_S,
+                 min_energy=300.0, ratio=3.0, aggressiveness=2):
+        self.end_frames = max(1, trailing_silence_ms // FRAME_MS)
+        self.start_frames = max(1, start_speech_ms // FRAME_MS)
+        self.timeout_frames = int(no_speech_timeout_s * 1000 // FRAME_MS)
+        self.max_frames = int(max_utterance_s * 1000 // FRAME_MS)
+        self.min_energy = min_energy
+        self.ratio = ratio
+        self.vad = webrtcvad.Vad(aggressiveness) if webrtcvad else None
+        self.reset()
+
+    def reset(self):
+        self.noise_floor = self.min_energy / self.ratio
+        self.in_speech = False
+        self.voiced_run = 0
+        self.silent_run = 0
+        self.frames = 0
+        self.speech_frames = 0
+
+    def is_voiced(self, frame):
+        if self.vad is not None:
+            return self.vad.is_speech(bytes(frame), SAMPLE_RATE)
+        rms = frame_rms(frame)
+        voiced = rms > max(self.min_energy, self.noise_floor * self.ratio)
+        if not voiced:
+            # Track the room's noise floor only while nobody is talking
+            self.noise_floor = 0.95 * self.noise_floor + 0.05 * rms
+        return voiced
+
+    def process(self, frame):
+        self.frames += 1
+        voiced = self.is_voiced(frame)
+        if not self.in_speech:
+            self.voiced_run = self.voiced_run + 1 if voiced else 0
+            if self.voiced_run >= self.start_frames:
+                self.in_speech = True
+                self.silent_run = 0
+                self.speech_frames = self.voiced_run
+                return "speech_start"
+            if self.frames >= self.timeout_frames:
+                return "timeout"
+            return None
+        self.speech_frames += 1
+        self.silent_run = 0 if voiced else self.silent_run + 1
+        if self.silent_run >= self.end_frames or self.speech_frames >= self.max_frames:
+            return "speech_end"
+        return None
+
+def capture_utterance(frames, pipeline=None, endpointer=None):
+    # Runs frames through the endpointer and returns the utterance PCM (memoryview) or None
+    pipeline = pipeline or AudioPipeline(seconds=MAX_UTTERANCE_S + 1)
+    endpointer = endpointer or Endpointer()
+    pipeline.start_utterance()
+    endpointer.reset()
+    preroll = PREROLL_MS // FRAME_MS
+    for frame in frames:
+        pipeline.feed(frame)
+        event = endpointer.process(frame)
+        if event == "timeout":
+            return None
+        if event == "speech_end":
+            n = (endpointer.speech_frames + preroll) * FRAME_BYTES
+            return pipeline.ring.last(n)
+    return None
+
+def listen_for_command(recognizer, pipeline=None, endpointer=None):
+    # Mic -> endpointer -> recognizer, with no fixed capture window
+    import speech_recognition as sr
+    pipeline = pipeline or AudioPipeline(seconds=MAX_UTTERANCE_S + 1)
+    with sr.Microphone(sample_rate=SAMPLE_RATE, chunk_size=FRAME_BYTES // 2) as source:
+        pcm = capture_utterance(iter_frames(source.stream), pipeline, endpointer)
+    if pcm is None:
+        raise sr.WaitTimeoutError("listening timed out while waiting for phrase to start")
+    return recognize_google(recognizer, pcm)
+
+# === Latency benchmark ===
+def wav_frames(path):
+    with wave.open(str(path), "rb") as w:
+        if w.getframerate() != SAMPLE_RATE or w.getsampwidth() != 2 or w.getnchannels() != 1:
+            raise ValueError(f"{path}: expected 16 kHz mono 16-bit PCM")
+        pcm = w.readframes(w.getnframes())
+    return [pcm[i:i + FRAME_BYTES] for i in range(0, len(pcm) - FRAME_BYTES + 1, FRAME_BYTES)]
+
+def synthetic_utterance(speech_s, silence_before_s=0.5, silence_after_s=3.0, seed=0):
+    # Noise floor with a voiced burst, standing in for a recorded "stop logging"
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(speech_s * SAMPLE_RATE)) / SAMPLE_RATE
+    speech = 4000 * np.sin(2 * np.pi * 180 * t) * (0.6 + 0.4 * np.sin(2 * np.pi * 3 * t))
+    pcm = np.concatenate([
+        rng.normal(0, 60, int(silence_before_s * SAMPLE_RATE)),
+        speech + rng.normal(0, 60, t.size),
+        rng.normal(0, 60, int(silence_after_s * SAMPLE_RATE)),
+    ]).astype(np.int16).tobytes()
+    frames = [pcm[i:i + FRAME_BYTES] for i in range(0, len(pcm) - FRAME_BYTES + 1, FRAME_BYTES)]
+    return frames, silence_before_s + speech_s
+
+def endpoint_latency(frames, speech_end_s=None):
+    endpointer = Endpointer()
+    started = time.perf_counter()
+    fired_at = None
+    last_voiced = 0
+    for i, frame in enumerate(frames):
+        if frame_rms(frame) > endpointer.min_energy:
+            last_voiced = i + 1
+        if endpointer.process(frame) == "speech_end":
+            fired_at = (i + 1) * FRAME_MS / 1000
+            break
+    cpu_ms = (time.perf_counter() - started) * 1000
+    speech_end_s = speech_end_s if speech_end_s is not None else last_voiced * FRAME_MS / 1000
+    if fired_at is None:
+        return None, cpu_ms, speech_end_s
+    return fired_at - speech_end_s, cpu_ms, speech_end_s
+
+def benchmark(paths=()):
+    cases = [(str(p), wav_frames(p), None) for p in paths] or [
+        (f"synthetic {s}s", *synthetic_utterance(s)) for s in (0.8, 1.5, 2.5, 4.0)
+    ]
+    for name, frames, speech_end in cases:
+        latency, cpu_ms, speech_end = endpoint_latency(frames, speech_end)
+        fixed_5 = max(0.0, 5 - speech_end)
+        fixed_10 = max(0.0, 10 - speech_end)
+        shown = "no endpoint" if latency is None else f"{latency * 1000:.0f} ms"
+        print(f"{name}: VAD endpoint {shown} after speech "
+              f"(fixed 5s window: {fixed_5 * 1000:.0f} ms, 10s: {fixed_10 * 1000:.0f} ms), "
+              f"{cpu_ms:.1f} ms CPU")
+
+if __name__ == "__main__":
+    import sys
+    benchmark(sys.argv[1:])
@@ -0,0 +1,251 @@
+import json
+import re
+import time
+
+from caseclock_audio import AudioPipeline, FRAME_BYTES, FRAME_MS, SAMPLE_RATE, iter_frames
+from caseclock_commands import IncrementalParser
+from caseclock_intent_cache import IntentCache
+from caseclock_intervals import CURRENT_USER, build_index
+from caseclock_migrate import upgrade_entries
+from caseclock_storage import CASE_FILE, STORAGE_MODE, format_duration, load_json, load_log, log_lock
+from caseclock_streaming import VOSK_MODEL_PATH, VoskStream, stream_command, streaming_available
+from caseclock_timers import EarlyCommit, TimerEngine
+from caseclock_vad import Endpointer
+
+WAKE_PHRASES = ["caseclock", "case clock"]
+WAKE_RE = re.compile(r"^\s*(hey\s+)?(case\s*clock)[\s,]*")
+HANGOVER_MS = 450        # keep the spotter fed this long after the last voiced frame
+REPLAY_MS = 1200         # audio re-fed to the full recognizer so "CaseClock, stop" isn't clipped
+CPU_BUDGET = 0.05        # fraction of one core the idle loop may use
+
+class KeywordSpotter:
+    # Vosk restricted to the wake phrases: a tiny grammar keeps decoding cheap
+    def __init__(self, model_path=VOSK_MODEL_PATH, phrases=WAKE_PHRASES):
+        self.stream = VoskStream(model_path, grammar=phrases + ["[unk]"])
+        self.phrases = phrases
+
+    def reset(self):
+        self.stream.reset()
+
+    def accept(self, frame):
+        heard = self.stream.accept(frame)
+        return any(p in heard for p in self.phrases)
+
+class WakeStrippedStream:
+    # Drops a leading "CaseClock," so the command parser sees only the command
+    def __init__(self, stream):
+        self.stream = stream
+
+    def reset(self):
+        self.stream.reset()
+
+    def accept(self, frame):
+        return WAKE_RE.sub("", self.stream.accept(frame))
+
+    def final(self):
+        return WAKE_RE.sub("", self.stream.final())
+
+class WakeWordDaemon:
+    def __init__(self, spotter, command_stream, case_names, handler=print, cpu_budget=CPU_BUDGET,
+                 resolve=None):
+        self.spotter = spotter
+        self.command_stream = WakeStrippedStream(command_stream)
+        self.case_names = case_names
+        self.parser = IncrementalParser(case_names, resolve=resolve)
+        self.handler = handler
+        self.cpu_budget = cpu_budget
+        self.gate = Endpointer()
+        self.pipeline = AudioPipeline(seconds=REPLAY_MS / 1000 + 1)
+        self.hangover = HANGOVER_MS // FRAME_MS
+        self.stats = {"frames": 0, "spotted_frames": 0, "wakes": 0, "cpu_s": 0.0, "wall_s": 0.0}
+        self.idle = 0
+
+    def listen(self, frames):
+        # Returns True when the wake word fired; frames keeps streaming afterwards
+        cpu0, wall0 = time.process_time(), time.perf_counter()
+        try:
+            for frame in frames:
+                self.stats["frames"] += 1
+                self.pipeline.feed(frame)
+                # Cheap energy gate first; the spotter only decodes frames near speech
+                if self.gate.is_voiced(frame):
+                    self.idle = 0
+                elif self.idle < self.hangover:
+                    self.idle += 1
+                else:
+                    if self.idle == self.hangover:
+                        self.spotter.reset()
+                        self.idle += 1
+                    continue
+                self.stats["spotted_frames"] += 1
+                if self.spotter.accept(frame):
+                    self.stats["wakes"] += 1
+                    self.spotter.reset()
+                    return True
+            return False
+        finally:
+            self.stats["cpu_s"] += time.process_time() - cpu0
+            self.stats["wall_s"] += time.perf_counter() - wall0
+
+    def handle_command(self, frames):
+        replay_bytes = (REPLAY_MS // FRAME_MS) * FRAME_BYTES
+        replay = self.pipeline.ring.last(replay_bytes)
+        replayed = [bytes(replay[i:i + FRAME_BYTES]) for i in range(0, len(replay), FRAME_BYTES)]
+        # The replay holds the wake word: recognized, but not endpointed, so the user may
+        # pause after "CaseClock" for as long as the endpointer's first-speech timeout
+        for event in stream_command(frames, self.command_stream, self.case_names,
+                                    parser=self.parser, replay=replayed):
+            if event[0] in ("commit", "final", "correct"):
+                self.handler(event)
+
+    def run(self, frames):
+        frames = iter(frames)
+        while self.listen(frames):
+            self.handle_command(frames)
+
+    def cpu_usage(self):
+        # Share of one core spent in the idle loop (listen), excluding command recognition
+        return self.stats["cpu_s"] / self.stats["wall_s"] if self.stats["wall_s"] else 0.0
+
+    def over_budget(self):
+        return self.cpu_usage() > self.cpu_budget
+
+def print_event(event):
+    if event[0] == "commit":
+        print(f"⚡ {event[1]['action']} {event[1]['client'] or ''}")
+    elif event[0] == "final":
+        print(f"🧠 Heard: {event[1]!r} -> {json.dumps(event[2], default=str)}")
+    elif event[0] == "correct":
+        print(f"↩️ Corrected to {event[1]['action']} {event[1]['client'] or ''}")
+
+class TimerHandler:
+    # Applies spoken commands the way the app does: timers live in the same checkpointed
+    # TimerEngine, and a stop appends its entries to the log with one save
+    def __init__(self, timers=None, say=print):
+        self.timers = timers if timers is not None else TimerEngine(user=CURRENT_USER)
+        self.say = say
+        self.early = None
+
+    def __call__(self, event):
+        # An early commit acts at once; the final intent confirms it or replaces it
+        if event[0] == "commit":
+            try:
+                self.early = EarlyCommit(self.timers, event[1], event[2])
+                self.say(f"⚡ {event[1]['action'].title()} {event[1]['client'] or ''}".strip())
+            except ValueError:
+                self.early = None  # the final intent retries the start and reports why it failed
+        elif event[0] == "final":
+            early, self.early = self.early, None
+            if early is None:
+                self.apply(event[2], event[3])
+            elif early.agrees(event[2]):
+                if early.stop:
+                    self.stop(early.stop, early.at)
+                elif early.intent["action"] == "stop":
+                    self.say(f"⚠️ No timer for {early.intent['client']}" if early.intent["client"]
+                             else "No timer was running.")
+            else:
+                early.revert()
+                self.say(f"↩️ Corrected: heard {event[1]!r}")
+                self.apply(event[2], event[3])
+
+    def apply(self, intent, at):
+        timers, client = self.timers, intent["client"]
+        if intent["action"] == "start":
+            if intent.get("switch") and timers.active - {client}:
+                self.stop(sorted(timers.active - {client}), at)
+            try:
+                timers.start(client, now=at)
+                self.say(f"✅ Timer running for: {client} ({len(timers.active)} running)")
+            except ValueError as e:
+                self.say(f"⚠️ Not started: {e}")
+        elif intent["action"] == "pause":
+            # A named client with no timer is a mishearing, not "pause everything"
+            if client and client not in timers:
+                return self.say(f"⚠️ No timer for {client}")
+            names = [client] if client else list(timers.active)
+            for name in names:
+                timers.pause(name, at)
+            self.say(f"⏸️ Paused: {', '.join(names) or 'nothing was running'}")
+        elif intent["action"] == "stop":
+            if client and client not in timers:
+                self.say(f"⚠️ No timer for {client}")
+            else:
+                self.stop([client] if client else list(timers.timers), at)
+        else:
+            self.say(f"🤷 Not a timer command: {intent['action']}")
+
+    def stop(self, names, at):
+        if not names:
+            return self.say("No timer was running.")
+        # Read the log fresh under the lock so entries written elsewhere aren't lost
+        with log_lock():
+            logs = load_log()
+            upgrade_entries(logs)
+            try:
+                entries = self.timers.stop(names, logs, build_index(logs), at)
+            except ValueError as e:
+                return self.say(f"⚠️ Not logged: {e}")
+        for e in entries:
+            self.say(f"🛑 Logged {format_duration(e['duration'])} for {e['client']}")
+
+def run_daemon(handler=None):
+    # Commands start, pause and stop timers as in the app; pass print_event to only print them
+    import speech_recognition as sr
+    if handler is None and STORAGE_MODE != "shared":
+        # A local log is rewritten whole from the app's session copy, which would drop the
+        # daemon's entries; a shared log merges every writer's saves
+        raise SystemExit("The daemon logs time next to the app: set CASECLOCK_STORAGE=shared, "
+                         "or run with --dry-run to only print commands")
+    cache = IntentCache()
+    daemon = WakeWordDaemon(KeywordSpotter(), VoskStream(), load_json(CASE_FILE, []), handler or TimerHandler(),
+                            resolve=cache.resolve)
+    print("👂 Say 'CaseClock, ...' (Ctrl+C to quit)")
+    with sr.Microphone(sample_rate=SAMPLE_RATE, chunk_size=FRAME_BYTES // 2) as source:
+        try:
+            daemon.run(iter_frames(source.stream))
+        except KeyboardInterrupt:
+            pass
+    print(f"CPU while idle: {daemon.cpu_usage():.1%} of one core (budget {daemon.cpu_budget:.0%})")
+    print(f"Intent cache hit rate: {cache.hit_rate():.0%}")
+
+# === CPU benchmark ===
+def benchmark(seconds=120, speech_every_s=20, spotter=None):
+    # Runs a synthetic room (noise + an utterance every speech_every_s) through the idle loop,
+    # real Vosk spotter included, and reports CPU time as a share of one core for that much audio
+    import numpy as np
+    from caseclock_vad import synthetic_utterance
+
+    spotter = spotter or KeywordSpotter()
+    rng = np.random.default_rng(0)
+    noise = [rng.normal(0, 60, FRAME_BYTES // 2).astype(np.int16).tobytes() for _ in range(50)]
+    speech, _ = synthetic_utterance(1.2, 0.0, 0.0)
+    frames = []
+    per_cycle = int(speech_every_s * 1000 // FRAME_MS)
+    for _ in range(int(seconds // speech_every_s)):
+        frames.extend(speech)
+        frames.extend(noise[i % len(noise)] for i in range(per_cycle - len(speech)))
+
+    daemon = WakeWordDaemon(spotter, None, [], lambda e: None)
+    cpu0 = time.process_time()
+    daemon.listen(iter(frames))
+    cpu = time.process_time() - cpu0
+    audio_s = len(frames) * FRAME_MS / 1000
+    return {
+        "audio_s": audio_s,
+        "cpu_s": cpu,
+        "core_share": cpu / audio_s,
+        "spotted_share": daemon.stats["spotted_frames"] / daemon.stats["frames"],
+    }
+
+if __name__ == "__main__":
+    import sys
+    if sys.argv[1:] == ["--bench"]:
+        if not streaming_available():
+            print("Skipped: the benchmark runs the Vosk spotter; install vosk and set VOSK_MODEL_PATH")
+        else:
+            r = benchmark()
+            print(f"{r['audio_s']:.0f}s of audio: {r['cpu_s']:.2f}s CPU = {r['core_share']:.2%} of one core "
+                  f"(budget {CPU_BUDGET:.0%}); spotter ran on {r['spotted_share']:.0%} of frames")
+    else:
+        run_daemon(print_event if sys.argv[1:] == ["--dry-run"] else None)
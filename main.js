@@ -2,13 +2,11 @@
 const { File } = require('node:buffer');
 globalThis.File = File;
 
-const fs = require('fs');
-const os = require('os');
 require('dotenv').config();
 const { app, Menu, Tray } = require('electron');
 const path = require('path');
 const recorder = require('node-record-lpcm16');
-const { OpenAI } = require('openai');
+const { OpenAI, toFile } = require('openai');
 
 let tray = null;
 let isRecording = false;
@@ -19,12 +17,11 @@ const openai = new OpenAI({
 
 async function transcribeAudio(audioBuffer) {
   try {
-    const tempPath = path.join(os.tmpdir(), 'temp_audio.wav');
-    fs.writeFileSync(tempPath, audioBuffer);
     console.log('📤 Sending audio to OpenAI...');
 
+    // Upload straight from memory — no temp WAV on disk
     const response = await openai.audio.transcriptions.create({
-      file: fs.createReadStream(tempPath),
+      file: await toFile(audioBuffer, 'audio.wav'),
       model: 'whisper-1',
     });
 
@@ -43,19 +40,23 @@ function listenAndTrigger() {
   console.log("🎙️ Listening... Say something like 'Start billing Johnson case'");
 
   const chunks = [];
+  let cap;
 
   const recording = recorder
     .record({
       sampleRateHertz: 16000,
-      threshold: 0,
+      threshold: 0.5,
       verbose: false,
       recordProgram: 'sox',
-      silence: '1.0',
+      silence: '0.3',
       endOnSilence: true,
-    })
+    });
+
+  recording
     .stream()
     .on('data', (chunk) => chunks.push(chunk))
     .on('end', async () => {
+      clearTimeout(cap);
       const audioBuffer = Buffer.concat(chunks);
       const command = await transcribeAudio(audioBuffer);
 
@@ -75,7 +76,9 @@ function listenAndTrigger() {
       isRecording = false;
     });
 
-  setTimeout(() => recording.emit('end'), 5000);
+  // sox ends the stream ~300 ms after speech stops; this is only a safety cap.
+  // Stopping the recorder ends the stream, so 'end' fires once either way.
+  cap = setTimeout(() => recording.stop(), 5000);
 }
 
 app.whenReady().then(() => {
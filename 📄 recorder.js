@@ -5,43 +5,46 @@ const FormData = require('form-data');
 require('dotenv').config();
 
 const recordAndTranscribe = async () => {
-  const filePath = 'recording.wav';
-  const file = fs.createWriteStream(filePath, { encoding: 'binary' });
+  const chunks = [];
 
   const recording = recorder.record({
     sampleRate: 16000,
     threshold: 0.5,
     verbose: false,
     recordProgram: 'sox',
-    silence: '1.0',
+    silence: '0.3',
+    endOnSilence: true,
   });
 
-  console.log('🎤 Recording for 5 seconds...');
-  recording.stream().pipe(file);
-
-  setTimeout(async () => {
-    recording.stop();
-    console.log('🛑 Recording stopped.');
-
-    const formData = new FormData();
-    formData.append('file', fs.createReadStream(filePath));
-    formData.append('model', 'whisper-1');
-
-    try {
-      const response = await axios.post('https://api.openai.com/v1/audio/transcriptions', formData, {
-        headers: {
-          'Authorization': `Bearer ${process.env.OPENAI_API_KEY}`,
-          ...formData.getHeaders()
-        }
-      });
-
-      const transcript = response.data.text;
-      console.log('📝 Transcription:', transcript);
-      fs.appendFileSync('transcriptions.log', `${new Date().toISOString()}: ${transcript}\n`);
-    } catch (error) {
-      console.error('❌ Error transcribing:', error.response?.data || error.message);
-    }
-  }, 5000);
+  console.log('🎤 Recording until you stop talking...');
+  // sox ends the stream ~300 ms after speech stops; this is only a safety cap
+  const safetyCap = setTimeout(() => recording.stop(), 5000);
+
+  recording.stream()
+    .on('data', (chunk) => chunks.push(chunk))
+    .on('end', async () => {
+      clearTimeout(safetyCap);
+      console.log('🛑 Recording stopped.');
+
+      const formData = new FormData();
+      formData.append('file', Buffer.concat(chunks), { filename: 'recording.wav', contentType: 'audio/wav' });
+      formData.append('model', 'whisper-1');
+
+      try {
+        const response = await axios.post('https://api.openai.com/v1/audio/transcriptions', formData, {
+          headers: {
+            'Authorization': `Bearer ${process.env.OPENAI_API_KEY}`,
+            ...formData.getHeaders()
+          }
+        });
+
+        const transcript = response.data.text;
+        console.log('📝 Transcription:', transcript);
+        fs.appendFileSync('transcriptions.log', `${new Date().toISOString()}: ${transcript}\n`);
+      } catch (error) {
+        console.error('❌ Error transcribing:', error.response?.data || error.message);
+      }
+    });
 };
 
 module.exports = { recordAndTranscribe };